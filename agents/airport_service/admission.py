@@ -0,0 +1,206 @@
+"""
+图运行准入控制
+
+流量突增（如大面积航班延误）时，无限制地并发执行图会同时放大LLM、RAGFlow和Redis的压力，
+最终所有请求一起超时。准入控制器限制全局并发运行数：
+
+- 超出并发上限的运行进入有界等待队列，等待超过期限即拒绝
+- 已有对话的会话优先于新会话出队；队列满时，已有会话可挤掉排队中的新会话
+- 单个 user_id 同时运行/排队的数量受限
+- 被拒绝时抛出 AdmissionRejectedError，由接口层快速返回 service_unavailable
+
+所有计数都在进程内，不跨副本（或 worker 进程）共享：N 个进程时整体并发上限和单用户上限都是配置值的 N 倍。
+准入控制的目的是保护本进程及其下游连接池不被压垮，按“下游可承受的总并发 / 进程数”配置即可；
+需要严格的集群级单用户限制时应在网关层实现。
+"""
+import asyncio
+import heapq
+import itertools
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional
+
+from config.utils import config_manager
+from common.logging import get_logger
+from common.metrics import metrics
+
+logger = get_logger("agents.admission")
+
+_graph_config = config_manager.get_agents_config().get("graph", {})
+ADMISSION_MAX_CONCURRENCY = _graph_config.get("admission_max_concurrency", 0)
+ADMISSION_QUEUE_SIZE = _graph_config.get("admission_queue_size", 100)
+ADMISSION_QUEUE_TIMEOUT = _graph_config.get("admission_queue_timeout", 10)
+ADMISSION_PER_USER_LIMIT = _graph_config.get("admission_per_user_limit", 2)
+
+# 出队优先级，数值越小越优先
+PRIORITY_ONGOING = 0
+PRIORITY_NEW = 1
+_PRIORITY_NAMES = {PRIORITY_ONGOING: "ongoing", PRIORITY_NEW: "new"}
+
+
+class AdmissionRejectedError(Exception):
+    """系统过载，运行未被准入"""
+
+    def __init__(self, reason: str):
+        super().__init__(f"系统繁忙，运行未被准入: {reason}")
+        self.reason = reason
+
+
+class _Waiter:
+    __slots__ = ("priority", "seq", "future", "granted")
+
+    def __init__(self, priority: int, seq: int, future: asyncio.Future):
+        self.priority = priority
+        self.seq = seq
+        self.future = future
+        self.granted = False
+
+    def __lt__(self, other: "_Waiter") -> bool:
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class AdmissionController:
+    """全局并发限制 + 有界优先级等待队列 + 单用户限制"""
+
+    def __init__(self, max_concurrency: int = ADMISSION_MAX_CONCURRENCY, queue_size: int = ADMISSION_QUEUE_SIZE,
+                 queue_timeout: float = ADMISSION_QUEUE_TIMEOUT, per_user_limit: int = ADMISSION_PER_USER_LIMIT,
+                 known_threads: int = 10000):
+        """
+        Args:
+            max_concurrency: 全局并发运行上限，0表示不限制
+            queue_size: 等待队列长度上限
+            queue_timeout: 排队等待的最长时间（秒）
+            per_user_limit: 单个用户同时运行和排队的数量上限，0表示不限制
+            known_threads: 记录的已有会话数量上限（用于判断优先级）
+        """
+        self.max_concurrency = max_concurrency
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.per_user_limit = per_user_limit
+        self._known_threads_limit = known_threads
+        self._known_threads: "OrderedDict[str, None]" = OrderedDict()
+        self._user_active: Dict[str, int] = {}
+        self._waiters: List[_Waiter] = []
+        self._queued = 0
+        self._running = 0
+        self._seq = itertools.count()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_concurrency > 0
+
+    def stats(self) -> Dict:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "running": self._running,
+            "queued": self._queued,
+            "queue_size": self.queue_size,
+        }
+
+    @asynccontextmanager
+    async def admit(self, thread_key: Optional[str], user_id: Optional[str]):
+        """获取运行名额，过载时抛出 AdmissionRejectedError"""
+        if not self.enabled:
+            yield
+            return
+
+        if user_id and self.per_user_limit and self._user_active.get(user_id, 0) >= self.per_user_limit:
+            self._reject("user_limit")
+        priority = PRIORITY_ONGOING if thread_key and thread_key in self._known_threads else PRIORITY_NEW
+
+        if user_id:
+            self._user_active[user_id] = self._user_active.get(user_id, 0) + 1
+        try:
+            await self._acquire(priority)
+            try:
+                self._remember(thread_key)
+                yield
+            finally:
+                self._release()
+        finally:
+            if user_id:
+                remaining = self._user_active.get(user_id, 1) - 1
+                if remaining > 0:
+                    self._user_active[user_id] = remaining
+                else:
+                    self._user_active.pop(user_id, None)
+
+    def _reject(self, reason: str):
+        metrics.inc("admission_rejected", reason=reason)
+        logger.info(f"系统繁忙，拒绝图运行: {reason}（运行中 {self._running}，排队 {self._queued}）")
+        raise AdmissionRejectedError(reason)
+
+    def _remember(self, thread_key: Optional[str]):
+        if not thread_key:
+            return
+        self._known_threads[thread_key] = None
+        self._known_threads.move_to_end(thread_key)
+        while len(self._known_threads) > self._known_threads_limit:
+            self._known_threads.popitem(last=False)
+
+    def _update_gauges(self):
+        metrics.set_gauge("admission_running", self._running)
+        metrics.set_gauge("admission_queued", self._queued)
+
+    async def _acquire(self, priority: int):
+        label = _PRIORITY_NAMES[priority]
+        if self._running < self.max_concurrency and self._queued == 0:
+            self._running += 1
+            self._update_gauges()
+            metrics.observe("admission_wait_seconds", 0, priority=label)
+            return
+
+        if self._queued >= self.queue_size:
+            victim = self._lowest_waiter()
+            if victim is None or victim.priority <= priority:
+                self._reject("queue_full")
+            # 已有会话挤掉排队中最晚到达的新会话
+            victim.future.set_exception(AdmissionRejectedError("displaced"))
+            self._drop(victim)
+            metrics.inc("admission_rejected", reason="displaced")
+
+        waiter = _Waiter(priority, next(self._seq), asyncio.get_running_loop().create_future())
+        heapq.heappush(self._waiters, waiter)
+        self._queued += 1
+        self._update_gauges()
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(waiter.future, timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            if not waiter.granted:
+                self._drop(waiter)
+                self._reject("queue_timeout")
+        except asyncio.CancelledError:
+            if waiter.granted:
+                self._release()
+            else:
+                self._drop(waiter)
+            raise
+        finally:
+            metrics.observe("admission_wait_seconds", time.perf_counter() - start, priority=label)
+
+    def _lowest_waiter(self) -> Optional[_Waiter]:
+        candidates = [w for w in self._waiters if not w.future.done()]
+        return max(candidates) if candidates else None
+
+    def _drop(self, waiter: _Waiter):
+        """把等待者移出队列（堆中的条目延迟清理）"""
+        if not waiter.future.done():
+            waiter.future.cancel()
+        self._queued -= 1
+        self._update_gauges()
+
+    def _release(self):
+        """释放名额，直接移交给优先级最高的等待者"""
+        while self._waiters:
+            waiter = heapq.heappop(self._waiters)
+            if waiter.future.done():
+                continue
+            waiter.granted = True
+            waiter.future.set_result(None)
+            self._queued -= 1
+            self._update_gauges()
+            return
+        self._running -= 1
+        self._update_gauges()
@@ -1,80 +1,29 @@
 import os
 import sys
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../../../../")))
-os.environ["TOKENIZERS_PARALLELISM"] = "false"
 from langchain_core.runnables import RunnableConfig
 from langgraph.store.base import BaseStore
 from langchain_core.messages import AIMessage
-import torch
-from transformers import pipeline
-from transformers import AutoTokenizer, AutoModelForSequenceClassification
 from agents.airport_service.state import BusinessRecommendState
-from agents.airport_service.core import emotion
+from agents.airport_service.core import emotion_classifier, EMOTION_LABEL_SCORES
 from common.logging import get_logger
 
 # 获取情感识别节点专用日志记录器
 logger = get_logger("agents.business-recommend-nodes.artificial")
 
-# 全局变量存储情感分析器
-_emotion_classifier = None
-_emotion_mapping = {"Very Negative": 0, "Negative": 1, "Neutral": 2, "Positive": 3, "Very Positive": 4}
-
-def initialize_emotion_classifier():
-    """初始化情感分析分类器"""
-    global _emotion_classifier
-    
-    if _emotion_classifier is not None:
-        return _emotion_classifier
-    try:
-        # 检查CUDA是否可用
-        device = torch.device("cuda:0" if torch.cuda.is_available() else "cpu")
-        logger.info(f"情感分析模型使用设备: {device}")
-        # 加载tokenizer和模型
-        tokenizer = AutoTokenizer.from_pretrained(emotion["model_path"])
-        model = AutoModelForSequenceClassification.from_pretrained(emotion["model_path"]).to(device)
-        
-        # 初始化情感分析 pipeline
-        _emotion_classifier = pipeline(
-            "text-classification",
-            model=model,
-            tokenizer=tokenizer,
-            device=0 if torch.cuda.is_available() else -1
-        )
-        
-        logger.info("情感分析模型初始化成功")
-        return _emotion_classifier
-        
-    except Exception as e:
-        logger.error(f"情感分析模型初始化失败: {e}")
-        # 使用简单的关键词方法作为备选
-        return None
-
-def analyze_emotion_with_model(text: str)->dict:
-    """使用深度学习模型进行情感分析"""
-    global _emotion_classifier
-    
-    if _emotion_classifier is None:
-        _emotion_classifier = initialize_emotion_classifier()
-    
-    try:
-        result = _emotion_classifier(text)
-        emotion_label = result[0]['label']
-        confidence = result[0]['score']
-        emotion_score = _emotion_mapping.get(emotion_label, 2)  # 默认为中性
-                
-        # 返回情感分数和是否为负面情绪
-        is_negative = emotion_score <= 1  # Very Negative 或 Negative
+async def analyze_emotion_with_model(text: str)->dict:
+    """使用深度学习模型进行情感分析（在推理线程中批量执行，不阻塞事件循环）"""
+    emotion_label = await emotion_classifier.classify(text)
+    # Very Negative 或 Negative 视为负面情绪，识别失败或超时按中性处理
+    if EMOTION_LABEL_SCORES.get(emotion_label, 2) <= 1:
         return {
             "reason": "用户情绪已经非常的负面，需要转人工",
-            "is_negative": is_negative
-        }
-        
-    except Exception as e:
-        logger.error(f"情感分析出错: {e}")
-        return {
-            "reason": "用户情绪中性，不需要转人工",
-            "is_negative": False
+            "is_negative": True
         }
+    return {
+        "reason": "用户情绪中性，不需要转人工",
+        "is_negative": False
+    }
 
 # 1. 用户明确请求转人工
 def is_explicit_request(text:str)->bool:
@@ -96,13 +45,13 @@ def is_exact_repeat(messages: list, threshold: int = 3) -> bool:
     return all(content == first_content for content in recent_human_messages)
 
 # 主判定函数
-def should_transfer(state: BusinessRecommendState,user_query:str):
+async def should_transfer(state: BusinessRecommendState,user_query:str):
     if is_explicit_request(user_query):
         return {"reason": "用户明确输入请求转人工", "is_negative": True}
     if is_exact_repeat(state["messages"]):
         return {"reason": "用户重复输入相同问题3 次，需要转人工", "is_negative": True}
     
-    emotion_result = analyze_emotion_with_model(user_query)
+    emotion_result = await analyze_emotion_with_model(user_query)
     return  emotion_result
     
 
@@ -122,6 +71,6 @@ async def detect_emotion(state: BusinessRecommendState, config: RunnableConfig,
     if not Is_emotion:
         return {"user_query":user_query}
     else:
-        should_transfer_result = should_transfer(state,user_query)
+        should_transfer_result = await should_transfer(state,user_query)
         logger.info(f"情感识别内容为：{user_query}，情感识别结果: {should_transfer_result}")
         return {"emotion_result": should_transfer_result,"user_query":user_query}
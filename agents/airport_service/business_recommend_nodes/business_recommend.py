@@ -11,10 +11,11 @@ import json
 from langchain_core.runnables import RunnableConfig
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.messages import AIMessage
-from trustcall import create_extractor
-from agents.airport_service.core import filter_messages_for_llm,content_model
+from agents.airport_service.core import filter_messages_for_llm
+from agents.airport_service.core import models
 from datetime import datetime
 from common.logging import get_logger
+from common.registry import component_registry
 from agents.airport_service.context_engineering.prompts import business_recommend_prompts
 
 # 获取机场知识节点专用日志记录器
@@ -33,6 +34,17 @@ def replace_outer_single_quotes(lst):
     return result
 
 
+def _build_business_recommend_extractor():
+    from trustcall import create_extractor
+    return create_extractor(
+        models.content_model,
+        tools=[BusinessRecommendSchema],
+        tool_choice="BusinessRecommendSchema"
+    )
+
+# 抽取器只构建一次，不再每次请求重新创建
+component_registry.register("business_recommend_extractor", _build_business_recommend_extractor)
+
 
 async def provide_business_recommend(state: BusinessRecommendState, config: RunnableConfig):
     logger.info("进入业务推荐子智能体:")
@@ -42,11 +54,7 @@ async def provide_business_recommend(state: BusinessRecommendState, config: Runn
         ("human", business_recommend_prompts.BUSINESS_RECOMMEND_HUMAN_PROMPT)
     ]).partial(time=datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
 
-    extractor = create_extractor(
-        content_model,
-        tools=[BusinessRecommendSchema],
-        tool_choice="BusinessRecommendSchema"
-    )
+    extractor = component_registry.get("business_recommend_extractor")
 
     user_query = state.get("user_query", "") if state.get("user_query", "") else config["configurable"].get("user_query", "")
     translator_result = state.get("translator_result")
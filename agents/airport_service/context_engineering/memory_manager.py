@@ -20,7 +20,8 @@ from mem0.llms.configs import LlmConfig
 from mem0.embeddings.configs import EmbedderConfig
 # 导入画像模型
 from .profile.user_profile_models import SessionProfile, DailyProfile, InsightProfile
-from agents.airport_service.core import structed_model, emb_model
+from agents.airport_service.core import airport_answer_cache
+from agents.airport_service.core import models
 from config.utils import config_manager
 from common.logging import get_logger
 
@@ -32,7 +33,7 @@ def _get_profile_extractor():
     try:
         from .profile.profile_extractor import get_profile_extractor
         # 传入配置的 LLM 实例
-        return get_profile_extractor(structed_model)
+        return get_profile_extractor(models.structed_model)
     except ImportError as e:
         logger.warning(f"混合式画像提取器导入失败: {e}")
         return None
@@ -135,7 +136,7 @@ class MemoryManager:
             
             # 对话记忆配置
             conversation_config = MemoryConfig(
-                llm=LlmConfig(provider="langchain", config={"model": structed_model}),
+                llm=LlmConfig(provider="langchain", config={"model": models.structed_model}),
                 vector_store=VectorStoreConfig(
                     provider="chroma",
                     config={
@@ -146,7 +147,7 @@ class MemoryManager:
                 ),
                 embedder=EmbedderConfig(
                     provider="langchain",
-                    config={"model": emb_model}
+                    config={"model": models.emb_model}
                 ),
                 version="v1.1"
             )
@@ -154,7 +155,7 @@ class MemoryManager:
             
             # 用户画像记忆配置
             profile_config = MemoryConfig(
-                llm=LlmConfig(provider="langchain", config={"model": structed_model}),
+                llm=LlmConfig(provider="langchain", config={"model": models.structed_model}),
                 vector_store=VectorStoreConfig(
                     provider="chroma",
                     config={
@@ -165,7 +166,7 @@ class MemoryManager:
                 ),
                 embedder=EmbedderConfig(
                     provider="langchain",
-                    config={"model": emb_model}
+                    config={"model": models.emb_model}
                 ),
                 version="v1.1"
             )
@@ -574,6 +575,7 @@ class MemoryManager:
             
             memory_id = result.get('results', [{}])[0].get('id') if result.get('results') else None
             logger.info(f"专家QA已添加: {memory_id}, 专家ID: {expert_id}")
+            await airport_answer_cache.invalidate("expert_qa_added")
             return memory_id
             
         except Exception as e:
@@ -719,6 +721,7 @@ class MemoryManager:
             )
             
             logger.info(f"专家QA更新完成: memory_id={memory_id}")
+            await airport_answer_cache.invalidate("expert_qa_updated")
             return True
             
         except Exception as e:
@@ -746,6 +749,7 @@ class MemoryManager:
             await self.conversation_memory.delete(memory_id=memory_id)
             
             logger.info(f"专家QA删除完成: memory_id={memory_id}")
+            await airport_answer_cache.invalidate("expert_qa_deleted")
             return True
             
         except Exception as e:
@@ -20,7 +20,14 @@ from .extraction_components import (
 
 from .profile_extractor import ProfileExtractor, profile_extractor
 from .operational_analytics import OperationalAnalyticsEngine, operational_analytics_engine
-from .profile_scheduler import ProfileScheduler, ScheduleConfig, profile_scheduler
+from .profile_scheduler import ProfileScheduler, ScheduleConfig, get_profile_scheduler
+
+
+def __getattr__(name: str):
+    # 调度器实例延迟到首次访问时创建，导入本包不会构建模型客户端
+    if name == "profile_scheduler":
+        return get_profile_scheduler()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 __all__ = [
     # 模型
@@ -36,7 +43,7 @@ __all__ = [
     # 核心组件
     'ProfileExtractor', 'profile_extractor',
     'OperationalAnalyticsEngine', 'operational_analytics_engine', 
-    'ProfileScheduler', 'profile_scheduler',
+    'ProfileScheduler', 'profile_scheduler', 'get_profile_scheduler',
     'ScheduleConfig',
     
     # 工具组件
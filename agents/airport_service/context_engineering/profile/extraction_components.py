@@ -1,11 +1,11 @@
 import asyncio
 from datetime import datetime
-from typing import List, Dict, Any
+from typing import List, Dict, Any, TYPE_CHECKING
 import logging
 import aiohttp
 
-from trustcall import create_extractor
-from langchain_openai import ChatOpenAI
+if TYPE_CHECKING:
+    from langchain_openai import ChatOpenAI
 
 from .user_profile_models import (
     SessionProfile, SessionMetrics, TechnicalContext, 
@@ -17,7 +17,8 @@ from .user_profile_models import (
 logger = logging.getLogger(__name__)
 
 class SemanticExtractor:   
-    def __init__(self, llm_client: ChatOpenAI):
+    def __init__(self, llm_client: "ChatOpenAI"):
+        from trustcall import create_extractor
         self.llm = llm_client
         
         self.content_extractor = create_extractor(
@@ -3,9 +3,11 @@ import sys
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../../../../")))
 import logging
 import statistics
-from typing import List, Dict, Optional, Any
+from typing import List, Dict, Optional, Any, TYPE_CHECKING
 from collections import Counter
-from langchain_openai import ChatOpenAI
+
+if TYPE_CHECKING:
+    from langchain_openai import ChatOpenAI
 
 from .user_profile_models import (
     SessionProfile, DailyProfile,
@@ -257,7 +259,7 @@ class BehaviorAggregator:
         return max(-1.0, min(1.0, correlation))
 
 class ProfileExtractor:    
-    def __init__(self, llm_client: ChatOpenAI):
+    def __init__(self, llm_client: "ChatOpenAI"):
         """
         初始化用户画像提取器
         
@@ -490,7 +492,7 @@ class ProfileExtractor:
 
 
 # ============================== 全局实例工厂 ==============================
-def create_profile_extractor(llm_client: Optional[ChatOpenAI] = None) -> ProfileExtractor:
+def create_profile_extractor(llm_client: Optional["ChatOpenAI"] = None) -> ProfileExtractor:
     """
     创建用户画像提取器实例
     
@@ -501,13 +503,10 @@ def create_profile_extractor(llm_client: Optional[ChatOpenAI] = None) -> Profile
         ProfileExtractor 实例
     """
     if llm_client is None:
-        # 使用系统配置的 LLM 实例
+        # 使用系统配置的 LLM 实例，模型客户端在此处（首次创建提取器时）才构建
         try:
-            import sys
-            import os
-            sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../../../../")))
-            from agents.airport_service.core import structed_model
-            llm_client = structed_model
+            from agents.airport_service.core import models
+            llm_client = models.structed_model
         except ImportError:
             # 如果导入失败，使用备用配置
             raise ImportError("初始化ProfileExtractor失败，请检查模型配置")
@@ -517,7 +516,7 @@ def create_profile_extractor(llm_client: Optional[ChatOpenAI] = None) -> Profile
 # 全局实例 - 延迟初始化
 profile_extractor = None
 
-def get_profile_extractor(llm_client: Optional[ChatOpenAI] = None) -> ProfileExtractor:
+def get_profile_extractor(llm_client: Optional["ChatOpenAI"] = None) -> ProfileExtractor:
     """
     获取全局画像提取器实例（单例模式）
     
@@ -570,4 +570,18 @@ class ProfileScheduler:
 
 
 # ============================== 全局实例 ==============================
-profile_scheduler = ProfileScheduler()
+# 延迟初始化：调度器会构建画像提取器及其模型客户端，不应在导入阶段创建
+_profile_scheduler: Optional[ProfileScheduler] = None
+
+def get_profile_scheduler() -> ProfileScheduler:
+    """获取全局画像调度器实例（单例模式，首次调用时创建）"""
+    global _profile_scheduler
+    if _profile_scheduler is None:
+        _profile_scheduler = ProfileScheduler()
+    return _profile_scheduler
+
+def __getattr__(name: str):
+    # 兼容旧用法 from .profile_scheduler import profile_scheduler
+    if name == "profile_scheduler":
+        return get_profile_scheduler()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,18 +1,33 @@
-from .models import content_model, base_model, structed_model, emb_model
+from . import models
 from .utils import (
     filter_messages_for_agent, 
     filter_messages_for_llm,
     extract_flight_numbers_from_result,
     KB_SIMILARITY_THRESHOLD,
     max_msg_len,
+    history_compaction_batch,
     max_tokens,
     memery_delay,
     emotion
 )
 from .query import comprehensive_query_transform
-from .query.rerank import rerank_results
-from .models import image_model
+from .query.rerank import rerank_results, rerank_enabled, close_rerank_services
+from .query.fusion import fuse_candidates
+from .speculation import airport_retrieval_speculation, retrieval_fingerprint, SPECULATIVE_RETRIEVAL
+from .answer_cache import airport_answer_cache
+from .intent_classifier import intent_classifier
+from .emotion_classifier import emotion_classifier, EMOTION_LABEL_SCORES
+
+
+def __getattr__(name):
+    # 模型客户端延迟构建：首次访问时才创建
+    if name in models.MODEL_NAMES:
+        return getattr(models, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
 __all__ = [
+    "models",
     "content_model",
     "base_model",
     "structed_model",
@@ -23,9 +38,20 @@ __all__ = [
     "extract_flight_numbers_from_result",
     "KB_SIMILARITY_THRESHOLD",
     "max_msg_len",
+    "history_compaction_batch",
     "max_tokens",
     "memery_delay",
     "emotion",
     "comprehensive_query_transform",
-    "rerank_results"
+    "rerank_results",
+    "rerank_enabled",
+    "close_rerank_services",
+    "fuse_candidates",
+    "airport_retrieval_speculation",
+    "retrieval_fingerprint",
+    "SPECULATIVE_RETRIEVAL",
+    "airport_answer_cache",
+    "intent_classifier",
+    "emotion_classifier",
+    "EMOTION_LABEL_SCORES"
 ]
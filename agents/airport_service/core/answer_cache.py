@@ -0,0 +1,305 @@
+"""
+机场知识语义答案缓存
+
+旅客的问题高度集中（"充电宝能带吗"、"南航在哪值机"），每次却都要经过两次问题重写、
+三路知识库检索、重排和答案生成。缓存以规范化后的问题及其向量为键、按语言隔离：
+规范化文本完全一致时无需计算向量直接命中，否则按余弦相似度取最近邻，超过阈值即命中。
+
+失效：条目按TTL过期；专家QA增删改或知识库数据集变化时整体失效。
+失效通过Redis中的代数计数器同步到所有副本。
+"""
+import asyncio
+import re
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+from config.utils import config_manager
+from common.logging import get_logger
+from common.metrics import metrics
+from text2kb.retrieval import get_dataset_info
+from . import models
+
+logger = get_logger("agents.answer_cache")
+
+_graph_config = config_manager.get_agents_config().get("graph", {})
+ANSWER_CACHE_ENABLED = _graph_config.get("answer_cache", False)
+ANSWER_CACHE_THRESHOLD = _graph_config.get("answer_cache_threshold", 0.95)
+ANSWER_CACHE_TTL = _graph_config.get("answer_cache_ttl", 3600)
+ANSWER_CACHE_MAX_ENTRIES = _graph_config.get("answer_cache_max_entries", 2000)
+ANSWER_CACHE_KB_CHECK_INTERVAL = _graph_config.get("answer_cache_kb_check_interval", 60)
+
+_text2kb_config = config_manager.get_text2kb_config()
+KB_ADDRESS = _text2kb_config.get("kb_address")
+KB_API_KEY = _text2kb_config.get("kb_api_key")
+KB_DATASET_NAME = _text2kb_config.get("kb_dataset_name")
+
+GENERATION_KEY = "answer_cache:generation"
+# 代数的检查间隔（秒），避免每次查询都访问Redis
+_GENERATION_CHECK_INTERVAL = 1.0
+_WHITESPACE = re.compile(r"\s+")
+# 中文等非ASCII字符两侧的空格没有意义
+_NON_ASCII_SPACE = re.compile(r"(?<=[^\x00-\x7f]) | (?=[^\x00-\x7f])")
+
+
+def normalize_query(query: str) -> str:
+    """规范化问题：全半角统一、小写、去除标点和多余空白"""
+    text = unicodedata.normalize("NFKC", query or "").lower()
+    text = "".join(ch for ch in text if not unicodedata.category(ch).startswith("P"))
+    return _NON_ASCII_SPACE.sub("", _WHITESPACE.sub(" ", text)).strip()
+
+
+class CachedAnswer:
+    """一条缓存的答案"""
+
+    __slots__ = ("query", "answer", "images", "created")
+
+    def __init__(self, query: str, answer: str, images: Optional[str], created: float):
+        self.query = query
+        self.answer = answer
+        self.images = images
+        self.created = created
+
+
+class _LanguageBucket:
+    """单个语言的缓存：环形数组存放向量，写满后覆盖最旧的条目，过期条目在查找时清除"""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.vectors: Optional[np.ndarray] = None
+        self.entries: List[Optional[CachedAnswer]] = [None] * capacity
+        # 各槽位的写入时间，空槽为 -inf，用于在取最近邻前屏蔽过期条目
+        self.created = np.full(capacity, -np.inf)
+        self.exact: Dict[str, int] = {}
+        self.next_slot = 0
+        # size 为有效条目数，filled 为写入过的槽位前缀长度
+        self.size = 0
+        self.filled = 0
+
+    def put(self, key: str, vector: Optional[np.ndarray], entry: CachedAnswer):
+        if key in self.exact:
+            slot = self.exact[key]
+        else:
+            slot = self.next_slot
+            self.next_slot = (self.next_slot + 1) % self.capacity
+            old = self.entries[slot]
+            if old is not None:
+                self.exact.pop(old.query, None)
+            else:
+                self.size += 1
+                self.filled = max(self.filled, slot + 1)
+            self.exact[key] = slot
+        if vector is not None:
+            if self.vectors is None:
+                self.vectors = np.zeros((self.capacity, vector.shape[0]), dtype=np.float32)
+            self.vectors[slot] = vector
+        elif self.vectors is not None:
+            self.vectors[slot] = 0
+        self.entries[slot] = entry
+        self.created[slot] = entry.created
+
+    def evict(self, slot: int):
+        entry = self.entries[slot]
+        if entry is None:
+            return
+        self.exact.pop(entry.query, None)
+        self.entries[slot] = None
+        self.created[slot] = -np.inf
+        if self.vectors is not None:
+            self.vectors[slot] = 0
+        self.size -= 1
+
+    def nearest(self, vector: np.ndarray, expire_before: float) -> Tuple[Optional[CachedAnswer], float]:
+        """取未过期条目中的最近邻，写入时间早于 expire_before 的条目不参与比较并被清除"""
+        if self.vectors is None or self.size == 0:
+            return None, 0.0
+        scores = self.vectors[:self.filled] @ vector
+        expired = self.created[:self.filled] < expire_before
+        if expired.any():
+            for slot in np.flatnonzero(expired):
+                self.evict(int(slot))
+            scores[expired] = -np.inf
+            if expired.all():
+                return None, 0.0
+        slot = int(np.argmax(scores))
+        return self.entries[slot], float(scores[slot])
+
+
+class SemanticAnswerCache:
+    """进程内语义答案缓存，失效代数通过Redis跨副本同步"""
+
+    def __init__(self, threshold: float = ANSWER_CACHE_THRESHOLD, ttl: float = ANSWER_CACHE_TTL,
+                 max_entries: int = ANSWER_CACHE_MAX_ENTRIES, kb_check_interval: float = ANSWER_CACHE_KB_CHECK_INTERVAL,
+                 enabled: bool = ANSWER_CACHE_ENABLED):
+        self.enabled = enabled
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.kb_check_interval = kb_check_interval
+        self._buckets: Dict[str, _LanguageBucket] = {}
+        # 最近查询的向量，未命中后写入缓存时复用，避免重复计算
+        self._recent_vectors: "OrderedDict[Tuple[str, str], np.ndarray]" = OrderedDict()
+        self._redis = None
+        self._generation = 0
+        self._generation_checked_at = 0.0
+        self._kb_version: Optional[str] = None
+        self._kb_checked_at = 0.0
+        self._kb_check_task: Optional[asyncio.Task] = None
+        self._store_tasks: Set[asyncio.Task] = set()
+        # 每次清空递增，丢弃失效前开始、失效后才完成的写入
+        self._epoch = 0
+
+    def bind_redis(self, redis_client):
+        """绑定共享Redis客户端，用于跨副本同步失效"""
+        self._redis = redis_client
+
+    def size(self) -> int:
+        return sum(bucket.size for bucket in self._buckets.values())
+
+    async def _embed(self, text: str) -> np.ndarray:
+        vector = np.asarray(await models.emb_model.aembed_query(text), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    async def lookup(self, query: str, language: str) -> Optional[CachedAnswer]:
+        """查找缓存答案，未命中返回None"""
+        if not self.enabled:
+            return None
+        start = time.perf_counter()
+        await self._sync_generation()
+        self._maybe_check_kb_version()
+
+        key = normalize_query(query)
+        bucket = self._buckets.get(language)
+        result, similarity = "miss", 0.0
+        entry = None
+        if key and bucket is not None:
+            slot = bucket.exact.get(key)
+            if slot is not None and bucket.entries[slot].created < time.time() - self.ttl:
+                bucket.evict(slot)
+                slot, result = None, "expired"
+            if slot is not None:
+                entry, similarity, result = bucket.entries[slot], 1.0, "hit_exact"
+            else:
+                try:
+                    vector = await self._embed(key)
+                except Exception as e:
+                    logger.warning(f"计算问题向量失败，跳过语义缓存: {e}")
+                    vector = None
+                if vector is not None:
+                    self._remember_vector(language, key, vector)
+                    entry, similarity = bucket.nearest(vector, time.time() - self.ttl)
+                    if entry is not None and similarity >= self.threshold:
+                        result = "hit_semantic"
+                    else:
+                        entry = None
+
+        metrics.inc("answer_cache_lookup", result=result)
+        metrics.observe("answer_cache_lookup_seconds", time.perf_counter() - start, result=result)
+        if entry is not None:
+            metrics.observe("answer_cache_similarity", similarity)
+            logger.info(f"语义缓存命中({result}, 相似度 {similarity:.3f}): {query} -> {entry.query}")
+        return entry
+
+    async def store(self, query: str, language: str, answer: str, images: Optional[str] = None,
+                    epoch: Optional[int] = None):
+        """写入答案"""
+        if not self.enabled or not answer:
+            return
+        epoch = self._epoch if epoch is None else epoch
+        key = normalize_query(query)
+        if not key:
+            return
+        vector = self._recent_vectors.pop((language, key), None)
+        if vector is None:
+            try:
+                vector = await self._embed(key)
+            except Exception as e:
+                # 没有向量时仍可按规范化文本精确命中
+                logger.warning(f"计算问题向量失败，仅按文本缓存: {e}")
+        if epoch != self._epoch:
+            return
+        bucket = self._buckets.setdefault(language, _LanguageBucket(self.max_entries))
+        bucket.put(key, vector, CachedAnswer(key, answer, images, time.time()))
+        metrics.set_gauge("answer_cache_entries", self.size())
+
+    def schedule_store(self, query: str, language: str, answer: str, images: Optional[str] = None):
+        """在后台写入答案，不阻塞本轮对话结束"""
+        if not self.enabled or not answer:
+            return
+        task = asyncio.create_task(self.store(query, language, answer, images, self._epoch))
+        self._store_tasks.add(task)
+        task.add_done_callback(self._store_tasks.discard)
+
+    def _remember_vector(self, language: str, key: str, vector: np.ndarray):
+        self._recent_vectors[(language, key)] = vector
+        while len(self._recent_vectors) > 256:
+            self._recent_vectors.popitem(last=False)
+
+    def clear(self, reason: str):
+        """清空本地缓存"""
+        if self._buckets:
+            logger.info(f"语义答案缓存已失效: {reason}")
+        self._epoch += 1
+        self._buckets.clear()
+        self._recent_vectors.clear()
+        metrics.inc("answer_cache_invalidated", reason=reason)
+        metrics.set_gauge("answer_cache_entries", 0)
+
+    async def invalidate(self, reason: str):
+        """使所有副本上的缓存失效（专家QA或知识库变化时调用）"""
+        self.clear(reason)
+        if self._redis is None:
+            return
+        try:
+            self._generation = int(await self._redis.incr(GENERATION_KEY))
+        except Exception as e:
+            logger.warning(f"同步语义缓存失效失败: {e}")
+
+    async def _sync_generation(self):
+        if self._redis is None:
+            return
+        now = time.perf_counter()
+        if now - self._generation_checked_at < _GENERATION_CHECK_INTERVAL:
+            return
+        self._generation_checked_at = now
+        try:
+            generation = int(await self._redis.get(GENERATION_KEY) or 0)
+        except Exception as e:
+            logger.warning(f"读取语义缓存代数失败: {e}")
+            return
+        if generation != self._generation:
+            self._generation = generation
+            self.clear("remote_invalidation")
+
+    def _maybe_check_kb_version(self):
+        if not KB_ADDRESS or not KB_DATASET_NAME:
+            return
+        now = time.perf_counter()
+        if now - self._kb_checked_at < self.kb_check_interval:
+            return
+        if self._kb_check_task is not None and not self._kb_check_task.done():
+            return
+        self._kb_checked_at = now
+        self._kb_check_task = asyncio.create_task(self._check_kb_version())
+
+    async def _check_kb_version(self):
+        """知识库数据集的分块数或更新时间变化时失效"""
+        try:
+            dataset = await get_dataset_info(KB_ADDRESS, KB_DATASET_NAME, KB_API_KEY)
+        except Exception as e:
+            logger.warning(f"检查知识库版本失败: {e}")
+            return
+        if not dataset:
+            return
+        version = f"{dataset.get('id')}:{dataset.get('chunk_count')}:{dataset.get('update_time')}"
+        if self._kb_version is not None and version != self._kb_version:
+            await self.invalidate("kb_changed")
+        self._kb_version = version
+
+
+# 机场知识问答的语义答案缓存
+airport_answer_cache = SemanticAnswerCache()
@@ -0,0 +1,246 @@
+"""
+情感识别推理
+
+HuggingFace pipeline 的CPU前向计算如果直接在协程中调用，会阻塞整个事件循环（连同该进程上的所有WebSocket）。
+这里把推理放到专用的单线程执行器中，并把并发请求动态合并成批：
+
+- 请求进入有界队列，队列满时直接按中性处理
+- 执行器忙时到达的请求自然积累，下一批一次取走（最多 max_batch_size 条）；
+  执行器空闲时最多等待 max_wait_ms 凑批
+- 单个请求超过 timeout 未完成即按中性处理，不拖慢对话
+
+推理后端：
+- transformers（默认）：AutoModelForSequenceClassification + pipeline
+- onnx：ONNX Runtime CPU推理（可选依赖 onnx），可使用int8动态量化后的模型。
+  模型目录需包含导出的onnx文件和tokenizer/config，导出和量化需要可选依赖 onnx-export，例如：
+    optimum-cli export onnx --model tabularisai/multilingual-sentiment-analysis --task text-classification <模型目录>
+  量化：python tools/benchmarks/bench_emotion.py --quantize <模型目录>
+
+torch 和 onnxruntime 在前向计算期间都会释放GIL，因此使用线程而不是进程执行器，避免在进程间复制模型。
+"""
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
+
+from config.utils import config_manager
+from common.logging import get_logger
+from common.metrics import metrics
+
+os.environ["TOKENIZERS_PARALLELISM"] = "false"
+
+logger = get_logger("agents.emotion_classifier")
+
+_emotion_config = config_manager.get_agents_config().get("emotions", {})
+EMOTION_MODEL_PATH = _emotion_config.get("model_path", "tabularisai/multilingual-sentiment-analysis")
+EMOTION_BACKEND = _emotion_config.get("backend", "transformers")
+EMOTION_ONNX_FILE = _emotion_config.get("onnx_file", "model.onnx")
+EMOTION_THREADS = _emotion_config.get("threads", 0)
+EMOTION_MAX_BATCH_SIZE = _emotion_config.get("max_batch_size", 16)
+EMOTION_MAX_WAIT_MS = _emotion_config.get("max_wait_ms", 5)
+EMOTION_QUEUE_SIZE = _emotion_config.get("queue_size", 256)
+EMOTION_TIMEOUT = _emotion_config.get("timeout", 2.0)
+EMOTION_WARMUP = _emotion_config.get("warmup", False)
+
+# 情感标签 -> 分数，分数越低越负面
+EMOTION_LABEL_SCORES = {"Very Negative": 0, "Negative": 1, "Neutral": 2, "Positive": 3, "Very Positive": 4}
+NEUTRAL_LABEL = "Neutral"
+# 模型加载失败后的重试间隔（秒）
+_LOAD_RETRY_INTERVAL = 60
+_MAX_LENGTH = 512
+
+
+class TransformersEmotionBackend:
+    """transformers pipeline 推理后端"""
+
+    def __init__(self, model_path: str, threads: int = 0):
+        import torch
+        from transformers import pipeline, AutoTokenizer, AutoModelForSequenceClassification
+
+        if threads:
+            torch.set_num_threads(threads)
+        device = torch.device("cuda:0" if torch.cuda.is_available() else "cpu")
+        logger.info(f"情感分析模型使用设备: {device}")
+        tokenizer = AutoTokenizer.from_pretrained(model_path)
+        model = AutoModelForSequenceClassification.from_pretrained(model_path).to(device)
+        self._pipeline = pipeline(
+            "text-classification",
+            model=model,
+            tokenizer=tokenizer,
+            device=0 if torch.cuda.is_available() else -1
+        )
+
+    def predict(self, texts: List[str]) -> List[str]:
+        results = self._pipeline(texts, batch_size=len(texts), truncation=True, max_length=_MAX_LENGTH)
+        return [result["label"] for result in results]
+
+
+class OnnxEmotionBackend:
+    """ONNX Runtime CPU推理后端"""
+
+    def __init__(self, model_path: str, onnx_file: str = "model.onnx", threads: int = 0):
+        import numpy as np
+        import onnxruntime as ort
+        from transformers import AutoConfig, AutoTokenizer
+
+        self._np = np
+        options = ort.SessionOptions()
+        if threads:
+            options.intra_op_num_threads = threads
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        onnx_path = onnx_file if os.path.isabs(onnx_file) else os.path.join(model_path, onnx_file)
+        self._session = ort.InferenceSession(onnx_path, sess_options=options, providers=["CPUExecutionProvider"])
+        self._input_names = [node.name for node in self._session.get_inputs()]
+        self._tokenizer = AutoTokenizer.from_pretrained(model_path)
+        self._id2label = AutoConfig.from_pretrained(model_path).id2label
+        logger.info(f"情感分析ONNX模型加载完成: {onnx_path}")
+
+    def predict(self, texts: List[str]) -> List[str]:
+        encoded = self._tokenizer(texts, padding=True, truncation=True, max_length=_MAX_LENGTH, return_tensors="np")
+        inputs = {name: encoded[name].astype(self._np.int64) for name in self._input_names if name in encoded}
+        logits = self._session.run(None, inputs)[0]
+        return [self._id2label[int(index)] for index in logits.argmax(axis=-1)]
+
+
+def create_emotion_backend(backend: str = EMOTION_BACKEND, model_path: str = EMOTION_MODEL_PATH,
+                           onnx_file: str = EMOTION_ONNX_FILE, threads: int = EMOTION_THREADS):
+    """按配置创建推理后端（在推理线程中调用，加载模型不阻塞事件循环）"""
+    if backend == "onnx":
+        return OnnxEmotionBackend(model_path, onnx_file, threads)
+    return TransformersEmotionBackend(model_path, threads)
+
+
+class EmotionClassifier:
+    """在专用线程中批量执行情感识别，失败、超时或过载时返回中性"""
+
+    def __init__(self, backend_factory=create_emotion_backend, max_batch_size: int = EMOTION_MAX_BATCH_SIZE,
+                 max_wait_ms: float = EMOTION_MAX_WAIT_MS, queue_size: int = EMOTION_QUEUE_SIZE,
+                 timeout: float = EMOTION_TIMEOUT):
+        """
+        Args:
+            backend_factory: 创建推理后端的函数，首次推理时在推理线程中调用
+            max_batch_size: 单批最多条数
+            max_wait_ms: 执行器空闲时凑批的最长等待（毫秒）
+            queue_size: 等待队列长度上限
+            timeout: 单个请求的超时（秒）
+        """
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait_ms / 1000
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self._backend_factory = backend_factory
+        self._backend = None
+        self._load_failed_at: Optional[float] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+
+    def _ensure_worker(self):
+        if self._worker is None or self._worker.done():
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="emotion")
+            self._queue = asyncio.Queue(maxsize=self.queue_size)
+            self._worker = asyncio.create_task(self._run())
+
+    async def classify(self, text: str) -> str:
+        """返回情感标签（Very Negative / Negative / Neutral / Positive / Very Positive）"""
+        self._ensure_worker()
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self._queue.put_nowait((text, future))
+        except asyncio.QueueFull:
+            metrics.inc("emotion_requests", result="rejected")
+            logger.warning("情感识别队列已满，按中性处理")
+            return NEUTRAL_LABEL
+        metrics.set_gauge("emotion_queue_depth", self._queue.qsize())
+
+        try:
+            label = await asyncio.wait_for(asyncio.shield(future), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            # 请求留在队列里会在出队时被跳过，已开始的推理结果直接丢弃
+            future.cancel()
+            metrics.inc("emotion_requests", result="timeout")
+            logger.warning(f"情感识别超时（{self.timeout}s），按中性处理")
+            return NEUTRAL_LABEL
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            metrics.inc("emotion_requests", result="error")
+            logger.error(f"情感分析出错: {e}")
+            return NEUTRAL_LABEL
+        metrics.inc("emotion_requests", result="ok")
+        return label
+
+    async def _next_batch(self) -> List[Tuple[str, asyncio.Future]]:
+        batch = [await self._queue.get()]
+        self._drain(batch)
+        if len(batch) < self.max_batch_size and self.max_wait > 0:
+            await asyncio.sleep(self.max_wait)
+            self._drain(batch)
+        metrics.set_gauge("emotion_queue_depth", self._queue.qsize())
+        # 跳过已超时或已取消的请求
+        return [item for item in batch if not item[1].done()]
+
+    def _drain(self, batch: List[Tuple[str, asyncio.Future]]):
+        while len(batch) < self.max_batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except asyncio.QueueEmpty:
+                return
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._next_batch()
+            if not batch:
+                continue
+            texts = [text for text, _ in batch]
+            start = time.perf_counter()
+            try:
+                labels = await loop.run_in_executor(self._executor, self._predict, texts)
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            metrics.observe("emotion_batch_size", len(texts))
+            metrics.observe("emotion_inference_seconds", time.perf_counter() - start)
+            for (_, future), label in zip(batch, labels):
+                if not future.done():
+                    future.set_result(label)
+
+    def _predict(self, texts: List[str]) -> List[str]:
+        """在推理线程中执行：首次调用时加载模型"""
+        if self._backend is None:
+            if self._load_failed_at is not None and time.monotonic() - self._load_failed_at < _LOAD_RETRY_INTERVAL:
+                raise RuntimeError("情感分析模型不可用")
+            try:
+                self._backend = self._backend_factory()
+                logger.info("情感分析模型初始化成功")
+            except Exception as e:
+                self._load_failed_at = time.monotonic()
+                logger.error(f"情感分析模型初始化失败: {e}")
+                raise
+        return self._backend.predict(texts)
+
+    async def warmup(self):
+        """在推理线程中预加载模型，避免首个请求等待模型加载"""
+        self._ensure_worker()
+        try:
+            await asyncio.get_running_loop().run_in_executor(self._executor, self._predict, ["你好"])
+        except Exception as e:
+            logger.warning(f"情感分析模型预加载失败: {e}")
+
+    def shutdown(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            self._worker = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+
+# 进程内共享的情感识别器
+emotion_classifier = EmotionClassifier()
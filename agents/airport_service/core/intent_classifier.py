@@ -0,0 +1,290 @@
+"""
+本地意图分类器
+
+主路由每轮都调用远程LLM，只为从 flight_query / business_service / airport_info 中选一个标签。
+本地分类器放在LLM之前，只在把握足够时给出结果，否则返回None交由LLM判断：
+
+- 规则：问题只有航班号（及"查一下"、"航班"等虚词）或带航班号询问起降/延误/登机口/转盘 → flight_query；
+  打招呼、感谢、告别等社交性对话 → airport_info。带航班号的其他问题（"我坐CA1234可以带充电宝吗"）不走规则
+- 精确匹配：规范化后的问题与已标注样本完全一致
+- 向量kNN：与已标注样本的余弦相似度加权投票，票数占比和相似度都超过阈值才采用
+
+标注样本来自主路由智能体存储的历史对话（问题 → 路由结果），后台定期刷新；
+LLM每次给出的判断也会在线加入样本。
+意图依赖上下文的追问（"什么时候起飞"）由上一轮路由结果约束：样本判断与上一轮意图不一致时交由LLM。
+"""
+import asyncio
+import re
+import time
+from typing import Dict, Optional, Set, Tuple
+
+import numpy as np
+
+from config.utils import config_manager
+from common.logging import get_logger
+from common.metrics import metrics
+from .answer_cache import normalize_query
+from . import models
+from .utils import FLIGHT_NUMBER_IN_TEXT
+
+logger = get_logger("agents.intent_classifier")
+
+_graph_config = config_manager.get_agents_config().get("graph", {})
+INTENT_CLASSIFIER_ENABLED = _graph_config.get("intent_classifier", False)
+INTENT_CLASSIFIER_THRESHOLD = _graph_config.get("intent_classifier_threshold", 0.8)
+INTENT_CLASSIFIER_MIN_SIMILARITY = _graph_config.get("intent_classifier_min_similarity", 0.85)
+INTENT_CLASSIFIER_K = _graph_config.get("intent_classifier_k", 7)
+INTENT_CLASSIFIER_MAX_EXAMPLES = _graph_config.get("intent_classifier_max_examples", 5000)
+INTENT_CLASSIFIER_REFRESH_INTERVAL = _graph_config.get("intent_classifier_refresh_interval", 3600)
+
+INTENT_LABELS = ("flight_query", "business_service", "airport_info")
+ROUTER_APPLICATION_ID = "机场主智能客服"
+ROUTER_AGENT_ID = "主路由智能体"
+
+# 社交性对话（规范化后完全匹配），按路由规则归类为 airport_info
+SOCIAL_PHRASES = {
+    "你好", "您好", "你好呀", "您好呀", "hi", "hello", "hey", "嗨", "哈喽", "在吗", "在不在",
+    "谢谢", "谢谢你", "谢谢您", "感谢", "多谢", "thanks", "thank you", "好的谢谢",
+    "再见", "拜拜", "bye", "goodbye", "早上好", "下午好", "晚上好",
+}
+# 带航班号时按航班动态处理的关键词（规范化后匹配）
+FLIGHT_STATUS_KEYWORDS = (
+    "起飞", "到达", "抵达", "到哪", "降落", "落地", "延误", "晚点", "准点", "登机口", "转盘", "动态", "状态",
+    "status", "departure", "arrival", "delay", "gate", "baggage claim",
+)
+# 去掉航班号后可以忽略的虚词，剩余为空说明问题只是在查这个航班
+_FLIGHT_FILLER = re.compile(r"请问|帮我|帮忙|麻烦|查询|查一下|查下|查|看一下|看看|航班|信息|情况|怎么样了|怎么样|现在|今天|明天|一下|的|呢|吗|了|flight")
+# kNN投票至少需要的有效近邻数
+_MIN_NEIGHBORS = 2
+
+
+def _is_flight_status_query(query: str) -> bool:
+    """
+    带航班号且明显是查航班动态的问题。提到航班号的规定类问题（"CZ3456需要提前多久到机场"）
+    路由提示词归为 airport_info，交由样本或LLM判断
+    """
+    upper = (query or "").upper()
+    if not FLIGHT_NUMBER_IN_TEXT.search(upper):
+        return False
+    rest = normalize_query(FLIGHT_NUMBER_IN_TEXT.sub(" ", upper))
+    return not _FLIGHT_FILLER.sub("", rest).strip() or any(keyword in rest for keyword in FLIGHT_STATUS_KEYWORDS)
+
+
+class IntentDecision:
+    """本地分类结果"""
+
+    __slots__ = ("label", "confidence", "source")
+
+    def __init__(self, label: str, confidence: float, source: str):
+        self.label = label
+        self.confidence = confidence
+        self.source = source
+
+    def __repr__(self) -> str:
+        return f"IntentDecision({self.label}, {self.confidence:.2f}, {self.source})"
+
+
+class LocalIntentClassifier:
+    """规则 + 标注样本kNN的意图分类器，把握不足时返回None"""
+
+    def __init__(self, enabled: bool = INTENT_CLASSIFIER_ENABLED, threshold: float = INTENT_CLASSIFIER_THRESHOLD,
+                 min_similarity: float = INTENT_CLASSIFIER_MIN_SIMILARITY, k: int = INTENT_CLASSIFIER_K,
+                 max_examples: int = INTENT_CLASSIFIER_MAX_EXAMPLES,
+                 refresh_interval: float = INTENT_CLASSIFIER_REFRESH_INTERVAL):
+        """
+        Args:
+            threshold: 加权票数占比的下限
+            min_similarity: 参与投票的近邻的最低相似度
+            k: 近邻数
+            max_examples: 样本数量上限，超出时淘汰最早的样本
+            refresh_interval: 从历史对话刷新样本的间隔（秒）
+        """
+        self.enabled = enabled
+        self.threshold = threshold
+        self.min_similarity = min_similarity
+        self.k = k
+        self.max_examples = max_examples
+        self.refresh_interval = refresh_interval
+        # 规范化问题 -> 标签；dict保持插入顺序，用于淘汰最早的样本
+        self._labels: Dict[str, str] = {}
+        self._vectors: Dict[str, np.ndarray] = {}
+        self._matrix: Optional[np.ndarray] = None
+        self._matrix_labels: Optional[np.ndarray] = None
+        self._dirty = False
+        self._refreshed_at = 0.0
+        self._refresh_task: Optional[asyncio.Task] = None
+        self._learn_tasks: Set[asyncio.Task] = set()
+
+    def size(self) -> int:
+        return len(self._labels)
+
+    async def classify(self, query: str, previous_intent: Optional[str] = None) -> Optional[IntentDecision]:
+        """
+        在本地判断意图
+
+        Args:
+            query: 用户问题
+            previous_intent: 上一轮的路由结果，用于判断追问是否延续了上一轮的意图
+
+        Returns:
+            把握足够时返回分类结果，否则返回None
+        """
+        if not self.enabled:
+            return None
+        start = time.perf_counter()
+        self._maybe_refresh()
+        decision = self._classify_by_rules(query)
+        if decision is None:
+            decision = await self._classify_by_examples(query)
+            # 样本不含上下文：与上一轮意图不一致的可能是依赖上下文的追问，交由LLM判断
+            if decision is not None and previous_intent in INTENT_LABELS and decision.label != previous_intent:
+                metrics.inc("intent_classifier_context_deferred")
+                decision = None
+
+        result = decision.source if decision is not None else "fallback"
+        metrics.inc("intent_classifier", result=result)
+        metrics.observe("intent_classifier_seconds", time.perf_counter() - start, result=result)
+        if decision is not None:
+            logger.info(f"本地意图分类: {query} -> {decision}")
+        return decision
+
+    def _classify_by_rules(self, query: str) -> Optional[IntentDecision]:
+        if _is_flight_status_query(query):
+            return IntentDecision("flight_query", 1.0, "rule")
+        if normalize_query(query) in SOCIAL_PHRASES:
+            return IntentDecision("airport_info", 1.0, "rule")
+        return None
+
+    async def _classify_by_examples(self, query: str) -> Optional[IntentDecision]:
+        key = normalize_query(query)
+        if not key or not self._labels:
+            return None
+        label = self._labels.get(key)
+        if label is not None:
+            return IntentDecision(label, 1.0, "exact")
+
+        try:
+            vector = await self._embed(key)
+        except Exception as e:
+            logger.warning(f"计算问题向量失败，跳过本地意图分类: {e}")
+            return None
+        matrix, labels = self._get_matrix()
+        if matrix is None:
+            return None
+
+        scores = matrix @ vector
+        k = min(self.k, scores.shape[0])
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[scores[top] >= self.min_similarity]
+        if top.shape[0] < _MIN_NEIGHBORS:
+            return None
+        votes: Dict[str, float] = {}
+        for index in top:
+            votes[labels[index]] = votes.get(labels[index], 0.0) + float(scores[index])
+        label, weight = max(votes.items(), key=lambda item: item[1])
+        confidence = weight / sum(votes.values())
+        if confidence < self.threshold:
+            return None
+        return IntentDecision(label, confidence, "knn")
+
+    async def _embed(self, text: str) -> np.ndarray:
+        vector = np.asarray(await models.emb_model.aembed_query(text), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _get_matrix(self) -> Tuple[Optional[np.ndarray], Optional[np.ndarray]]:
+        """样本变化后才重建矩阵"""
+        if self._dirty or self._matrix is None:
+            keys = [key for key in self._labels if key in self._vectors]
+            if keys:
+                self._matrix = np.stack([self._vectors[key] for key in keys])
+                self._matrix_labels = np.array([self._labels[key] for key in keys])
+            else:
+                self._matrix, self._matrix_labels = None, None
+            self._dirty = False
+        return self._matrix, self._matrix_labels
+
+    def _put(self, key: str, label: str, vector: Optional[np.ndarray]):
+        self._labels.pop(key, None)
+        self._labels[key] = label
+        if vector is not None:
+            self._vectors[key] = vector
+        while len(self._labels) > self.max_examples:
+            oldest = next(iter(self._labels))
+            del self._labels[oldest]
+            self._vectors.pop(oldest, None)
+        self._dirty = True
+
+    async def learn(self, query: str, label: str):
+        """加入一条LLM判断的样本"""
+        if not self.enabled or label not in INTENT_LABELS:
+            return
+        key = normalize_query(query)
+        if not key or self._labels.get(key) == label:
+            return
+        try:
+            vector = await self._embed(key)
+        except Exception as e:
+            logger.warning(f"计算样本向量失败: {e}")
+            return
+        self._put(key, label, vector)
+        metrics.set_gauge("intent_classifier_examples", self.size())
+
+    def schedule_learn(self, query: str, label: str):
+        """在后台加入样本，不阻塞路由"""
+        if not self.enabled or label not in INTENT_LABELS:
+            return
+        task = asyncio.create_task(self.learn(query, label))
+        self._learn_tasks.add(task)
+        task.add_done_callback(self._learn_tasks.discard)
+
+    def _maybe_refresh(self):
+        now = time.perf_counter()
+        if self._refreshed_at and now - self._refreshed_at < self.refresh_interval:
+            return
+        if self._refresh_task is not None and not self._refresh_task.done():
+            return
+        self._refreshed_at = now
+        self._refresh_task = asyncio.create_task(self.refresh())
+
+    async def refresh(self):
+        """从主路由智能体的历史对话中收集标注样本"""
+        try:
+            # 延迟导入，避免与记忆管理模块循环导入
+            from agents.airport_service.context_engineering.memory_manager import memory_manager
+            conversations = await memory_manager.get_conversation_history(
+                application_id=ROUTER_APPLICATION_ID,
+                agent_id=ROUTER_AGENT_ID,
+                limit=self.max_examples
+            )
+        except Exception as e:
+            logger.warning(f"加载意图分类样本失败: {e}")
+            return
+
+        examples: Dict[str, str] = {}
+        for conversation in conversations:
+            key = normalize_query(conversation.get("query", ""))
+            label = (conversation.get("response") or "").strip()
+            if key and label in INTENT_LABELS:
+                examples[key] = label
+        missing = [key for key in examples if key not in self._vectors]
+        try:
+            vectors = await models.emb_model.aembed_documents(missing) if missing else []
+        except Exception as e:
+            logger.warning(f"计算意图分类样本向量失败: {e}")
+            return
+        for key, vector in zip(missing, vectors):
+            vector = np.asarray(vector, dtype=np.float32)
+            norm = np.linalg.norm(vector)
+            self._vectors[key] = vector / norm if norm else vector
+        for key, label in examples.items():
+            self._put(key, label, None)
+        # 清理已被淘汰样本的向量
+        for key in [key for key in self._vectors if key not in self._labels]:
+            del self._vectors[key]
+        metrics.set_gauge("intent_classifier_examples", self.size())
+        logger.info(f"意图分类样本已刷新: {len(examples)} 条历史样本，共 {self.size()} 条")
+
+
+# 主路由的本地意图分类器
+intent_classifier = LocalIntentClassifier()
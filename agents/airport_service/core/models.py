@@ -1,29 +1,42 @@
 """
 共享的模型实例定义
 避免循环导入问题
+
+模型客户端在首次访问（如 models.structed_model）时才构建，
+也可以在应用启动时通过 component_registry.warmup() 预构建。
 """
-from langchain_openai import ChatOpenAI
-from langchain_openai import OpenAIEmbeddings
 from config.utils import config_manager
+from common.registry import component_registry
 
 # 从配置文件获取模型配置
 llm_model_config = config_manager.get_agents_config().get("llm", {})
 emb_model_config = config_manager.get_agents_config().get("embedding", {})
 
+MODEL_NAMES = ("content_model", "base_model", "structed_model", "image_model", "emb_model")
 
 
-# 创建共用模型实
-if llm_model_config.get("enable_thinking") == True:
-    content_model = ChatOpenAI(
+def _build_content_model():
+    from langchain_openai import ChatOpenAI
+    if llm_model_config.get("enable_thinking") == True:
+        return ChatOpenAI(
+            model_name=llm_model_config.get("model"),
+            temperature=llm_model_config.get("temperature", 0.7),
+            extra_body={"thinking":{"type":"enabled"}},
+            streaming=True,
+            openai_api_key=llm_model_config.get("api_key"),
+            openai_api_base=llm_model_config.get("base_url")
+        )
+    return ChatOpenAI(
         model_name=llm_model_config.get("model"),
         temperature=llm_model_config.get("temperature", 0.7),
-        extra_body={"thinking":{"type":"enabled"}},
-        streaming=True,
         openai_api_key=llm_model_config.get("api_key"),
         openai_api_base=llm_model_config.get("base_url")
     )
-else:
-    content_model = ChatOpenAI(
+
+
+def _build_base_model():
+    from langchain_openai import ChatOpenAI
+    return ChatOpenAI(
         model_name=llm_model_config.get("model"),
         temperature=llm_model_config.get("temperature", 0.7),
         openai_api_key=llm_model_config.get("api_key"),
@@ -31,31 +44,45 @@ else:
     )
 
 
-base_model = ChatOpenAI(
-    model_name=llm_model_config.get("model"),
-    temperature=llm_model_config.get("temperature", 0.7),
-    openai_api_key=llm_model_config.get("api_key"),
-    openai_api_base=llm_model_config.get("base_url")
-)
-structed_model = ChatOpenAI(
-    model_name=llm_model_config.get("router_model"),
-    temperature=llm_model_config.get("router_temperature", 0.7),
-    openai_api_key=llm_model_config.get("router_api_key"),
-    openai_api_base=llm_model_config.get("router_base_url")
-)
-
-
-image_model = ChatOpenAI(
-    model_name=llm_model_config.get("image_thinking_model"),
-    temperature=llm_model_config.get("image_thinking_temperature", 0.7),
-    openai_api_key=llm_model_config.get("image_thinking_api_key"),
-    openai_api_base=llm_model_config.get("image_thinking_base_url")
-)
-
-
-emb_model = OpenAIEmbeddings(
-    model=emb_model_config.get("embedding_model"),
-    openai_api_key=emb_model_config.get("api_key"),
-    openai_api_base=emb_model_config.get("base_url"),
-    # dimensions=emb_model_config.get("dimensions")
-)
\ No newline at end of file
+def _build_structed_model():
+    from langchain_openai import ChatOpenAI
+    return ChatOpenAI(
+        model_name=llm_model_config.get("router_model"),
+        temperature=llm_model_config.get("router_temperature", 0.7),
+        openai_api_key=llm_model_config.get("router_api_key"),
+        openai_api_base=llm_model_config.get("router_base_url")
+    )
+
+
+def _build_image_model():
+    from langchain_openai import ChatOpenAI
+    return ChatOpenAI(
+        model_name=llm_model_config.get("image_thinking_model"),
+        temperature=llm_model_config.get("image_thinking_temperature", 0.7),
+        openai_api_key=llm_model_config.get("image_thinking_api_key"),
+        openai_api_base=llm_model_config.get("image_thinking_base_url")
+    )
+
+
+def _build_emb_model():
+    from langchain_openai import OpenAIEmbeddings
+    return OpenAIEmbeddings(
+        model=emb_model_config.get("embedding_model"),
+        openai_api_key=emb_model_config.get("api_key"),
+        openai_api_base=emb_model_config.get("base_url"),
+        # dimensions=emb_model_config.get("dimensions")
+    )
+
+
+component_registry.register("content_model", _build_content_model)
+component_registry.register("base_model", _build_base_model)
+component_registry.register("structed_model", _build_structed_model)
+component_registry.register("image_model", _build_image_model)
+component_registry.register("emb_model", _build_emb_model)
+
+
+def __getattr__(name):
+    # 模块级属性按需构建：models.structed_model / from .models import structed_model
+    if name in MODEL_NAMES:
+        return component_registry.get(name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
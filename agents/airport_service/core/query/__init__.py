@@ -1,13 +1,17 @@
 """
 查询处理模块
 
-提供查询转换和重排序功能
+提供查询转换、多路检索结果融合和重排序功能
 """
 
 from .transform import comprehensive_query_transform
-from .rerank import rerank_results
+from .rerank import rerank_results, rerank_enabled, close_rerank_services
+from .fusion import fuse_candidates
 
 __all__ = [
     "comprehensive_query_transform",
-    "rerank_results"
+    "rerank_results",
+    "rerank_enabled",
+    "close_rerank_services",
+    "fuse_candidates"
 ] 
\ No newline at end of file
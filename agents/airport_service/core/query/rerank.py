@@ -1,64 +1,463 @@
+"""
+重排序服务
+
+- 共享 aiohttp 会话（连接池 + keep-alive），请求带超时
+- (规范化问题, 分块哈希) -> 相关性分数 的 LRU + TTL 缓存，热门问题重复出现时不再重复打分
+- 请求合并：同一问题在 batch_window_ms 内的并发重排调用合并为一次上游请求，只发送缓存未命中的分块，
+  结果再拆分回各调用方；已在上游打分中的分块直接等待该请求的结果
+  （重排接口一次只接受一个问题，不同问题仍各自发送请求）
+
+打分后端（RERANKER_BACKEND）：
+- http（默认）：OpenAI 风格的 /v1/rerank 接口（xinference、SiliconFlow 等）
+- onnx：本地 CPU 交叉编码器（可选依赖 onnx），模型目录需包含导出的onnx文件和tokenizer/config，
+  导出需要可选依赖 onnx-export，例如：
+    optimum-cli export onnx --model BAAI/bge-reranker-base --task text-classification <模型目录>
+  推理在线程池中执行，并发请求的 (问题, 分块) 对动态合并成批；onnxruntime 前向计算释放GIL，多个线程可以占满多核
+"""
 import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
 import aiohttp
+
+from config.utils import config_manager
+from common.cache import AsyncResultCache
 from common.logging import get_logger
+from common.metrics import metrics
+from common.registry import component_registry
+from common.utils import generate_hash
+from ..answer_cache import normalize_query
 
 # 获取重排序专用日志记录器
 logger = get_logger("agents.utils.rerank")
 
+_text2kb_config = config_manager.get_text2kb_config()
+RERANKER_TIMEOUT = _text2kb_config.get("reranker_timeout", 10)
+RERANKER_CACHE_SIZE = _text2kb_config.get("reranker_cache_size", 4096)
+RERANKER_CACHE_TTL = _text2kb_config.get("reranker_cache_ttl", 3600)
+RERANKER_BATCH_WINDOW_MS = _text2kb_config.get("reranker_batch_window_ms", 5)
+RERANKER_MAX_BATCH_DOCUMENTS = _text2kb_config.get("reranker_max_batch_documents", 64)
+RERANKER_BACKEND = _text2kb_config.get("reranker_backend", "http")
+RERANKER_ONNX_MODEL_PATH = _text2kb_config.get("reranker_onnx_model_path")
+RERANKER_ONNX_FILE = _text2kb_config.get("reranker_onnx_file", "model.onnx")
+RERANKER_ONNX_THREADS = _text2kb_config.get("reranker_onnx_threads", 1)
+RERANKER_ONNX_WORKERS = _text2kb_config.get("reranker_onnx_workers", 0)
+RERANKER_ONNX_MAX_BATCH_SIZE = _text2kb_config.get("reranker_onnx_max_batch_size", 16)
+RERANKER_ONNX_MAX_WAIT_MS = _text2kb_config.get("reranker_onnx_max_wait_ms", 2)
+RERANKER_MAX_LENGTH = _text2kb_config.get("reranker_max_length", 512)
+
+# 送入重排的分块截断长度
+MAX_DOCUMENT_CHARS = 500
+
+
+class _RerankBatch:
+    """同一问题待发送的一批分块，完成后 future 的结果为 {分块哈希: 分数}"""
+
+    __slots__ = ("query", "documents", "future", "callers")
+
+    def __init__(self, query: str, future: asyncio.Future):
+        self.query = query
+        self.documents: Dict[str, str] = {}
+        self.future = future
+        self.callers = 0
+
+
+class HttpRerankBackend:
+    """HTTP 重排接口（OpenAI 风格 /v1/rerank），共享连接池"""
+
+    name = "http"
+
+    def __init__(self, model: str, address: str, api_key: Optional[str] = None, timeout: float = RERANKER_TIMEOUT):
+        self.model = model
+        self.address = address
+        self.api_key = api_key
+        self._timeout = aiohttp.ClientTimeout(total=timeout)
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._session_loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        loop = asyncio.get_running_loop()
+        if self._session is None or self._session.closed or self._session_loop is not loop:
+            headers = {"Content-Type": "application/json"}
+            if self.api_key:
+                headers["Authorization"] = f"Bearer {self.api_key}"
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=50, keepalive_timeout=30),
+                timeout=self._timeout,
+                headers=headers
+            )
+            self._session_loop = loop
+        return self._session
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+        self._session_loop = None
+
+    async def score(self, query: str, documents: List[str]) -> List[float]:
+        payload = {
+            "model": self.model,
+            "query": query,
+            "documents": documents,
+            "top_n": len(documents)
+        }
+        async with self._get_session().post(self.address, json=payload) as response:
+            if response.status != 200:
+                error_text = await response.text()
+                raise RuntimeError(f"重排序 API 调用失败，状态码: {response.status}，错误详情: {error_text}")
+            result_data = await response.json()
+        if "results" not in result_data:
+            raise RuntimeError("重排序响应格式异常")
+        scores = [0.0] * len(documents)
+        for item in result_data["results"]:
+            scores[item["index"]] = item["relevance_score"]
+        return scores
+
+
+class OnnxCrossEncoder:
+    """ONNX Runtime CPU 交叉编码器，输出经 sigmoid 映射到 0~1（与重排接口的 relevance_score 一致）"""
+
+    def __init__(self, model_path: str, onnx_file: str = "model.onnx", threads: int = 1,
+                 max_length: int = RERANKER_MAX_LENGTH):
+        import numpy as np
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        self._np = np
+        self.max_length = max_length
+        options = ort.SessionOptions()
+        if threads:
+            options.intra_op_num_threads = threads
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        onnx_path = onnx_file if os.path.isabs(onnx_file) else os.path.join(model_path, onnx_file)
+        self._session = ort.InferenceSession(onnx_path, sess_options=options, providers=["CPUExecutionProvider"])
+        self._input_names = [node.name for node in self._session.get_inputs()]
+        self._tokenizer = AutoTokenizer.from_pretrained(model_path)
+        logger.info(f"重排序ONNX模型加载完成: {onnx_path}")
+
+    def predict(self, pairs: List[Tuple[str, str]]) -> List[float]:
+        """线程安全：InferenceSession.run 可并发调用"""
+        np = self._np
+        encoded = self._tokenizer(
+            [query for query, _ in pairs], [document for _, document in pairs],
+            padding=True, truncation="only_second", max_length=self.max_length, return_tensors="np"
+        )
+        inputs = {name: encoded[name].astype(np.int64) for name in self._input_names if name in encoded}
+        logits = self._session.run(None, inputs)[0]
+        # 单输出为相关性logit；双输出按二分类取正类
+        logits = logits[:, 0] if logits.shape[-1] == 1 else logits[:, 1] - logits[:, 0]
+        return (1 / (1 + np.exp(-logits))).tolist()
+
+
+class OnnxRerankBackend:
+    """
+    本地交叉编码器后端
+
+    并发请求先进入队列，在 max_wait_ms 内合并成最多 max_batch_size 对的批次；
+    单个请求超过批大小时拆成多批。批次在 workers 个线程中并行推理，按分块长度排序后再切批以减少padding。
+    """
+
+    name = "onnx"
+
+    def __init__(self, encoder_factory: Callable[[], OnnxCrossEncoder], workers: int = RERANKER_ONNX_WORKERS,
+                 max_batch_size: int = RERANKER_ONNX_MAX_BATCH_SIZE, max_wait_ms: float = RERANKER_ONNX_MAX_WAIT_MS):
+        """
+        Args:
+            encoder_factory: 创建交叉编码器的函数，首次推理时在推理线程中调用
+            workers: 推理线程数，0表示CPU核数
+            max_batch_size: 单批最多 (问题, 分块) 对数
+            max_wait_ms: 凑批的最长等待（毫秒）
+        """
+        self.workers = workers or os.cpu_count() or 1
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait_ms / 1000
+        self._encoder_factory = encoder_factory
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._tasks = set()
+
+    def _ensure_worker(self):
+        if self._worker is None or self._worker.done():
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="rerank")
+            self._queue = asyncio.Queue()
+            self._slots = asyncio.Semaphore(self.workers)
+            self._worker = asyncio.create_task(self._run())
+
+    async def score(self, query: str, documents: List[str]) -> List[float]:
+        self._ensure_worker()
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((query, documents, future))
+        return await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            requests = [await self._queue.get()]
+            pairs = len(requests[0][1])
+            deadline = loop.time() + self.max_wait
+            while pairs < self.max_batch_size:
+                try:
+                    request = self._queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        break
+                    try:
+                        request = await asyncio.wait_for(self._queue.get(), remaining)
+                    except asyncio.TimeoutError:
+                        break
+                requests.append(request)
+                pairs += len(request[1])
+            # 所有推理线程都忙时不再出队，后到的请求在队列中继续积累成更大的批
+            await self._slots.acquire()
+            task = loop.create_task(self._infer(requests))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _infer(self, requests: List[Tuple[str, List[str], asyncio.Future]]):
+        loop = asyncio.get_running_loop()
+        try:
+            pairs = [(query, document) for query, documents, _ in requests for document in documents]
+            order = sorted(range(len(pairs)), key=lambda i: len(pairs[i][1]))
+            # 均匀切批（如10对切成5+5而不是8+2），各线程负载相近
+            size = -(-len(order) // -(-len(order) // self.max_batch_size)) if order else 1
+            batches = [order[i:i + size] for i in range(0, len(order), size)]
+            metrics.observe("rerank_onnx_batch_pairs", len(pairs))
+            outputs = await asyncio.gather(*(
+                loop.run_in_executor(self._executor, self._predict, [pairs[i] for i in batch]) for batch in batches
+            ))
+            scores = [0.0] * len(pairs)
+            for batch, output in zip(batches, outputs):
+                for i, score in zip(batch, output):
+                    scores[i] = score
+            offset = 0
+            for _, documents, future in requests:
+                if not future.done():
+                    future.set_result(scores[offset:offset + len(documents)])
+                offset += len(documents)
+        except Exception as e:
+            for _, _, future in requests:
+                if not future.done():
+                    future.set_exception(e)
+        finally:
+            self._slots.release()
+
+    def _predict(self, pairs: List[Tuple[str, str]]) -> List[float]:
+        return self._encoder_factory().predict(pairs)
+
+    async def close(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            self._worker = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+
+class RerankService:
+    """重排序服务：分数缓存 + 请求合并，打分委托给后端"""
+
+    def __init__(self, backend, cache_size: int = RERANKER_CACHE_SIZE, cache_ttl: float = RERANKER_CACHE_TTL,
+                 batch_window_ms: float = RERANKER_BATCH_WINDOW_MS,
+                 max_batch_documents: int = RERANKER_MAX_BATCH_DOCUMENTS):
+        """
+        Args:
+            backend: 打分后端（HttpRerankBackend / OnnxRerankBackend）
+            cache_size: 分数缓存条数，0表示不缓存
+            cache_ttl: 分数缓存有效期（秒）
+            batch_window_ms: 合并并发调用的等待窗口（毫秒），0表示不等待
+            max_batch_documents: 单次后端请求的分块数上限，达到后立即发送
+        """
+        self.backend = backend
+        self.batch_window = batch_window_ms / 1000
+        self.max_batch_documents = max(1, max_batch_documents)
+        self._scores = AsyncResultCache("rerank_scores", max_entries=cache_size, ttl=cache_ttl)
+        self._pending: Dict[str, _RerankBatch] = {}
+        self._inflight: Dict[Tuple[str, str], asyncio.Future] = {}
+        # 持有发送任务的引用，避免任务未完成就被回收
+        self._tasks = set()
+
+    async def close(self):
+        await self.backend.close()
+
+    async def score(self, query: str, documents: List[str]) -> List[float]:
+        """
+        返回每个分块与问题的相关性分数（与 documents 一一对应）
+
+        上游请求失败时抛出异常
+        """
+        loop = asyncio.get_running_loop()
+        query_key = normalize_query(query)
+        hashes = [generate_hash(document) for document in documents]
+        scores: Dict[str, float] = {}
+        waits = set()
+        counts = {"hit": 0, "coalesced": 0, "miss": 0}
+        for chunk_hash, document in zip(hashes, documents):
+            if chunk_hash in scores:
+                continue
+            hit, value = self._scores.get_local(f"{query_key}:{chunk_hash}")
+            if hit:
+                scores[chunk_hash] = value
+                counts["hit"] += 1
+                continue
+            future = self._inflight.get((query_key, chunk_hash))
+            if future is not None:
+                # 其他调用方已把该分块加入批次或已发出请求
+                counts["coalesced"] += 1
+            else:
+                counts["miss"] += 1
+                batch = self._pending.get(query_key)
+                if batch is None:
+                    batch = self._pending[query_key] = _RerankBatch(query, loop.create_future())
+                    if self.batch_window > 0:
+                        loop.call_later(self.batch_window, self._flush, query_key, batch)
+                    else:
+                        loop.call_soon(self._flush, query_key, batch)
+                if batch.future not in waits:
+                    batch.callers += 1
+                batch.documents[chunk_hash] = document
+                future = self._inflight[(query_key, chunk_hash)] = batch.future
+                if len(batch.documents) >= self.max_batch_documents:
+                    self._flush(query_key, batch)
+            waits.add(future)
+
+        for result, count in counts.items():
+            metrics.inc("rerank_cache_lookups", count, result=result)
+        hits = metrics.get_counter("rerank_cache_lookups", result="hit")
+        total = hits + metrics.get_counter("rerank_cache_lookups", result="coalesced") + \
+            metrics.get_counter("rerank_cache_lookups", result="miss")
+        if total:
+            metrics.set_gauge("rerank_cache_hit_ratio", hits / total)
+
+        # 多个调用方共享同一个 future，单个调用方被取消时不能取消它
+        for batch_scores in await asyncio.gather(*(asyncio.shield(future) for future in waits)):
+            scores.update(batch_scores)
+        return [scores[chunk_hash] for chunk_hash in hashes]
+
+    def _flush(self, query_key: str, batch: _RerankBatch):
+        """发送一批分块（窗口到期或分块数达到上限时调用，重复调用无副作用）"""
+        if self._pending.get(query_key) is batch:
+            del self._pending[query_key]
+            task = asyncio.get_running_loop().create_task(self._send(query_key, batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _send(self, query_key: str, batch: _RerankBatch):
+        hashes = list(batch.documents)
+        metrics.observe("rerank_batch_documents", len(hashes))
+        metrics.observe("rerank_batch_callers", max(batch.callers, 1))
+        try:
+            scores = await self._request(batch.query, [batch.documents[h] for h in hashes])
+            result = dict(zip(hashes, scores))
+            for chunk_hash, score in result.items():
+                self._scores.set_local(f"{query_key}:{chunk_hash}", score)
+            batch.future.set_result(result)
+        except Exception as e:
+            batch.future.set_exception(e)
+            # 没有调用方等待时（均已取消）避免 "exception was never retrieved"
+            batch.future.exception()
+        finally:
+            for chunk_hash in hashes:
+                if self._inflight.get((query_key, chunk_hash)) is batch.future:
+                    del self._inflight[(query_key, chunk_hash)]
+
+    async def _request(self, query: str, documents: List[str]) -> List[float]:
+        start = time.perf_counter()
+        try:
+            scores = await self.backend.score(query, documents)
+        except asyncio.TimeoutError:
+            metrics.inc("rerank_requests", backend=self.backend.name, result="timeout")
+            raise
+        except Exception:
+            metrics.inc("rerank_requests", backend=self.backend.name, result="error")
+            raise
+        finally:
+            metrics.observe("rerank_request_seconds", time.perf_counter() - start, backend=self.backend.name)
+        metrics.inc("rerank_requests", backend=self.backend.name, result="ok")
+        return scores
+
+    async def rerank(self, results: List[Dict[str, Any]], query: str, top_k: int = 5) -> Tuple[List[Dict[str, Any]], float]:
+        """
+        对检索结果重排，返回 (前 top_k 个结果, 最高分数)；失败时返回原顺序的前 top_k 个和 0.0
+        """
+        documents = [item['content'].strip()[:MAX_DOCUMENT_CHARS] for item in results]
+        try:
+            scores = await self.score(query, documents)
+        except Exception as e:
+            logger.error(f"重排序过程发生错误: {str(e)}")
+            return results[:top_k], 0.0
+        ranked = sorted(zip(documents, scores), key=lambda item: item[1], reverse=True)[:top_k]
+        reranked_results = [{"content": document, "similarity": score} for document, score in ranked]
+        if not reranked_results:
+            logger.warning("重排序结果为空")
+            return results[:top_k], 0.0
+        max_similarity = reranked_results[0]["similarity"]
+        logger.info(f"重排序完成 - 结果数量: {len(reranked_results)}, 最高相似度: {max_similarity:.4f}")
+        return reranked_results, max_similarity
+
+
+_services: Dict[Tuple[str, Optional[str], Optional[str], Optional[str]], RerankService] = {}
+
+
+def _build_onnx_cross_encoder() -> OnnxCrossEncoder:
+    return OnnxCrossEncoder(RERANKER_ONNX_MODEL_PATH, RERANKER_ONNX_FILE, RERANKER_ONNX_THREADS, RERANKER_MAX_LENGTH)
+
+
+if RERANKER_BACKEND == "onnx":
+    # 应用启动预构建时加载模型，否则首次重排时在推理线程中加载
+    component_registry.register("onnx_cross_encoder", _build_onnx_cross_encoder)
+
+
+def get_rerank_service(reranker_model: Optional[str] = None, reranker_address: Optional[str] = None,
+                       api_key: Optional[str] = None, backend: str = RERANKER_BACKEND) -> RerankService:
+    """获取共享的重排序服务（同一后端配置复用连接池/推理线程和分数缓存）"""
+    key = (backend, reranker_model, reranker_address, api_key) if backend == "http" else (backend, None, None, None)
+    service = _services.get(key)
+    if service is None:
+        if backend == "onnx":
+            rerank_backend = OnnxRerankBackend(lambda: component_registry.get("onnx_cross_encoder"))
+        else:
+            rerank_backend = HttpRerankBackend(reranker_model, reranker_address, api_key)
+        service = _services[key] = RerankService(rerank_backend)
+    return service
+
+
+def rerank_enabled(reranker_model: Optional[str] = None, reranker_address: Optional[str] = None) -> bool:
+    """当前配置下是否可以重排"""
+    if RERANKER_BACKEND == "onnx":
+        return bool(RERANKER_ONNX_MODEL_PATH)
+    return bool(reranker_model and reranker_address)
+
+
+async def close_rerank_services():
+    """关闭所有重排序服务的连接池和推理线程"""
+    for service in _services.values():
+        await service.close()
+
 
 async def rerank_results(results, user_question,reranker_model=None,reranker_address=None,api_key=None,top_k=5):
     """
-    异步重排序函数，使用 HTTP API 调用重排序模型
+    异步重排序函数，按 RERANKER_BACKEND 使用 HTTP 重排接口或本地交叉编码器
+
+    Returns:
+        (重排后的前 top_k 个结果, 最高相关性分数)
     """
-    logger.info(f"开始重排序 - 文档数量: {len(results)}, 查询: {user_question},重排序模型: {reranker_model},重排序地址: {reranker_address},api_key: {api_key}")
+    logger.info(f"开始重排序 - 文档数量: {len(results)}, 查询: {user_question}, 后端: {RERANKER_BACKEND}, 重排序模型: {reranker_model}, 重排序地址: {reranker_address}")
+
+    if RERANKER_BACKEND == "onnx":
+        if not RERANKER_ONNX_MODEL_PATH:
+            logger.warning("本地重排序模型路径未配置，跳过重排序")
+            return results[:top_k], 0.0
+        return await get_rerank_service(backend="onnx").rerank(results, user_question, top_k)
 
     if not reranker_address or not reranker_model or not api_key:
         logger.warning("重排序模型配置缺失，跳过重排序")
-        return results
-
-    # 构建文档列表
-    documents = [item['content'].strip()[:500] for item in results]
-    logger.info(f"准备重排序 - 模型: {reranker_model}, 地址: {reranker_address}")
-    # 构建 API 请求体
-    payload = {
-        "model": reranker_model,
-        "query": user_question,
-        "documents": documents,
-        "top_n": top_k
-    }
-    try:
-        async with aiohttp.ClientSession() as session:
-            headers = {
-                'Content-Type': 'application/json'
-            }
-            if api_key:
-                headers['Authorization'] = f'Bearer {api_key}'
-            
-            async with session.post(reranker_address, json=payload, headers=headers) as response:
-                if response.status == 200:
-                    result_data = await response.json()
-                    logger.info("重排序API调用成功")
-
-                    # 根据重排序结果重新排列原始结果
-                    if 'results' in result_data:
-                        reranked_results = [{"content": documents[item["index"]], "similarity": item['relevance_score']} for item in result_data['results']]
-                        # 确保有结果再取最大值
-                        if reranked_results:
-                            max_similarity = max(item["similarity"] for item in reranked_results)
-                            logger.info(f"重排序完成 - 结果数量: {len(reranked_results)}, 最高相似度: {max_similarity:.4f}")
-                            return reranked_results, max_similarity
-                        else:
-                            logger.warning("重排序结果为空")
-                        return results[:top_k],max_similarity
-                    else:
-                        logger.error("重排序响应格式异常，使用原始结果")
-                        return results[:top_k], 0.0
-                else:
-                    logger.error(f"重排序 API 调用失败，状态码: {response.status}")
-                    error_text = await response.text()
-                    logger.error(f"错误详情: {error_text}")
-                    return results[:top_k], 0.0
-                    
-    except Exception as e:
-        logger.error(f"重排序过程发生错误: {str(e)}")
-        return results[:top_k], 0.0 
\ No newline at end of file
+        return results[:top_k], 0.0
+
+    return await get_rerank_service(reranker_model, reranker_address, api_key).rerank(results, user_question, top_k)
@@ -1,13 +1,29 @@
 from langchain_core.prompts import PromptTemplate,ChatPromptTemplate
-from ..models import structed_model as model
+from .. import models
 from typing import List
 from langchain_core.messages import AnyMessage
 from datetime import datetime
+from config.utils import config_manager
+from common.cache import AsyncResultCache
 from common.logging import get_logger
+from common.utils import generate_hash
 from agents.airport_service.context_engineering.prompts import query_transform_prompts
 
 logger = get_logger("agents.utils.query_transform")
 
+# 查询变换结果缓存：同一问题和上下文在有效期内只调用一次LLM，并发的相同调用合并
+_llm_config = config_manager.get_agents_config().get("llm", {})
+QUERY_TRANSFORM_CACHE_SIZE = _llm_config.get("query_transform_cache_size", 1024)
+QUERY_TRANSFORM_CACHE_TTL = _llm_config.get("query_transform_cache_ttl", 300)
+QUERY_TRANSFORM_CACHE_REDIS = _llm_config.get("query_transform_cache_redis", False)
+
+query_transform_cache = AsyncResultCache(
+    "query_transform",
+    max_entries=QUERY_TRANSFORM_CACHE_SIZE,
+    ttl=QUERY_TRANSFORM_CACHE_TTL,
+    use_redis=QUERY_TRANSFORM_CACHE_REDIS
+)
+
 
 
 async def flight_rewrite_query(original_query:str,messages:List[AnyMessage]):
@@ -25,7 +41,7 @@ async def flight_rewrite_query(original_query:str,messages:List[AnyMessage]):
         ("system", query_transform_prompts.FLIGHT_QUERY_REWRITE_SYSTEM_PROMPT),
         ("human", query_transform_prompts.FLIGHT_QUERY_REWRITE_PROMPT)
     ]).partial(time=datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
-    query_rewriter = query_rewrite_prompt | model
+    query_rewriter = query_rewrite_prompt | models.structed_model
 
     try:
 
@@ -53,7 +69,7 @@ async def rewrite_query(original_query,messages:List[AnyMessage]):
         ("system", query_transform_prompts.QUERY_REWRITE_SYSTEM_PROMPT),
         ("human", query_transform_prompts.QUERY_REWRITE_PROMPT)
     ])
-    query_rewriter = query_rewrite_prompt | model
+    query_rewriter = query_rewrite_prompt | models.structed_model
 
     try:
 
@@ -85,7 +101,7 @@ async def generate_step_back_query(original_query, messages:List[AnyMessage]=Non
         ])
     else:
         step_back_prompt = PromptTemplate.from_template(query_transform_prompts.STEP_BACK_QUERY_PROMPT)
-    step_back_chain = step_back_prompt | model
+    step_back_chain = step_back_prompt | models.structed_model
 
     try:
         response = await step_back_chain.ainvoke({"original_query": original_query,"messages": messages})
@@ -118,7 +134,7 @@ async def standardize_terminology(original_query, messages:List[AnyMessage]=None
         ]).partial(messages=messages)
     else:
         standardize_prompt = PromptTemplate.from_template(query_transform_prompts.STANDARDIZE_TERMINOLOGY_PROMPT)
-    standardize_chain = standardize_prompt | model
+    standardize_chain = standardize_prompt | models.structed_model
 
     try:
         response = await standardize_chain.ainvoke({"original_query": original_query})
@@ -150,7 +166,7 @@ async def expand_implicit_query(original_query, messages:List[AnyMessage]=None):
         ]).partial(messages=messages)
     else:
         expand_prompt = PromptTemplate.from_template(query_transform_prompts.EXPAND_IMPLICIT_QUERY_PROMPT)
-    expand_chain = expand_prompt | model
+    expand_chain = expand_prompt | models.structed_model
 
     try:
         response = await expand_chain.ainvoke({"original_query": original_query})
@@ -177,7 +193,7 @@ async def decompose_to_components(original_query):
     """
     logger.info(f"开始组件分解改写: {original_query}")
     decompose_prompt = PromptTemplate.from_template(query_transform_prompts.COMPONENT_DECOMPOSE_PROMPT)
-    decompose_chain = decompose_prompt | model
+    decompose_chain = decompose_prompt | models.structed_model
 
     try:
         response = await decompose_chain.ainvoke({"original_query": original_query})
@@ -204,7 +220,7 @@ async def professional_prejudgment_rewrite(original_query):
     """
     logger.info(f"开始专业预判改写: {original_query}")
     prejudgment_prompt = PromptTemplate.from_template(query_transform_prompts.PROFESSIONAL_PREJUDGMENT_PROMPT)
-    prejudgment_chain = prejudgment_prompt | model
+    prejudgment_chain = prejudgment_prompt | models.structed_model
 
     try:
         response = await prejudgment_chain.ainvoke({"original_query": original_query})
@@ -231,7 +247,7 @@ async def specification_prefill_rewrite(original_query):
     """
     logger.info(f"开始规格预填改写: {original_query}")
     specification_prompt = PromptTemplate.from_template(query_transform_prompts.SPECIFICATION_PREFILL_PROMPT)
-    specification_chain = specification_prompt | model
+    specification_chain = specification_prompt | models.structed_model
 
     try:
         response = await specification_chain.ainvoke({"original_query": original_query})
@@ -258,7 +274,7 @@ async def scenario_refinement_rewrite(original_query):
     """
     logger.info(f"开始场景细分改写: {original_query}")
     scenario_prompt = PromptTemplate.from_template(query_transform_prompts.SCENARIO_REFINEMENT_PROMPT)
-    scenario_chain = scenario_prompt | model
+    scenario_chain = scenario_prompt | models.structed_model
 
     try:
         response = await scenario_chain.ainvoke({"original_query": original_query})
@@ -270,9 +286,18 @@ async def scenario_refinement_rewrite(original_query):
         return original_query
 
 
+def _transform_cache_key(original_query, strategies, messages: List[AnyMessage] = None) -> str:
+    """缓存键：策略 + 问题 + 参与改写的历史消息；航班问题改写按当前时间解析"今天/明天"，键中加入日期"""
+    history = "\n".join(f"{msg.type}:{msg.content}" for msg in messages or [])
+    date = datetime.now().strftime("%Y-%m-%d") if strategies is None or 'flight_rewrite' in strategies else ""
+    return generate_hash(f"{strategies!r}\n{date}\n{original_query}\n{history}", "sha256")
+
+
 async def comprehensive_query_transform(original_query, strategies=None, messages:List[AnyMessage]=None):
     """
     综合性查询变换函数，根据指定策略对用户问题进行多维度改写。
+
+    结果按策略、问题和历史消息缓存，相同的并发调用只执行一次。
     
     Args:
         original_query (str): 用户原始提问
@@ -291,6 +316,15 @@ async def comprehensive_query_transform(original_query, strategies=None, message
     Returns:
         dict: 包含各种变换结果的字典
     """
+    return await query_transform_cache.get_or_compute(
+        _transform_cache_key(original_query, strategies, messages),
+        lambda: _comprehensive_query_transform(original_query, strategies, messages),
+        # 各变换失败时返回原问题，这类结果不缓存
+        cacheable=lambda result: bool(result) and result != original_query
+    )
+
+
+async def _comprehensive_query_transform(original_query, strategies=None, messages:List[AnyMessage]=None):
     if strategies is None:
         strategies = ['rewrite', 'flight_rewrite','step_back', 'standardize', 'expand', 'decompose', 'professional', 'specification', 'scenario']
     
@@ -0,0 +1,118 @@
+"""
+推测执行
+路由LLM与机场知识检索并行执行：路由开始时即按同样的输入启动检索，
+路由结果为 airport_info 时由检索节点直接取用，否则取消。
+"""
+import asyncio
+import time
+from typing import Any, Awaitable, Dict, List, Optional, Tuple
+
+from config.utils import config_manager
+from common.logging import get_logger
+from common.metrics import metrics
+
+logger = get_logger("agents.speculation")
+
+_graph_config = config_manager.get_agents_config().get("graph", {})
+SPECULATIVE_RETRIEVAL = _graph_config.get("speculative_retrieval", False)
+
+
+def retrieval_fingerprint(user_query: str, messages: List) -> Tuple:
+    """检索输入的指纹：问题文本 + 参与检索的历史消息"""
+    return (user_query, tuple(getattr(msg, "id", None) or msg.content for msg in messages))
+
+
+class SpeculativeTasks:
+    """按会话（thread_id）保存进行中的推测任务"""
+
+    def __init__(self, name: str, max_age: float = 120):
+        """
+        Args:
+            name: 任务名称，用于指标标签
+            max_age: 任务最长保留时间（秒）。运行在取用前被取消（新消息取代、断开连接、排队超时）时
+                任务不会被取用，超过该时间后由后续的 start 清理
+        """
+        self.name = name
+        self.max_age = max_age
+        self._tasks: Dict[str, Tuple[asyncio.Task, Any, float]] = {}
+
+    def start(self, key: str, fingerprint: Any, coro: Awaitable) -> asyncio.Task:
+        """
+        启动推测任务，同一会话已有的任务会被取消
+
+        Args:
+            key: 会话标识
+            fingerprint: 任务输入的指纹，取用时用于校验输入是否一致
+            coro: 要执行的协程
+        """
+        self.discard(key, reason="replaced")
+        self._expire()
+        task = asyncio.create_task(coro)
+        # 避免任务被取消或失败后未被取用时产生 "exception was never retrieved" 警告
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        self._tasks[key] = (task, fingerprint, time.perf_counter())
+        metrics.inc("speculation_started", task=self.name)
+        metrics.set_gauge("speculation_inflight", len(self._tasks), task=self.name)
+        return task
+
+    async def take(self, key: str, fingerprint: Any) -> Tuple[bool, Any]:
+        """
+        取用推测任务的结果
+
+        Returns:
+            (是否命中, 结果)；未命中时调用方需自行执行
+        """
+        entry = self._tasks.pop(key, None)
+        metrics.set_gauge("speculation_inflight", len(self._tasks), task=self.name)
+        if entry is None:
+            metrics.inc("speculation_miss", task=self.name)
+            return False, None
+
+        task, expected, started = entry
+        if expected != fingerprint:
+            task.cancel()
+            metrics.inc("speculation_wasted", task=self.name, reason="input_changed")
+            return False, None
+
+        waited = time.perf_counter()
+        try:
+            result = await task
+        except asyncio.CancelledError:
+            if task.cancelled():
+                metrics.inc("speculation_wasted", task=self.name, reason="cancelled")
+                return False, None
+            raise
+        except Exception as e:
+            logger.warning(f"推测任务 {self.name} 执行失败，回退为正常执行: {e}")
+            metrics.inc("speculation_wasted", task=self.name, reason="error")
+            return False, None
+
+        metrics.inc("speculation_hit", task=self.name)
+        # 取用前推测任务已运行的时长，即本次请求最多节省的串行等待时间
+        metrics.observe("speculation_head_start_seconds", waited - started, task=self.name)
+        return True, result
+
+    def discard(self, key: str, reason: str = "not_needed"):
+        """取消并丢弃推测任务"""
+        entry = self._tasks.pop(key, None)
+        if entry is None:
+            return
+        task = entry[0]
+        if not task.done():
+            task.cancel()
+        metrics.inc("speculation_wasted", task=self.name, reason=reason)
+        metrics.set_gauge("speculation_inflight", len(self._tasks), task=self.name)
+
+    def _expire(self):
+        """清理超过 max_age 仍未被取用的任务"""
+        deadline = time.perf_counter() - self.max_age
+        for key in [key for key, (_, _, started) in self._tasks.items() if started < deadline]:
+            self.discard(key, reason="expired")
+
+    def pending(self, key: str) -> Optional[asyncio.Task]:
+        entry = self._tasks.get(key)
+        return entry[0] if entry else None
+
+
+# 机场知识检索的推测任务
+airport_retrieval_speculation = SpeculativeTasks("airport_retrieval")
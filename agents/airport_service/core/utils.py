@@ -10,6 +10,7 @@ from config.utils import config_manager
 # 从配置文件获取模型配置
 model_config = config_manager.get_agents_config().get("llm", {})
 max_msg_len = model_config.get("max_history_turns", 20)
+history_compaction_batch = model_config.get("history_compaction_batch", 5)
 max_tokens = model_config.get("max_tokens", 10000)
 memery_delay = 60*30
 
@@ -128,6 +129,16 @@ def filter_messages_for_llm(state: Dict, nb_messages: int = 10) -> List:
 
 
 
+# 用户问题中的航班号：两位航司代码（字母或字母数字组合）+ 3~4位数字，纯字母代码后允许有空格；
+# 中文与字母数字之间没有单词边界，因此用前后不是字母数字来界定
+FLIGHT_NUMBER_IN_TEXT = re.compile(r'(?<![A-Z0-9])(?:[A-Z]{2} ?|[A-Z]\d|\d[A-Z])\d{3,4}(?!\d)')
+
+
+def extract_flight_numbers(text: str) -> List[str]:
+    """从用户问题中提取航班号"""
+    return [match.replace(" ", "") for match in FLIGHT_NUMBER_IN_TEXT.findall((text or "").upper())]
+
+
 def extract_flight_numbers_from_result(sql_result):
     pattern = re.compile(r'\b[A-Z]{2}\d{3,4}\b')
     flight_numbers = set()
@@ -0,0 +1,368 @@
+"""
+增量checkpoint存储
+
+AsyncRedisSaver 在每个超步都会把完整的 channel_values 内联写入 checkpoint，
+长对话下 messages、retrieval_result 等通道反复全量写入，带宽和内存随对话长度近似平方增长。
+DeltaRedisSaver 只写入每个超步新增的消息和发生变化的通道：
+
+- checkpoint_delta:{thread_id}:{checkpoint_ns}:base  基线快照（完整通道值）
+- checkpoint_delta:{thread_id}:{checkpoint_ns}:log   增量记录列表，每条记录指向其父checkpoint
+- checkpoint_delta:{thread_id}:{checkpoint_ns}:head  当前基线的checkpoint_id
+
+读取时从基线沿父链回放增量重建状态，增量条数达到阈值后自动压缩为新的基线。
+压缩时旧的基线和增量日志按其基线ID归档（base:{基线ID}、log:{基线ID}，列表 archive 记录归档顺序），
+与checkpoint一样按TTL过期，更早的checkpoint（历史列表、回溯）仍可重建。
+
+写入通过Lua脚本完成：脚本先核对 head 仍是读取父状态时的基线，再追加增量或压缩，
+期间若其他写入者（其他副本上同一会话的并发运行）已压缩，则重新读取父状态后重试。
+
+checkpoint本身只保存空的 channel_values，旧格式（内联通道值）的checkpoint仍可正常读取。
+"""
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import ChannelVersions, Checkpoint, CheckpointMetadata, CheckpointTuple
+from langgraph.checkpoint.redis.aio import AsyncRedisSaver
+from common.logging import get_logger
+
+logger = get_logger("agents.delta_checkpointer")
+
+DELTA_KEY_PREFIX = "checkpoint_delta"
+# 基线被并发压缩时的最大重试次数
+_MAX_WRITE_ATTEMPTS = 5
+
+# KEYS: head, base, log, archive, 归档base, 归档log
+# ARGV: 读取时的基线ID（无基线为空串）, 模式(log/base), 记录, 新checkpoint_id, TTL秒（不过期为空串）
+# 返回：-1 表示基线已被其他写入者替换；否则为增量日志长度
+_WRITE_SCRIPT = """
+local head = redis.call('get', KEYS[1])
+if head and head ~= ARGV[1] then
+    return -1
+end
+local ttl = tonumber(ARGV[5])
+if ARGV[2] == 'log' then
+    local length = redis.call('rpush', KEYS[3], ARGV[3])
+    if ttl then
+        for i = 1, 4 do
+            redis.call('expire', KEYS[i], ttl)
+        end
+    end
+    return length
+end
+if ARGV[1] ~= '' and redis.call('exists', KEYS[2]) == 1 then
+    redis.call('rename', KEYS[2], KEYS[5])
+    if redis.call('exists', KEYS[3]) == 1 then
+        redis.call('rename', KEYS[3], KEYS[6])
+    end
+    redis.call('lpush', KEYS[4], ARGV[1])
+end
+redis.call('set', KEYS[2], ARGV[3])
+redis.call('set', KEYS[1], ARGV[4])
+redis.call('del', KEYS[3])
+if ttl then
+    for i = 1, 6 do
+        if i ~= 3 then
+            redis.call('expire', KEYS[i], ttl)
+        end
+    end
+end
+return 0
+"""
+
+
+class DeltaRedisSaver(AsyncRedisSaver):
+    """基线快照 + 增量日志格式的Redis checkpointer"""
+
+    def __init__(self, *args, compaction_interval: int = 20, state_cache_size: int = 1000, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.compaction_interval = compaction_interval
+        self._state_cache_size = state_cache_size
+        # (thread_id, checkpoint_ns) -> (checkpoint_id, channel_values, 基线ID, 日志条数)，最近写入/读取的状态
+        self._state_cache: "OrderedDict[Tuple[str, str], Tuple[str, Dict[str, Any], Optional[str], int]]" = OrderedDict()
+
+    # ==================== 序列化与键 ====================
+
+    def _delta_keys(self, thread_id: str, checkpoint_ns: str) -> Tuple[str, str]:
+        prefix = f"{DELTA_KEY_PREFIX}:{thread_id}:{checkpoint_ns}"
+        return f"{prefix}:base", f"{prefix}:log"
+
+    def _head_key(self, thread_id: str, checkpoint_ns: str) -> str:
+        return f"{DELTA_KEY_PREFIX}:{thread_id}:{checkpoint_ns}:head"
+
+    def _archive_key(self, thread_id: str, checkpoint_ns: str) -> str:
+        return f"{DELTA_KEY_PREFIX}:{thread_id}:{checkpoint_ns}:archive"
+
+    def _pack(self, record: Dict[str, Any]) -> bytes:
+        type_, data = self.serde.dumps_typed(record)
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        return type_.encode("utf-8") + b":" + data
+
+    def _unpack(self, raw: bytes) -> Dict[str, Any]:
+        type_, data = raw.split(b":", 1)
+        return self.serde.loads_typed((type_.decode("utf-8"), data))
+
+    def _ttl_seconds(self) -> Optional[int]:
+        # 与 AsyncRedisSaver 保持一致：default_ttl 以分钟为单位
+        if self.ttl_config and "default_ttl" in self.ttl_config:
+            return int(self.ttl_config["default_ttl"] * 60)
+        return None
+
+    # ==================== 状态缓存 ====================
+
+    def _cache_get(self, thread_id: str, checkpoint_ns: str, checkpoint_id: Optional[str]) -> Optional[Tuple[Dict[str, Any], Optional[str], int]]:
+        cached = self._state_cache.get((thread_id, checkpoint_ns))
+        if cached is None or cached[0] != checkpoint_id:
+            return None
+        self._state_cache.move_to_end((thread_id, checkpoint_ns))
+        return cached[1:]
+
+    def _cache_put(self, thread_id: str, checkpoint_ns: str, checkpoint_id: str, values: Dict[str, Any],
+                   base_id: Optional[str], log_len: int):
+        self._state_cache[(thread_id, checkpoint_ns)] = (checkpoint_id, values, base_id, log_len)
+        self._state_cache.move_to_end((thread_id, checkpoint_ns))
+        while len(self._state_cache) > self._state_cache_size:
+            self._state_cache.popitem(last=False)
+
+    @staticmethod
+    def _copy_values(values: Dict[str, Any]) -> Dict[str, Any]:
+        """浅拷贝通道值，列表单独复制，避免调用方修改缓存"""
+        return {k: list(v) if isinstance(v, list) else v for k, v in values.items()}
+
+    # ==================== 增量计算与重建 ====================
+
+    @staticmethod
+    def _diff(old: Dict[str, Any], new: Dict[str, Any], changed: set) -> Dict[str, Any]:
+        """计算两个状态之间的增量：列表通道仅追加尾部，其余通道整体替换"""
+        set_values, append_values = {}, {}
+        for channel, value in new.items():
+            if channel not in old:
+                set_values[channel] = value
+                continue
+            if channel not in changed:
+                continue
+            old_value = old[channel]
+            if (
+                isinstance(value, list)
+                and isinstance(old_value, list)
+                and len(value) >= len(old_value)
+                and all(a is b or a == b for a, b in zip(old_value, value))
+            ):
+                if len(value) > len(old_value):
+                    append_values[channel] = value[len(old_value):]
+            else:
+                set_values[channel] = value
+        deleted = [channel for channel in old if channel not in new]
+        return {"set": set_values, "append": append_values, "delete": deleted}
+
+    @staticmethod
+    def _apply(values: Dict[str, Any], record: Dict[str, Any]):
+        for channel in record.get("delete", []):
+            values.pop(channel, None)
+        values.update(record.get("set", {}))
+        for channel, items in record.get("append", {}).items():
+            values[channel] = list(values.get(channel, [])) + list(items)
+
+    def _replay(self, base: Dict[str, Any], raw_log: List[bytes], checkpoint_id: Optional[str]) -> Optional[Dict[str, Any]]:
+        """从基线沿父链回放增量，checkpoint不在该段增量链上时返回None"""
+        records = {}
+        for raw in raw_log:
+            record = self._unpack(raw)
+            records[record["checkpoint_id"]] = record
+
+        # 沿父链回溯到基线，过滤掉失败写入遗留的孤立记录
+        path: List[Dict[str, Any]] = []
+        cursor = checkpoint_id
+        while cursor != base["checkpoint_id"]:
+            record = records.get(cursor)
+            if record is None:
+                return None
+            path.append(record)
+            cursor = record["parent_checkpoint_id"]
+
+        values = self._copy_values(base["values"])
+        for record in reversed(path):
+            self._apply(values, record)
+        return values
+
+    async def _load_delta_state(self, thread_id: str, checkpoint_ns: str, checkpoint_id: Optional[str]) -> Tuple[Optional[Dict[str, Any]], Optional[str], int]:
+        """
+        从当前基线和增量日志重建指定checkpoint的通道值
+
+        Returns:
+            (通道值, 基线ID, 日志条数)；没有增量数据、或该checkpoint不在当前增量链上（旧格式内联checkpoint、
+            早于最近一次压缩）时通道值为None
+        """
+        base_key, log_key = self._delta_keys(thread_id, checkpoint_ns)
+        pipeline = self._redis.pipeline(transaction=False)
+        pipeline.get(base_key)
+        pipeline.lrange(log_key, 0, -1)
+        raw_base, raw_log = await pipeline.execute()
+        if raw_base is None and not raw_log:
+            return None, None, 0
+
+        base = self._unpack(raw_base) if raw_base else {"checkpoint_id": None, "values": {}}
+        return self._replay(base, raw_log, checkpoint_id), base["checkpoint_id"], len(raw_log)
+
+    async def _load_archived_state(self, thread_id: str, checkpoint_ns: str, checkpoint_id: str) -> Optional[Dict[str, Any]]:
+        """在压缩归档的各段中（从新到旧）查找并重建checkpoint，只在命中的段读取基线"""
+        base_key, log_key = self._delta_keys(thread_id, checkpoint_ns)
+        for raw_base_id in await self._redis.lrange(self._archive_key(thread_id, checkpoint_ns), 0, -1):
+            base_id = raw_base_id.decode("utf-8") if isinstance(raw_base_id, bytes) else raw_base_id
+            raw_log = await self._redis.lrange(f"{log_key}:{base_id}", 0, -1)
+            if base_id != checkpoint_id and not any(checkpoint_id.encode("utf-8") in raw for raw in raw_log):
+                continue
+            raw_base = await self._redis.get(f"{base_key}:{base_id}")
+            if raw_base is None:
+                continue
+            values = self._replay(self._unpack(raw_base), raw_log, checkpoint_id)
+            if values is not None:
+                return values
+        return None
+
+    async def _get_state(self, thread_id: str, checkpoint_ns: str, checkpoint_id: Optional[str],
+                         use_cache: bool = True) -> Tuple[Optional[Dict[str, Any]], Optional[str], int]:
+        """
+        父checkpoint的通道值
+
+        Returns:
+            (通道值, 基线ID, 日志条数)；父checkpoint不在当前增量链上时通道值为None
+        """
+        cached = self._cache_get(thread_id, checkpoint_ns, checkpoint_id) if use_cache else None
+        if cached is not None:
+            return cached
+        values, base_id, log_len = await self._load_delta_state(thread_id, checkpoint_ns, checkpoint_id)
+        if values is None and checkpoint_id is None:
+            # 线程的第一个checkpoint，父状态就是空状态
+            values = {}
+        return values, base_id, log_len
+
+    async def _write_delta(self, thread_id: str, checkpoint_ns: str, parent_checkpoint_id: Optional[str],
+                           checkpoint_id: str, new_values: Dict[str, Any], changed: set) -> Tuple[Optional[str], int]:
+        """
+        写入增量记录或压缩为新基线
+
+        Returns:
+            (写入后的基线ID, 日志条数)
+        """
+        base_key, log_key = self._delta_keys(thread_id, checkpoint_ns)
+        ttl_seconds = self._ttl_seconds()
+        for attempt in range(_MAX_WRITE_ATTEMPTS):
+            # 首次尝试可用缓存的父状态；基线被并发替换后必须从Redis重新读取
+            old_values, base_id, log_len = await self._get_state(
+                thread_id, checkpoint_ns, parent_checkpoint_id, use_cache=attempt == 0
+            )
+            # 压缩：当前完整状态成为新基线，旧基线和增量日志归档。
+            # 父checkpoint不在当前增量链上（旧格式内联写入、由未开启增量的副本写入、或从压缩前的checkpoint分叉）时
+            # 同样写基线，否则增量记录指向一个无法回放的父checkpoint，重建时整个状态会丢失；
+            # 线程的第一个checkpoint也直接写基线，保证每段增量日志都有可归档的基线
+            compact = old_values is None or base_id is None or log_len + 1 >= self.compaction_interval
+            if compact:
+                payload = self._pack({"checkpoint_id": checkpoint_id, "values": new_values})
+            else:
+                record = self._diff(old_values, new_values, changed)
+                record["checkpoint_id"] = checkpoint_id
+                record["parent_checkpoint_id"] = parent_checkpoint_id
+                payload = self._pack(record)
+            result = await self._redis.eval(
+                _WRITE_SCRIPT, 6,
+                self._head_key(thread_id, checkpoint_ns), base_key, log_key,
+                self._archive_key(thread_id, checkpoint_ns), f"{base_key}:{base_id}", f"{log_key}:{base_id}",
+                base_id or "", "base" if compact else "log", payload, checkpoint_id,
+                "" if ttl_seconds is None else ttl_seconds,
+            )
+            if result >= 0:
+                if compact:
+                    logger.debug(f"线程 {thread_id} 增量日志已压缩，基线: {checkpoint_id}")
+                    return checkpoint_id, 0
+                return base_id, int(result)
+            logger.info(f"线程 {thread_id} 的增量基线已被并发写入替换，重新读取父状态（第{attempt + 1}次）")
+        raise RuntimeError(f"线程 {thread_id} 的checkpoint {checkpoint_id} 写入失败：基线持续被并发替换")
+
+    # ==================== BaseCheckpointSaver 接口 ====================
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+        stream_mode: str = "values",
+    ) -> RunnableConfig:
+        """写入增量记录，checkpoint本身不再内联通道值"""
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        parent_checkpoint_id = config["configurable"].get("checkpoint_id")
+        checkpoint_id = checkpoint["id"]
+        new_values = checkpoint.get("channel_values", {})
+
+        base_id, log_len = await self._write_delta(
+            thread_id, checkpoint_ns, parent_checkpoint_id, checkpoint_id, new_values, set(new_versions)
+        )
+
+        next_config = await super().aput(
+            config,
+            {**checkpoint, "channel_values": {}},
+            metadata,
+            new_versions,
+            stream_mode,
+        )
+        self._cache_put(thread_id, checkpoint_ns, checkpoint_id, self._copy_values(new_values), base_id, log_len)
+        return next_config
+
+    async def aget_channel_values(
+        self,
+        thread_id: str,
+        checkpoint_ns: str = "",
+        checkpoint_id: str = "",
+        channel_versions: Optional[Dict[str, Any]] = None,
+    ) -> Dict[str, Any]:
+        """优先读取内联通道值（兼容旧格式），否则由基线+增量重建，当前增量链上没有时查找压缩归档"""
+        cached = self._cache_get(thread_id, checkpoint_ns, checkpoint_id)
+        if cached is not None:
+            return self._copy_values(cached[0])
+
+        inline_values = await super().aget_channel_values(thread_id, checkpoint_ns, checkpoint_id, channel_versions)
+        if inline_values:
+            return inline_values
+
+        values, base_id, log_len = await self._load_delta_state(thread_id, checkpoint_ns, checkpoint_id)
+        if values is not None:
+            self._cache_put(thread_id, checkpoint_ns, checkpoint_id, values, base_id, log_len)
+            return self._copy_values(values)
+
+        # 早于最近一次压缩的checkpoint：从归档段重建，不放入缓存（缓存只服务于当前链上的续写）
+        values = await self._load_archived_state(thread_id, checkpoint_ns, checkpoint_id)
+        if values is None:
+            logger.error(f"线程 {thread_id} 的checkpoint {checkpoint_id} 在增量存储和归档中都不存在（可能已过期），无法重建")
+            return {}
+        return values
+
+    async def alist(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        """历史列表同样需要为增量格式的checkpoint重建通道值"""
+        async for checkpoint_tuple in super().alist(config, filter=filter, before=before, limit=limit):
+            if not checkpoint_tuple.checkpoint.get("channel_values"):
+                configurable = checkpoint_tuple.config["configurable"]
+                checkpoint_tuple.checkpoint["channel_values"] = await self.aget_channel_values(
+                    configurable["thread_id"],
+                    configurable.get("checkpoint_ns", ""),
+                    configurable["checkpoint_id"],
+                )
+            yield checkpoint_tuple
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        """删除线程时一并清理基线、增量日志和压缩归档"""
+        await super().adelete_thread(thread_id)
+        keys = [key async for key in self._redis.scan_iter(match=f"{DELTA_KEY_PREFIX}:{thread_id}:*")]
+        if keys:
+            await self._redis.delete(*keys)
+        for cache_key in [k for k in self._state_cache if k[0] == thread_id]:
+            self._state_cache.pop(cache_key, None)
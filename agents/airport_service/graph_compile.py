@@ -1,13 +1,20 @@
 import os
 import asyncio
 from contextlib import asynccontextmanager
-from typing import Dict, List, Optional
+from typing import Callable, Dict, List, Optional
+import itertools
 import logging
 from langgraph.graph import StateGraph
 from langgraph.checkpoint.redis.aio import AsyncRedisSaver
+from .delta_checkpointer import DeltaRedisSaver
+from .run_coordinator import ThreadRunCoordinator
+from .admission import AdmissionController
 import redis.asyncio as redis
 from config.utils import config_manager
 from .main_nodes.summary import summarize_conversation
+from .core import airport_answer_cache
+from .core.query.transform import query_transform_cache
+from common.metrics import metrics
 import hashlib
 
 import platform
@@ -21,6 +28,24 @@ REDIS_PORT = _redis_config.get("port")
 REDIS_PASSWORD = _redis_config.get("password")
 REDIS_DB = _redis_config.get("db")
 REDIS_MAX_CONNECTIONS = _redis_config.get("max_connections", 20)
+REDIS_POOL_TIMEOUT = _redis_config.get("pool_timeout", 5)
+# 生命周期模式：启动时预编译图并共享连接池，关闭则退回按请求编译
+GRAPH_COMPILE_ONCE = _redis_config.get("compile_once", True)
+# 增量checkpoint存储：基线快照 + 增量日志
+REDIS_DELTA_CHECKPOINT = _redis_config.get("delta_checkpoint", False)
+REDIS_DELTA_COMPACTION_INTERVAL = _redis_config.get("delta_compaction_interval", 20)
+
+# 特化图：按请求开关预编译去掉无效节点的图变体
+_graph_config = config_manager.get_agents_config().get("graph", {})
+GRAPH_SPECIALIZED_VARIANTS = _graph_config.get("specialized_variants", True)
+
+# checkpoint写入时机，映射到LangGraph的durability参数
+CHECKPOINT_DURABILITY_MODES = {
+    "per_node": "sync",      # 每个节点结束后同步写入
+    "end_of_turn": "exit",   # 在内存中缓冲，整轮结束时写一次
+    "async": "async",        # 每个节点写入，但不阻塞下一步执行
+}
+CHECKPOINT_DURABILITY = CHECKPOINT_DURABILITY_MODES.get(_redis_config.get("durability", "async"), "async")
 
 # TTL 配置（由LangGraph内置管理）
 REDIS_CHECKPOINT_TTL = _redis_config.get("checkpoint_ttl", 7200)  # 2小时
@@ -38,6 +63,13 @@ class GraphManager:
             cls._instance = super(GraphManager, cls).__new__(cls)
             cls._instance._registered_graphs = {}
             cls._instance._graph_db_mapping = {}  # 图ID到Redis数据库的映射
+            cls._instance._graph_variants = {}  # 基础图ID到特化开关列表的映射
+            cls._instance._compiled_graphs = {}  # 生命周期模式下预编译的图
+            cls._instance._redis_pool = None
+            cls._instance._redis_client = None
+            cls._instance._checkpointer = None
+            cls._instance._run_coordinator = ThreadRunCoordinator()  # 同一会话的运行串行化/取代
+            cls._instance._admission = AdmissionController()  # 全局并发准入控制
         return cls._instance
 
     def register_graph(self, graph_id: str, graph: StateGraph):
@@ -47,7 +79,44 @@ class GraphManager:
         index_prefix = self._get_graph_index_prefix(graph_id)
         self._graph_db_mapping[graph_id] = index_prefix
         logger.info(f"图 '{graph_id}' 已注册，索引前缀: {index_prefix}")
+        # 已启动生命周期模式时，新注册的图立即编译
+        if self._checkpointer is not None:
+            self._compiled_graphs[graph_id] = graph.compile(checkpointer=self._checkpointer)
     
+    def register_graph_variants(self, graph_id: str, builder: Callable[..., StateGraph], flags: List[str]):
+        """
+        注册一个图及其按开关特化的变体
+
+        builder 以关键字参数接收各开关，全部开启时即为完整图，注册为 graph_id；
+        其余每种开关组合各注册一个变体，由 resolve_graph_id 按请求参数选择。
+        """
+        self.register_graph(graph_id, builder())
+        if not GRAPH_SPECIALIZED_VARIANTS:
+            return
+        self._graph_variants[graph_id] = list(flags)
+        for values in itertools.product([True, False], repeat=len(flags)):
+            if all(values):
+                continue
+            flag_values = dict(zip(flags, values))
+            self.register_graph(self._get_variant_id(graph_id, flag_values), builder(**flag_values))
+
+    @staticmethod
+    def _get_variant_id(graph_id: str, flag_values: Dict[str, bool]) -> str:
+        """变体ID：基础图ID + 关闭的开关"""
+        disabled = [flag for flag, enabled in flag_values.items() if not enabled]
+        return f"{graph_id}:no_{'_'.join(disabled)}" if disabled else graph_id
+
+    def resolve_graph_id(self, graph_id: str, **flags) -> str:
+        """根据请求开关选择特化的图变体，未注册变体时返回原图ID"""
+        variant_flags = self._graph_variants.get(graph_id)
+        if not variant_flags:
+            return graph_id
+        variant_id = self._get_variant_id(graph_id, {flag: bool(flags.get(flag, True)) for flag in variant_flags})
+        if variant_id not in self._registered_graphs:
+            return graph_id
+        metrics.inc("graph_variant_selected", graph=variant_id)
+        return variant_id
+
     def _get_graph_index_prefix(self, graph_id: str) -> str:
         """为图ID生成一个唯一的索引前缀"""
         # 使用哈希确保相同graph_id总是得到相同的前缀
@@ -56,6 +125,111 @@ class GraphManager:
         prefix = hash_obj.hexdigest()[:8]
         return f"lg_{prefix}"
     
+    async def _create_checkpointer(self, redis_client: redis.Redis, graph_id: str) -> AsyncRedisSaver:
+        """创建checkpointer并执行asetup，索引已存在等情况不视为错误"""
+        # 创建checkpointer，使用正确的TTL配置格式
+        ttl_config = {
+            "default_ttl": REDIS_CHECKPOINT_TTL
+        }
+        if REDIS_DELTA_CHECKPOINT:
+            checkpointer = DeltaRedisSaver(
+                redis_client=redis_client,
+                ttl=ttl_config,
+                compaction_interval=REDIS_DELTA_COMPACTION_INTERVAL
+            )
+        else:
+            checkpointer = AsyncRedisSaver(
+                redis_client=redis_client,
+                ttl=ttl_config
+            )
+        
+        # 安全地设置checkpointer，处理各种索引相关异常
+        try:
+            await checkpointer.asetup()
+            logger.debug(f"图 '{graph_id}' checkpointer设置成功")
+        except Exception as setup_error:
+            error_msg = str(setup_error)
+            # 检查是否是索引相关的错误
+            if any(keyword in error_msg for keyword in [
+                "Index already exists", 
+                "Cannot create index on db != 0",
+                "index name already exists"
+            ]):
+                if "Cannot create index on db != 0" in error_msg:
+                    logger.warning(f"图 '{graph_id}' 尝试在非0数据库创建索引，已强制使用数据库0")
+                else:
+                    logger.info(f"图 '{graph_id}' 的Redis索引已存在，继续使用现有索引")
+                
+                # 索引问题不应该阻止图的正常使用，尝试继续
+                logger.info(f"图 '{graph_id}' 将尝试使用现有的Redis索引配置")
+            else:
+                # 其他不相关的错误需要抛出
+                logger.error(f"图 '{graph_id}' checkpointer设置失败: {setup_error}")
+                raise
+        return checkpointer
+
+    async def startup(self):
+        """
+        生命周期模式启动：创建共享连接池，执行一次asetup，并预编译所有已注册的图
+
+        之后 get_compiled_graph 直接返回预编译的图，不再逐请求创建连接和编译
+        """
+        if self._checkpointer is not None:
+            return
+        self._redis_pool = redis.BlockingConnectionPool(
+            host=REDIS_HOST,
+            port=REDIS_PORT,
+            db=0,  # 强制使用数据库0（Redis索引限制）
+            password=REDIS_PASSWORD,
+            max_connections=REDIS_MAX_CONNECTIONS,
+            timeout=REDIS_POOL_TIMEOUT,  # 连接池耗尽时的等待时间
+            socket_connect_timeout=5.0,
+            socket_timeout=5.0
+        )
+        self._redis_client = redis.Redis(connection_pool=self._redis_pool)
+        try:
+            await self._redis_client.ping()
+            self._checkpointer = await self._create_checkpointer(self._redis_client, "shared")
+            self._run_coordinator.bind_redis(self._redis_client)
+            airport_answer_cache.bind_redis(self._redis_client)
+            query_transform_cache.bind_redis(self._redis_client)
+            for graph_id, graph in self._registered_graphs.items():
+                self._compiled_graphs[graph_id] = graph.compile(checkpointer=self._checkpointer)
+                logger.info(f"图 '{graph_id}' 已预编译")
+        except Exception as e:
+            logger.error(f"图管理器启动失败: {e}")
+            await self.shutdown()
+            raise
+        logger.info(f"图管理器已启动，共享连接池上限: {REDIS_MAX_CONNECTIONS}，checkpoint写入模式: {CHECKPOINT_DURABILITY}")
+
+    async def shutdown(self):
+        """生命周期模式关闭：清空预编译的图并释放共享连接池"""
+        self._compiled_graphs.clear()
+        self._checkpointer = None
+        self._run_coordinator.bind_redis(None)
+        airport_answer_cache.bind_redis(None)
+        query_transform_cache.bind_redis(None)
+        if self._redis_client is not None:
+            await self._redis_client.aclose()
+            self._redis_client = None
+        if self._redis_pool is not None:
+            await self._redis_pool.aclose()
+            self._redis_pool = None
+        logger.info("图管理器已关闭，共享连接池已释放")
+
+    def _get_pool_stats(self) -> Dict:
+        """获取共享连接池的使用情况"""
+        if self._redis_pool is None:
+            return {}
+        in_use = len(self._redis_pool._in_use_connections)
+        available = len(self._redis_pool._available_connections)
+        return {
+            "max_connections": self._redis_pool.max_connections,
+            "in_use_connections": in_use,
+            "available_connections": available,
+            "created_connections": in_use + available,
+        }
+
     @asynccontextmanager
     async def get_compiled_graph(self, graph_id: str = "default"):
         """获取已编译的图（所有图使用数据库0，通过错误处理避免索引冲突）"""
@@ -63,6 +237,12 @@ class GraphManager:
         if graph_id not in self._registered_graphs:
             raise ValueError(f"图 '{graph_id}' 未注册")
         
+        # 生命周期模式：直接复用启动时编译好的图
+        compiled_graph = self._compiled_graphs.get(graph_id)
+        if compiled_graph is not None:
+            yield compiled_graph
+            return
+        
         # 所有图都使用数据库0（Redis索引限制）
         # 获取该图的索引前缀（用于日志记录）
         index_prefix = self._graph_db_mapping.get(graph_id, "default")
@@ -84,38 +264,7 @@ class GraphManager:
             await redis_client.ping()
             logger.debug(f"图 '{graph_id}' Redis连接成功，使用数据库: 0，索引前缀: {index_prefix}")
             
-            # 创建checkpointer，使用正确的TTL配置格式
-            ttl_config = {
-                "default_ttl": REDIS_CHECKPOINT_TTL
-            }
-            checkpointer = AsyncRedisSaver(
-                redis_client=redis_client,
-                ttl=ttl_config
-            )
-            
-            # 安全地设置checkpointer，处理各种索引相关异常
-            try:
-                await checkpointer.asetup()
-                logger.debug(f"图 '{graph_id}' checkpointer设置成功")
-            except Exception as setup_error:
-                error_msg = str(setup_error)
-                # 检查是否是索引相关的错误
-                if any(keyword in error_msg for keyword in [
-                    "Index already exists", 
-                    "Cannot create index on db != 0",
-                    "index name already exists"
-                ]):
-                    if "Cannot create index on db != 0" in error_msg:
-                        logger.warning(f"图 '{graph_id}' 尝试在非0数据库创建索引，已强制使用数据库0")
-                    else:
-                        logger.info(f"图 '{graph_id}' 的Redis索引已存在，继续使用现有索引")
-                    
-                    # 索引问题不应该阻止图的正常使用，尝试继续
-                    logger.info(f"图 '{graph_id}' 将尝试使用现有的Redis索引配置")
-                else:
-                    # 其他不相关的错误需要抛出
-                    logger.error(f"图 '{graph_id}' checkpointer设置失败: {setup_error}")
-                    raise
+            checkpointer = await self._create_checkpointer(redis_client, graph_id)
             
             # 编译图
             graph = self._registered_graphs[graph_id]
@@ -127,15 +276,36 @@ class GraphManager:
             raise
         finally:
             await redis_client.aclose()
+    @staticmethod
+    def _get_run_key(graph_id: str, thread_id: Dict) -> Optional[str]:
+        """运行协调的键：同一会话在同一张图（含其特化变体）上的运行互斥"""
+        thread = thread_id["configurable"].get("thread_id")
+        if not thread:
+            return None
+        return f"{graph_id.split(':')[0]}:{thread}"
+
+    def _admit(self, graph_id: str, thread_id: Dict):
+        """准入控制：过载时抛出 AdmissionRejectedError"""
+        return self._admission.admit(self._get_run_key(graph_id, thread_id), thread_id["configurable"].get("user_id"))
+
     # 流式输出接口 - 优化版  
-    async def process_chat_message_stream(self, message: str, thread_id: Dict, graph_id: str, msg_nodes: List,custom_nodes: List):
-        """优化的流式消息处理"""
-        async with self.get_compiled_graph(graph_id) as compiled_graph:
-            async for msg_type, metadata in compiled_graph.astream(
-                {"messages": ("human", message)}, 
+    async def process_chat_message_stream(self, message: str, thread_id: Dict, graph_id: str, msg_nodes: List,custom_nodes: List, extra_input: Optional[Dict] = None):
+        """
+        优化的流式消息处理，extra_input 会合并到图的输入中
+
+        同一会话的运行由协调器串行化或取代，被取代时抛出 RunCancelledError；
+        系统过载未被准入时抛出 AdmissionRejectedError
+        """
+        async with self._run_coordinator.acquire(self._get_run_key(graph_id, thread_id)) as run, \
+                self._admit(graph_id, thread_id), \
+                self.get_compiled_graph(graph_id) as compiled_graph:
+            source = compiled_graph.astream(
+                {"messages": ("human", message), **(extra_input or {})}, 
                 thread_id,
-                stream_mode=["messages", "custom"]
-            ):
+                stream_mode=["messages", "custom"],
+                durability=CHECKPOINT_DURABILITY
+            )
+            async for msg_type, metadata in run.stream(source):
                 if msg_type == "messages" and metadata[0].content and metadata[1]["langgraph_node"] in msg_nodes:
                     yield msg_type, metadata[1]["langgraph_node"], metadata[0].content
                 elif msg_type == "custom" and metadata["node_name"] in custom_nodes:
@@ -144,11 +314,14 @@ class GraphManager:
     
     async def process_chat_message(self, message: str, thread_id: Dict, graph_id: str):
         """优化的消息处理"""
-        async with self.get_compiled_graph(graph_id) as compiled_graph:
-            result = await compiled_graph.ainvoke(
+        async with self._run_coordinator.acquire(self._get_run_key(graph_id, thread_id)) as run, \
+                self._admit(graph_id, thread_id), \
+                self.get_compiled_graph(graph_id) as compiled_graph:
+            result = await run.execute(compiled_graph.ainvoke(
                 {"messages": ("human", message)}, 
-                thread_id
-            )
+                thread_id,
+                durability=CHECKPOINT_DURABILITY
+            ))
             return result["messages"][-1].content
 
     # 对话摘要 - 优化版
@@ -163,6 +336,9 @@ class GraphManager:
     async def get_redis_stats(self) -> Dict:
         """获取Redis连接状态"""
         return {
+            "lifecycle_mode": self._checkpointer is not None,
+            "compiled_graphs": list(self._compiled_graphs.keys()),
+            "pool": self._get_pool_stats(),
             "host": REDIS_HOST,
             "port": REDIS_PORT,
             "forced_db": 0,  # 所有图强制使用数据库0（Redis索引限制）
@@ -170,12 +346,20 @@ class GraphManager:
             "graph_index_mapping": self._graph_db_mapping,  # 现在存储索引前缀
             "max_connections": REDIS_MAX_CONNECTIONS,
             "checkpoint_ttl": REDIS_CHECKPOINT_TTL,
+            "delta_checkpoint": REDIS_DELTA_CHECKPOINT,
+            "checkpoint_durability": CHECKPOINT_DURABILITY,
+            "thread_run_policy": self._run_coordinator.policy,
+            "active_threads": self._run_coordinator.active_threads(),
+            "admission": self._admission.stats(),
             "registered_graphs": list(self._registered_graphs.keys())
         }
 
     async def health_check(self) -> bool:
         """Redis健康检查"""
         try:
+            if self._redis_client is not None:
+                # 生命周期模式下复用共享连接池
+                return await self._redis_client.ping()
             test_client = redis.Redis(
                 host=REDIS_HOST,
                 port=REDIS_PORT,
@@ -196,8 +380,10 @@ graph_manager = GraphManager()
 
 # 应用启动/关闭的辅助函数
 async def startup_redis():
-    """应用启动时检查Redis连接"""
+    """应用启动时检查Redis连接，生命周期模式下同时预编译所有图"""
     logger.info("🔧 检查Redis连接...")
+    if GRAPH_COMPILE_ONCE:
+        await graph_manager.startup()
     if await graph_manager.health_check():
         logger.info("✅ Redis连接正常")
     else:
@@ -206,4 +392,5 @@ async def startup_redis():
 
 async def shutdown_redis():
     """应用关闭时的清理工作"""
-    logger.info("🔧 应用关闭，Redis连接将自动清理")
+    logger.info("🔧 应用关闭，释放Redis连接")
+    await graph_manager.shutdown()
@@ -3,26 +3,37 @@
 """
 from langgraph.graph import StateGraph, START, END
 from .state import AirportMainServiceState
-from .main_nodes import airport, router, flight, chitchat, translator, artificial, business,images_thinking,human
+from .main_nodes import airport, router, flight, chitchat, translator, artificial, business,images_thinking,human,summary
 from langgraph.types import RetryPolicy
 
 
-def build_airport_service_graph():
+def build_airport_service_graph(translate: bool = True, emotion: bool = True, image: bool = True):
     """
     构建机场客服系统图，但不编译
-    
+
+    三个开关关闭时对应的节点不会加入图中，用于按请求参数预编译的特化图：
+    这些节点在关闭时本就不做任何处理，但仍会占用一个超步、写一次checkpoint。
+
+    Args:
+        translate: 是否包含输入/输出翻译节点（Is_translate）
+        emotion: 是否包含情感识别及转人工节点（Is_emotion）
+        image: 是否包含图像理解节点（image_data）
+
     Returns:
         未编译的图对象
     """
     # 创建图
     graph = StateGraph(AirportMainServiceState)
     # 翻译节点
-    graph.add_node("translate_input_node", translator.translate_input, retry_policy=RetryPolicy(max_attempts=3))
-    graph.add_node("translate_output_node", translator.translate_output, retry_policy=RetryPolicy(max_attempts=3))
+    if translate:
+        graph.add_node("translate_input_node", translator.translate_input, retry_policy=RetryPolicy(max_attempts=3))
+        graph.add_node("translate_output_node", translator.translate_output, retry_policy=RetryPolicy(max_attempts=3))
     # 情感识别节点
-    graph.add_node("emotion_node", artificial.detect_emotion, retry_policy=RetryPolicy(max_attempts=3))
-    graph.add_node("transfer_to_human", human.transfer_to_human, retry_policy=RetryPolicy(max_attempts=3))
-    graph.add_node("images_thinking_node", images_thinking.images_thinking, retry_policy=RetryPolicy(max_attempts=3))
+    if emotion:
+        graph.add_node("emotion_node", artificial.detect_emotion, retry_policy=RetryPolicy(max_attempts=3))
+        graph.add_node("transfer_to_human", human.transfer_to_human, retry_policy=RetryPolicy(max_attempts=3))
+    if image:
+        graph.add_node("images_thinking_node", images_thinking.images_thinking, retry_policy=RetryPolicy(max_attempts=3))
     
     # 核心处理节点
     graph.add_node("router", router.identify_intent, retry_policy=RetryPolicy(max_attempts=5))
@@ -31,22 +42,33 @@ def build_airport_service_graph():
     graph.add_node("airport_info_search_node", airport.airport_knowledge_search, retry_policy=RetryPolicy(max_attempts=5))
     graph.add_node("airport_assistant_node", airport.airport_knowledge_agent, retry_policy=RetryPolicy(max_attempts=5))
     graph.add_node("chitchat_node", chitchat.chitchat_agent, retry_policy=RetryPolicy(max_attempts=5))
-    graph.add_node("business_assistant_node", business.business_agent, retry_policy=RetryPolicy(max_attempts=5))
+    graph.add_node("business_assistant_node", business.get_business_agent(), retry_policy=RetryPolicy(max_attempts=5))
+    # 历史压缩节点：每轮结束时把超出窗口的早期轮次折叠进滚动摘要
+    graph.add_node("history_compaction_node", summary.compact_history)
     
-    # 添加边 - 首先进行输入翻译
-    graph.add_edge(START, "translate_input_node")
-    graph.add_edge("translate_input_node", "emotion_node")
-    graph.add_conditional_edges(
-        "emotion_node",
-        human.route_to_next,
-        {
-            "transfer_to_human": "transfer_to_human",
-            "images_thinking_node": "images_thinking_node"
-        }
-    )
-    # graph.add_edge("translate_input_node", "images_thinking_node")
-    # 从输入翻译到路由
-    graph.add_edge("images_thinking_node", "router")
+    # 前处理链：输入翻译 -> 情感识别 -> 图像理解 -> 路由，关闭的节点直接跳过
+    pre_nodes = []
+    if translate:
+        pre_nodes.append("translate_input_node")
+    if emotion:
+        pre_nodes.append("emotion_node")
+    if image:
+        pre_nodes.append("images_thinking_node")
+    pre_nodes.append("router")
+
+    graph.add_edge(START, pre_nodes[0])
+    for current_node, next_node in zip(pre_nodes, pre_nodes[1:]):
+        if current_node == "emotion_node":
+            graph.add_conditional_edges(
+                "emotion_node",
+                human.route_to_next,
+                {
+                    "transfer_to_human": "transfer_to_human",
+                    "images_thinking_node": next_node
+                }
+            )
+        else:
+            graph.add_edge(current_node, next_node)
     
     # 路由到具体工具节点
     graph.add_conditional_edges(
@@ -58,15 +80,20 @@ def build_airport_service_graph():
             "business_assistant_node": "business_assistant_node",
         }
     )
+    # 回答节点之后：需要翻译时先经过输出翻译
+    answer_exit = "translate_output_node" if translate else "history_compaction_node"
     graph.add_edge("flight_info_search_node", "flight_assistant_node")
     graph.add_edge("airport_info_search_node", "airport_assistant_node")
-    graph.add_edge("airport_assistant_node", "translate_output_node")
-    graph.add_edge("flight_assistant_node", "translate_output_node")
-    graph.add_edge("chitchat_node", "translate_output_node")
-    graph.add_edge("business_assistant_node", END)
+    graph.add_edge("airport_assistant_node", answer_exit)
+    graph.add_edge("flight_assistant_node", answer_exit)
+    graph.add_edge("chitchat_node", answer_exit)
+    graph.add_edge("business_assistant_node", "history_compaction_node")
 
-    graph.add_edge("transfer_to_human", 'translate_output_node')
-    graph.add_edge("translate_output_node", END)
+    if emotion:
+        graph.add_edge("transfer_to_human", answer_exit)
+    if translate:
+        graph.add_edge("translate_output_node", "history_compaction_node")
+    graph.add_edge("history_compaction_node", END)
     
 
     # 返回未编译的图对象
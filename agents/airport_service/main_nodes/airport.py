@@ -9,9 +9,13 @@ from langchain_core.runnables import RunnableConfig
 from langchain_core.prompts import ChatPromptTemplate
 from langgraph.types import Command
 from copy import deepcopy
+from typing import Optional
 from langchain_core.messages import AIMessage
 from agents.airport_service.tools import airport_knowledge_query2docs_main
-from agents.airport_service.core import filter_messages_for_agent, max_msg_len, KB_SIMILARITY_THRESHOLD,content_model
+from agents.airport_service.core import filter_messages_for_agent, max_msg_len, KB_SIMILARITY_THRESHOLD
+from agents.airport_service.core import models
+from agents.airport_service.core import airport_retrieval_speculation, retrieval_fingerprint, SPECULATIVE_RETRIEVAL
+from agents.airport_service.core import airport_answer_cache
 from agents.airport_service.context_engineering.prompts import main_graph_prompts
 from agents.airport_service.context_engineering.agent_memory import memory_enabled_agent
 from datetime import datetime
@@ -21,6 +25,29 @@ from common.logging import get_logger
 
 logger = get_logger("agents.main-nodes.airport")
 
+
+def _get_language(state: AirportMainServiceState) -> str:
+    translator_result = state.get("translator_result")
+    return translator_result.language if translator_result else "中文"
+
+
+def _answer_cache_query(state: AirportMainServiceState, config: RunnableConfig, history: list,
+                        resolved_query: Optional[str] = None) -> Optional[str]:
+    """
+    语义答案缓存使用的问题
+
+    缓存只按问题匹配，而有相关对话历史时本轮问题可能依赖上下文（"那充电宝呢"、"在哪里"），
+    此时改用结合历史改写后的问题（合并问题理解给出的，或检索时生成的 resolved_query）；
+    没有改写结果时返回None，本轮不查也不写缓存
+    """
+    if not history:
+        return state.get("user_query", "") or config["configurable"].get("user_query", "")
+    understanding = state.get("query_understanding")
+    if understanding is not None and understanding.rewritten_query:
+        return understanding.rewritten_query
+    return resolved_query
+
+
 @memory_enabled_agent(application_id="机场主智能客服")
 async def airport_knowledge_agent(state: AirportMainServiceState, config: RunnableConfig):
     """
@@ -29,8 +56,15 @@ async def airport_knowledge_agent(state: AirportMainServiceState, config: Runnab
     """
     logger.info("进入机场知识问答子智能体")
 
+    # 语义缓存命中时答案已由检索节点直接输出
+    if state.get("retrieval_result") and state.get("retrieval_result").source == "answer_cache":
+        logger.info("使用语义缓存答案")
+        return {"retrieval_result": None, "pre_retrieval_result": state.get("retrieval_result")}
+
     # user_query = state.get("user_query", "") if state.get("user_query", "") else config["configurable"].get("user_query", "")
-    user_query = state.get("retrieval_result").query_list[1] if state.get("retrieval_result", "") else config["configurable"].get("user_query", "")
+    # 优先使用改写后的问题；专家QA短路或自适应检索只检索了原问题时查询列表只有一项
+    query_list = state.get("retrieval_result").query_list if state.get("retrieval_result", "") else []
+    user_query = query_list[min(1, len(query_list) - 1)] if query_list else config["configurable"].get("user_query", "")
     
     # 获取统一的检索结果
     retrieval_result = state.get("retrieval_result")
@@ -49,8 +83,7 @@ async def airport_knowledge_agent(state: AirportMainServiceState, config: Runnab
         return {"retrieval_result": None, "pre_retrieval_result": tmp_pre_retrieval_result}  # 清空检索结果
     
     # 准备上下文信息
-    translator_result = state.get("translator_result")
-    language = translator_result.language if translator_result else "中文"
+    language = _get_language(state)
     
     # # 检查检索结果是否有效
     # if not retrieval_result or retrieval_result.source == "none":
@@ -81,7 +114,7 @@ async def airport_knowledge_agent(state: AirportMainServiceState, config: Runnab
 
     messages = new_messages if len(new_messages) > 0 else [AIMessage(content="暂无对话历史")]
     logger.info(f"机场知识问答子智能体上一轮检索结果: {pre_retrieval_result.content if pre_retrieval_result else '无'}")
-    kb_chain = kb_prompt | content_model
+    kb_chain = kb_prompt | models.content_model
     res = await kb_chain.ainvoke({
         "user_query": user_query,
         "pre_context": pre_retrieval_result.content if pre_retrieval_result else "",
@@ -90,6 +123,12 @@ async def airport_knowledge_agent(state: AirportMainServiceState, config: Runnab
         "language": language
     })
     res.name = "机场知识问答子智能体"
+    if retrieval_result.source == "knowledge_base":
+        # 有对话历史时以改写后的问题作为键，与检索节点查找缓存时一致
+        resolved_query = retrieval_result.query_list[1] if len(retrieval_result.query_list) > 1 else None
+        cache_query = _answer_cache_query(state, config, new_messages, resolved_query)
+        if cache_query:
+            airport_answer_cache.schedule_store(cache_query, language, res.content)
     
     return {
         "messages": [res],
@@ -107,16 +146,56 @@ async def airport_knowledge_search(state: AirportMainServiceState, config: Runna
     
     user_query = state.get("user_query", "") if state.get("user_query", "") else config["configurable"].get("user_query", "")
     messages = filter_messages_for_agent(state, max_msg_len, "机场知识问答子智能体")
+    language = _get_language(state)
+    writer = get_stream_writer()
+    thread_id = config["configurable"].get("thread_id")
+
+    # 语义缓存命中时跳过问题重写、检索、重排和答案生成；问题依赖上下文且没有改写结果时不查缓存
+    cache_query = _answer_cache_query(state, config, messages)
+    cached = await airport_answer_cache.lookup(cache_query, language) if cache_query else None
+    if cached is not None:
+        if thread_id:
+            airport_retrieval_speculation.discard(thread_id, reason="answer_cache")
+        writer({
+            "node_name": "airport_info_search_node",
+            "data": {
+                "type": "cached_answer",
+                "answer": cached.answer,
+                "images": cached.images
+            }
+        })
+        return {
+            "messages": [AIMessage(content=cached.answer, name="机场知识问答子智能体")],
+            "retrieval_result": RetrievalResult(
+                source="answer_cache",
+                content=cached.answer,
+                score=1.0,
+                images=cached.images,
+                query_list=[user_query]
+            )
+        }
     
-    # 执行统一检索
-    retrieval_result = await airport_knowledge_query2docs_main(user_query, messages)
+    # 合并问题理解已给出改写结果时直接检索；否则优先取用路由阶段推测执行的检索结果，未命中则正常检索
+    understanding = state.get("query_understanding")
+    hit, retrieval_result = False, None
+    if understanding is None and SPECULATIVE_RETRIEVAL and thread_id:
+        hit, retrieval_result = await airport_retrieval_speculation.take(
+            thread_id, retrieval_fingerprint(user_query, messages)
+        )
+    if not hit:
+        retrieval_result = await airport_knowledge_query2docs_main(
+            user_query, messages,
+            rewritten_query=understanding.rewritten_query if understanding else None,
+            step_back_query=understanding.step_back_query if understanding else None
+        )
     logger.info(f"机场知识检索结果{retrieval_result.score}: {retrieval_result.content}")
     
-    writer = get_stream_writer()
-    
     # 如果是专家QA结果，直接返回答案
     if retrieval_result.source == "expert_qa":
         logger.info("检索到专家QA结果，直接返回")
+        # 专家QA按原问题匹配，只缓存不依赖上下文的轮次
+        if not messages:
+            airport_answer_cache.schedule_store(user_query, language, retrieval_result.content, retrieval_result.images)
         writer({
             "node_name": "airport_info_search_node",
             "data": {
@@ -9,8 +9,10 @@ from langchain_core.runnables import RunnableConfig
 from langchain_core.messages import AIMessage, BaseMessage
 from agents.airport_service.state import BusinessServiceState
 from agents.airport_service.tools.business import wheelchair_rental
-from agents.airport_service.core import filter_messages_for_agent, max_msg_len, structed_model
+from agents.airport_service.core import filter_messages_for_agent, max_msg_len
+from agents.airport_service.core import models
 from common.logging import get_logger
+from common.registry import component_registry
 from agents.airport_service.context_engineering.prompts import main_graph_prompts
 from agents.airport_service.context_engineering.agent_memory import memory_enabled_agent
 # 获取业务办理节点专用日志记录器
@@ -20,8 +22,8 @@ logger = get_logger("agents.main-nodes.business")
 business_tools = [wheelchair_rental]
 business_tool_node = ToolNode(business_tools)
 
-# 将工具绑定到模型
-llm_with_tools = structed_model.bind_tools(business_tools)
+# 将工具绑定到模型（首次使用时绑定）
+component_registry.register("business_llm_with_tools", lambda: models.structed_model.bind_tools(business_tools))
 
 @memory_enabled_agent(application_id="机场主智能客服")
 async def business_chatbot(state: BusinessServiceState, config: RunnableConfig):
@@ -36,7 +38,7 @@ async def business_chatbot(state: BusinessServiceState, config: RunnableConfig):
     new_messages = filter_messages_for_agent(state, max_msg_len, "业务办理子智能体")
     messages = new_messages if len(new_messages) > 0 else [AIMessage(content="暂无对话历史")]
     
-    business_chain = business_prompt | llm_with_tools
+    business_chain = business_prompt | component_registry.get("business_llm_with_tools")
     
     response = await business_chain.ainvoke({
         "user_query": user_query,
@@ -65,5 +67,10 @@ def create_business_agent():
     logger.info("业务办理子智能体图创建完成")
     return graph
 
-# 创建业务办理子智能体
-business_agent = create_business_agent()
+# 业务办理子智能体在构建主图时才编译，不在导入时编译
+component_registry.register("business_agent", create_business_agent)
+
+
+def get_business_agent():
+    """获取业务办理子智能体图"""
+    return component_registry.get("business_agent")
@@ -11,7 +11,8 @@ from langchain_core.messages import AIMessage, HumanMessage
 from langgraph.prebuilt import ToolNode
 from langgraph.types import Command
 from datetime import datetime
-from agents.airport_service.core import filter_messages_for_agent, max_msg_len,base_model
+from agents.airport_service.core import filter_messages_for_agent, max_msg_len
+from agents.airport_service.core import models
 from agents.airport_service.context_engineering.prompts import main_graph_prompts
 from agents.airport_service.context_engineering.agent_memory import memory_enabled_agent
 from common.logging import get_logger
@@ -47,7 +48,7 @@ async def chitchat_agent(state: AirportMainServiceState, config: RunnableConfig)
         ("human", "{user_query}")
     ]).partial(time=datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
     
-    chain = chitchat_prompt | base_model
+    chain = chitchat_prompt | models.base_model
     
     # 获取消息历史
     new_messages = filter_messages_for_agent(state, max_msg_len, "机场知识问答2号子智能体")
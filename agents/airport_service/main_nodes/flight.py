@@ -11,7 +11,8 @@ from langchain_core.prompts import ChatPromptTemplate
 from agents.airport_service.tools import flight_info_query2docs,get_text2sql_instance
 from langgraph.prebuilt import ToolNode
 from langchain_core.messages import AIMessage, HumanMessage
-from agents.airport_service.core import filter_messages_for_agent, max_msg_len,base_model,extract_flight_numbers_from_result
+from agents.airport_service.core import filter_messages_for_agent, max_msg_len,extract_flight_numbers_from_result
+from agents.airport_service.core import models
 from agents.airport_service.context_engineering.prompts import main_graph_prompts
 from agents.airport_service.context_engineering.agent_memory import memory_enabled_agent
 from datetime import datetime
@@ -154,7 +155,7 @@ async def flight_info_agent(state: AirportMainServiceState, config: RunnableConf
     sql_query = state.get("retrieval_result").sql or ""
 
     # 数据有效，调用LLM进行处理
-    kb_chain = kb_prompt | base_model
+    kb_chain = kb_prompt | models.base_model
     res = await kb_chain.ainvoke({
         "user_query": user_query,
         "sql": sql_query,
@@ -170,6 +171,10 @@ async def flight_info_agent(state: AirportMainServiceState, config: RunnableConf
 async def flight_info_search(state: AirportMainServiceState, config: RunnableConfig):
     messages = filter_messages_for_agent(state, max_msg_len, "航班信息问答子智能体")
     user_query = state.get("user_query", "") if state.get("user_query", "") else config["configurable"].get("user_query", "")
-    retrieval_result = await flight_info_query2docs(user_query, messages)
+    understanding = state.get("query_understanding")
+    retrieval_result = await flight_info_query2docs(
+        user_query, messages,
+        rewritten_query=understanding.flight_rewrite if understanding else None
+    )
     return {"retrieval_result":retrieval_result}
 
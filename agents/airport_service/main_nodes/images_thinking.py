@@ -7,7 +7,8 @@ sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../.
 from agents.airport_service.state import AirportMainServiceState
 from langchain_core.runnables import RunnableConfig
 from langchain_core.prompts import ChatPromptTemplate
-from agents.airport_service.core import filter_messages_for_llm, max_msg_len,image_model
+from agents.airport_service.core import filter_messages_for_llm, max_msg_len
+from agents.airport_service.core import models
 from agents.airport_service.context_engineering.prompts import main_graph_prompts
 from langchain_core.messages import AIMessage
 from common.logging import get_logger
@@ -36,7 +37,7 @@ async def images_thinking(state: AirportMainServiceState, config: RunnableConfig
         ])
     ])
     
-    chain = image_assistant_prompt | image_model
+    chain = image_assistant_prompt | models.image_model
     new_messages = filter_messages_for_llm(state, max_msg_len)
     messages = new_messages if len(new_messages) > 0 else [AIMessage(content="暂无对话历史")]
     # 调用链获取响应
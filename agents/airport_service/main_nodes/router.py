@@ -4,14 +4,22 @@
 import sys
 import os
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../../../../")))
-from agents.airport_service.state import AirportMainServiceState
+from agents.airport_service.state import AirportMainServiceState, QueryUnderstanding
 from langchain_core.runnables import RunnableConfig
 from langchain_core.messages import AIMessage
 from agents.airport_service.context_engineering.agent_memory import memory_enabled_agent
 from langchain_core.prompts import ChatPromptTemplate
-from agents.airport_service.core import filter_messages_for_llm,filter_messages_for_agent, max_msg_len,structed_model
+from agents.airport_service.core import filter_messages_for_llm,filter_messages_for_agent, max_msg_len
+from agents.airport_service.core import models
+from agents.airport_service.core import airport_retrieval_speculation, retrieval_fingerprint, SPECULATIVE_RETRIEVAL
+from agents.airport_service.core import intent_classifier
+from agents.airport_service.tools import airport_knowledge_query2docs_main
 from agents.airport_service.context_engineering.prompts import main_graph_prompts
+from config.utils import config_manager
 from common.logging import get_logger
+from common.metrics import metrics
+from common.registry import component_registry
+from datetime import datetime
 import asyncio
 from pydantic import BaseModel, Field
 from typing import Literal
@@ -19,6 +27,10 @@ from typing import Literal
 # 获取路由节点专用日志记录器
 logger = get_logger("agents.nodes.router")
 
+# 合并问题理解：路由、问题重写、回退问题（航班问题还有航班改写）合并为一次结构化调用，
+# 关闭时沿用原有的多次调用链路，便于A/B对比
+FUSED_QUERY_UNDERSTANDING = config_manager.get_agents_config().get("graph", {}).get("fused_query_understanding", False)
+
 
 class Route(BaseModel):
     step: Literal["flight_query", "business_service", "airport_info"]=Field(
@@ -31,7 +43,18 @@ class Route(BaseModel):
         )
     )
 
-router_model = structed_model.with_structured_output(Route)
+component_registry.register("router_model", lambda: models.structed_model.with_structured_output(Route))
+component_registry.register("query_understanding_model", lambda: models.structed_model.with_structured_output(QueryUnderstanding))
+
+
+async def understand_query(user_query: str, messages) -> QueryUnderstanding:
+    """一次LLM调用得到意图、重写问题、回退问题和航班改写"""
+    prompt = ChatPromptTemplate.from_messages([
+        ("system", main_graph_prompts.QUERY_UNDERSTANDING_SYSTEM_PROMPT),
+        ("human", main_graph_prompts.QUERY_UNDERSTANDING_HUMAN_PROMPT)
+    ]).partial(time=datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+    chain = prompt | component_registry.get("query_understanding_model")
+    return await chain.ainvoke({"messages": messages, "user_query": user_query})
 
 @memory_enabled_agent(application_id="机场主智能客服")
 async def identify_intent(state: AirportMainServiceState, config: RunnableConfig):
@@ -43,14 +66,50 @@ async def identify_intent(state: AirportMainServiceState, config: RunnableConfig
         ("human", main_graph_prompts.ROUTER_HUMAN_PROMPT)
     ])
 
-    chain = router_assistant_prompt | router_model
+    chain = router_assistant_prompt | component_registry.get("router_model")
     messages = filter_messages_for_llm(state, max_msg_len)
+
+    if FUSED_QUERY_UNDERSTANDING:
+        try:
+            with metrics.timer("query_understanding_seconds", mode="fused"):
+                understanding = await understand_query(user_query, messages)
+            metrics.inc("query_understanding", mode="fused", result="ok")
+            logger.info(f"合并问题理解结果: {understanding}")
+            return {"messages":[AIMessage(content=understanding.step,name="主路由智能体")],"router": understanding.step,
+                    "query_understanding": understanding,"user_query":user_query,"metadata":metadata}
+        except Exception as e:
+            # 合并调用失败时回退到原有链路，检索节点会自行重写问题
+            metrics.inc("query_understanding", mode="fused", result="fallback")
+            logger.warning(f"合并问题理解失败，回退到路由+问题重写链路: {e}")
+
+    # 推测执行：与路由LLM并行启动机场知识检索，输入与检索节点完全一致
+    # 合并问题理解开启时检索依赖其改写结果，不做推测执行
+    thread_id = config["configurable"].get("thread_id")
+    speculating = SPECULATIVE_RETRIEVAL and bool(thread_id) and not FUSED_QUERY_UNDERSTANDING
+    if speculating:
+        kb_messages = filter_messages_for_agent(state, max_msg_len, "机场知识问答子智能体")
+        airport_retrieval_speculation.start(
+            thread_id,
+            retrieval_fingerprint(user_query, kb_messages),
+            airport_knowledge_query2docs_main(user_query, kb_messages)
+        )
     try:
-        res = await chain.ainvoke({"messages": messages, "user_query": user_query})
-        return {"messages":[AIMessage(content=res.step,name="主路由智能体")],"router": res.step,"user_query":user_query,"metadata":metadata}
+        # 本地分类器把握足够时不调用路由LLM
+        decision = await intent_classifier.classify(user_query, state.get("router"))
+        if decision is not None:
+            step = decision.label
+        else:
+            with metrics.timer("query_understanding_seconds", mode="router"):
+                res = await chain.ainvoke({"messages": messages, "user_query": user_query})
+            metrics.inc("query_understanding", mode="router", result="ok")
+            step = res.step
+            intent_classifier.schedule_learn(user_query, step)
+        if speculating and route_to_next_node({"router": step}) != "airport_info_search_node":
+            airport_retrieval_speculation.discard(thread_id)
+        return {"messages":[AIMessage(content=step,name="主路由智能体")],"router": step,"query_understanding": None,"user_query":user_query,"metadata":metadata}
     except Exception as e:
         logger.error(f"主路由子智能体执行失败: {e}")
-        return {"messages":[AIMessage(content="用户意图识别失败",name="主路由智能体")],"router": "用户意图识别失败","user_query":user_query,"metadata":metadata}
+        return {"messages":[AIMessage(content="用户意图识别失败",name="主路由智能体")],"router": "用户意图识别失败","query_understanding": None,"user_query":user_query,"metadata":metadata}
 
 
 def route_to_next_node(state: AirportMainServiceState):
@@ -1,9 +1,16 @@
 import sys
 import os
+import asyncio
+from collections import OrderedDict
+from typing import Optional, Tuple
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../../../../")))
 from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.runnables import RunnableConfig
+from langchain_core.messages import AIMessage, HumanMessage, RemoveMessage, SystemMessage
 from langgraph.graph import MessagesState
-from agents.airport_service.core import base_model
+from agents.airport_service.core import max_msg_len, history_compaction_batch
+from agents.airport_service.core import models
+from agents.airport_service.state import AirportMainServiceState
 from common.logging import get_logger
 from agents.airport_service.context_engineering.prompts import main_graph_prompts
 
@@ -13,13 +20,117 @@ logger = get_logger("agents.main-nodes.summary")
 
 
 # summarization_node = SummarizationNode(
-#     model=base_model,
+#     model=models.base_model,
 #     max_tokens=384,
 #     max_tokens_before_summary=512,
 #     max_summary_tokens=128,
 # )
 
 
+def _summarizable_messages(messages):
+    """只保留用户与客服的对话文本，去掉工具调用及图片等非文本内容"""
+    result = []
+    for msg in messages:
+        if isinstance(msg, AIMessage) and msg.tool_calls:
+            continue
+        if not isinstance(msg, (HumanMessage, AIMessage)):
+            continue
+        content = msg.content
+        if isinstance(content, list):
+            content = "".join(part.get("text", "") for part in content if isinstance(part, dict))
+        if content:
+            result.append(msg.__class__(content=content))
+    return result
+
+
+def _with_previous_summary(messages, summary):
+    """在消息前拼接已有的滚动摘要"""
+    if not summary:
+        return messages
+    return [SystemMessage(content=f"此前对话的摘要：\n{summary}")] + messages
+
+
+# 后台生成中的摘要：thread_id -> (摘要任务, 被折叠的消息ID, 生成时使用的旧摘要)
+_pending_compactions: "OrderedDict[str, Tuple[asyncio.Task, Tuple[str, ...], Optional[str]]]" = OrderedDict()
+_MAX_PENDING_COMPACTIONS = 1000
+
+
+async def _summarize_folded(folded, previous_summary: Optional[str]) -> str:
+    summary_prompt = ChatPromptTemplate.from_messages([
+        ("system", main_graph_prompts.CONVERSATION_SUMMARY_SYSTEM_PROMPT),
+        ("placeholder", "{messages}"),
+    ])
+    response = await models.base_model.ainvoke(summary_prompt.format(
+        messages=_with_previous_summary(_summarizable_messages(folded), previous_summary)
+    ))
+    return response.content
+
+
+def _schedule_compaction(thread_id: str, folded, previous_summary: Optional[str]):
+    task = asyncio.create_task(_summarize_folded(folded, previous_summary))
+    task.add_done_callback(lambda t: t.cancelled() or t.exception())
+    _pending_compactions[thread_id] = (task, tuple(msg.id for msg in folded if msg.id), previous_summary)
+    while len(_pending_compactions) > _MAX_PENDING_COMPACTIONS:
+        _, (stale_task, _, _) = _pending_compactions.popitem(last=False)
+        stale_task.cancel()
+
+
+# 历史压缩节点：把超出窗口的早期轮次折叠进滚动摘要
+async def compact_history(state: AirportMainServiceState, config: RunnableConfig):
+    """
+    历史压缩节点函数
+
+    轮次数超过 max_msg_len + history_compaction_batch 时，保留最近 max_msg_len 轮，
+    更早的轮次与已有摘要合并生成新的摘要后通过 RemoveMessage 从 messages 中删除。
+    按批压缩是为了避免每轮都调用一次摘要模型。
+
+    摘要模型在后台调用，不阻塞本轮回答结束，也不延后同一会话排队的下一轮；
+    生成好的摘要在该会话下一次经过本节点时写入状态（被折叠的消息和旧摘要均未变化时），
+    因此压缩比触发晚一轮生效。
+
+    Args:
+        state: 当前状态对象
+        config: 运行配置，用于获取 thread_id
+
+    Returns:
+        更新后的摘要及待删除的消息；没有可写入的摘要时返回空字典
+    """
+    thread_id = config["configurable"].get("thread_id")
+    if history_compaction_batch <= 0 or not thread_id:
+        return {}
+
+    messages = state.get("messages", [])
+    summary = state.get("summary")
+    update = {}
+
+    entry = _pending_compactions.get(thread_id)
+    if entry is not None:
+        task, folded_ids, previous_summary = entry
+        if not task.done():
+            return {}
+        _pending_compactions.pop(thread_id, None)
+        if task.cancelled() or task.exception() is not None:
+            # 压缩失败不影响回答，下面会重新尝试
+            logger.error(f"历史压缩失败: {'已取消' if task.cancelled() else task.exception()}")
+        elif previous_summary == summary and set(folded_ids) <= {msg.id for msg in messages}:
+            summary = task.result()
+            update = {"summary": summary, "messages": [RemoveMessage(id=msg_id) for msg_id in folded_ids]}
+            messages = [msg for msg in messages if msg.id not in set(folded_ids)]
+            logger.info(f"历史压缩：写入摘要，删除 {len(folded_ids)} 条消息")
+        else:
+            logger.info("历史压缩：生成摘要期间对话状态已变化，丢弃该摘要")
+
+    turn_starts = [i for i, msg in enumerate(messages) if isinstance(msg, HumanMessage)]
+    if len(turn_starts) > max_msg_len + history_compaction_batch:
+        # 在轮次边界切分，保证工具调用与其结果不会被拆开
+        cut = turn_starts[-max_msg_len]
+        folded = messages[:cut]
+        logger.info(f"历史压缩：共 {len(turn_starts)} 轮，后台折叠前 {len(turn_starts) - max_msg_len} 轮（{len(folded)} 条消息）")
+        _schedule_compaction(thread_id, folded, summary)
+
+    return update
+
+
 # 客服对话摘要总结节点函数，提供给外部独立使用
 async def summarize_conversation(state: MessagesState):
     """
@@ -33,9 +144,10 @@ async def summarize_conversation(state: MessagesState):
     """
     logger.info("进入对话摘要总结节点")
 
-    # 获取消息历史
+    # 获取消息历史，已被压缩的早期轮次以滚动摘要的形式补充
     messages = state.values.get("messages", [])
     logger.info(f"消息历史数量: {len(messages)}")
+    messages = _with_previous_summary(messages, state.values.get("summary"))
     
     # 构建提示模板
     summary_prompt = ChatPromptTemplate.from_messages([
@@ -43,7 +155,7 @@ async def summarize_conversation(state: MessagesState):
         ("placeholder", "{messages}"),
     ])
 
-    response = await base_model.ainvoke(summary_prompt.format(messages=messages))
+    response = await models.base_model.ainvoke(summary_prompt.format(messages=messages))
     # 返回更新后的状态
     return {"summary": response.content}
 
@@ -65,7 +177,7 @@ async def summarize_human_agent_conversation(conversation_list):
     summary_prompt = ChatPromptTemplate.from_template(main_graph_prompts.HUMAN_AGENT_SUMMARY_PROMPT)
 
     # 调用模型生成摘要
-    response = await base_model.ainvoke(summary_prompt.format(conversation_list=conversation_list))
+    response = await models.base_model.ainvoke(summary_prompt.format(conversation_list=conversation_list))
     
     # 返回摘要结果
     return {"summary": response.content}
@@ -12,10 +12,11 @@ from langchain_core.runnables import RunnableConfig
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.messages import AIMessage
 from agents.airport_service.tools import airport_knowledge_query2docs
-from trustcall import create_extractor
-from agents.airport_service.core import filter_messages_for_llm,content_model
+from agents.airport_service.core import filter_messages_for_llm
+from agents.airport_service.core import models
 from datetime import datetime
 from common.logging import get_logger
+from common.registry import component_registry
 from agents.airport_service.context_engineering.prompts import question_recommend_prompts
 
 # 获取机场知识节点专用日志记录器
@@ -34,6 +35,18 @@ def replace_outer_single_quotes(lst):
     return result
 
 
+def _build_question_recommend_extractor():
+    from trustcall import create_extractor
+    return create_extractor(
+        models.content_model,
+        tools=[QuestionRecommendSchema],
+        tool_choice="QuestionRecommendSchema"
+    )
+
+# 抽取器只构建一次，不再每次请求重新创建
+component_registry.register("question_recommend_extractor", _build_question_recommend_extractor)
+
+
 async def provide_question_recommend(state: QuestionRecommendState, config: RunnableConfig):
     """
     问题推荐节点
@@ -45,11 +58,7 @@ async def provide_question_recommend(state: QuestionRecommendState, config: Runn
         ("human", question_recommend_prompts.QUESTION_RECOMMEND_HUMAN_PROMPT)
     ]).partial(time=datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
 
-    extractor = create_extractor(
-        content_model,
-        tools=[QuestionRecommendSchema],
-        tool_choice="QuestionRecommendSchema"
-    )
+    extractor = component_registry.get("question_recommend_extractor")
 
     user_query = state.get("user_query", "") if state.get("user_query", "") else config["configurable"].get("user_query", "")
     translator_result = state.get("translator_result")
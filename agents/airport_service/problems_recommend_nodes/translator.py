@@ -8,15 +8,22 @@ from langchain_core.output_parsers import PydanticOutputParser
 from langchain_core.prompts import PromptTemplate, ChatPromptTemplate
 from langchain_core.runnables import RunnableConfig
 from agents.airport_service.state import AirportMainServiceState, TranslationResult
-from trustcall import create_extractor
 from langchain_core.messages import RemoveMessage,HumanMessage,AIMessage
-from agents.airport_service.core import structed_model
+from agents.airport_service.core import models
 from common.logging import get_logger
+from common.registry import component_registry
 from agents.airport_service.context_engineering.prompts import question_recommend_prompts
 
 # 获取翻译节点专用日志记录器
 logger = get_logger("agents.problems-recommend-nodes.translator")
-extractor = create_extractor(structed_model,tools=[TranslationResult])
+
+
+def _build_translation_extractor():
+    from trustcall import create_extractor
+    return create_extractor(models.structed_model,tools=[TranslationResult])
+
+# 各图的翻译节点共用同一个抽取器，首次使用时构建
+component_registry.register("translation_extractor", _build_translation_extractor)
 
 def remove_message(state:AirportMainServiceState,del_nb = 2):
     """
@@ -46,7 +53,7 @@ async def translate_input(state: AirportMainServiceState, config: RunnableConfig
             input_variables=["user_input"],
             partial_variables={"format_instructions": input_parser.get_format_instructions()},
         )
-        chain = input_translation_prompt | extractor
+        chain = input_translation_prompt | component_registry.get("translation_extractor")
 
         last_msg = state["messages"][-1]
         del_msg = remove_message(state,del_nb=2)
@@ -87,7 +94,7 @@ async def translate_output(state: AirportMainServiceState, config: RunnableConfi
         try:
             translator_result = state.get("translator_result")
             language = translator_result.language if translator_result else "中文"
-            chain = output_translation_prompt | structed_model
+            chain = output_translation_prompt | models.structed_model
             ai_msg = state["messages"][-1]
             result = await chain.ainvoke({"user_input": ai_msg.content,"language":language})
             result.name = "翻译助手"
@@ -0,0 +1,333 @@
+"""
+会话运行协调器
+
+同一 thread_id 上的多次运行共享同一份checkpoint，并发执行时都会完整调用LLM，
+最终只有最后写入的结果生效。协调器保证同一会话同一时刻只有一次运行：
+
+- queue：后到的运行排队等待前一次运行结束
+- supersede：后到的运行取消仍在执行或排队的旧运行（连同其进行中的LLM/HTTP调用）
+- none：不做协调，保持原有的并发行为
+
+进程内通过 asyncio.Lock 串行化；开启Redis租约后，跨副本同样生效。
+supersede 模式下新运行登记后通过Redis发布/订阅通知各副本，旧运行立即取消，不必等到下一次租约续期。
+"""
+import asyncio
+import time
+import uuid
+from contextlib import asynccontextmanager, suppress
+from typing import AsyncIterator, Dict, Optional
+
+from config.utils import config_manager
+from common.logging import get_logger
+from common.metrics import metrics
+
+logger = get_logger("agents.run_coordinator")
+
+_graph_config = config_manager.get_agents_config().get("graph", {})
+THREAD_RUN_POLICY = _graph_config.get("thread_run_policy", "queue")
+THREAD_RUN_REDIS_LEASE = _graph_config.get("thread_run_redis_lease", False)
+THREAD_RUN_LEASE_TTL = _graph_config.get("thread_run_lease_ttl", 30)
+THREAD_RUN_WAIT_TIMEOUT = _graph_config.get("thread_run_wait_timeout", 60)
+
+LEASE_KEY_PREFIX = "thread_run"
+# supersede 模式下新运行登记为最新后发布的通知，消息内容为 thread_id
+SUPERSEDE_CHANNEL = f"{LEASE_KEY_PREFIX}:superseded"
+
+# 仅当租约仍属于自己时才续期/释放
+_RENEW_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('pexpire', KEYS[1], ARGV[2])
+end
+return 0
+"""
+_RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+class RunCancelledError(Exception):
+    """运行被取消（被新消息取代、排队超时或被主动取消）"""
+
+    def __init__(self, thread_id: str, reason: str):
+        super().__init__(f"会话 {thread_id} 的运行已取消: {reason}")
+        self.thread_id = thread_id
+        self.reason = reason
+
+
+_DONE = object()
+
+
+class ThreadRun:
+    """一次图运行的句柄，负责在独立任务中执行流式输出以便随时取消"""
+
+    def __init__(self, thread_id: str, seq: int):
+        self.thread_id = thread_id
+        self.seq = seq
+        self.token = uuid.uuid4().hex
+        self.cancel_reason: Optional[str] = None
+        # 已在Redis中登记为该会话的最新运行（supersede 模式跨副本协调）
+        self.registered = False
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def cancelled(self) -> bool:
+        return self.cancel_reason is not None
+
+    def cancel(self, reason: str):
+        """取消运行，正在执行的节点会收到 CancelledError 并中断上游请求"""
+        if self.cancel_reason is None:
+            self.cancel_reason = reason
+            metrics.inc("thread_run_cancelled", reason=reason)
+            logger.info(f"会话 {self.thread_id} 的运行 #{self.seq} 被取消: {reason}")
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+
+    async def execute(self, coro):
+        """在后台任务中执行非流式调用；运行被取消时抛出 RunCancelledError"""
+        if self.cancelled:
+            coro.close()
+            raise RunCancelledError(self.thread_id, self.cancel_reason)
+        self._task = asyncio.create_task(coro)
+        try:
+            # asyncio.wait 不会因内部任务被取消而抛出，便于区分取消来源
+            await asyncio.wait({self._task})
+        finally:
+            if not self._task.done():
+                self._task.cancel()
+        if self._task.cancelled():
+            raise RunCancelledError(self.thread_id, self.cancel_reason or "cancelled")
+        return self._task.result()
+
+    async def stream(self, source: AsyncIterator) -> AsyncIterator:
+        """在后台任务中消费 source 并转发结果；运行被取消时抛出 RunCancelledError"""
+        if self.cancelled:
+            raise RunCancelledError(self.thread_id, self.cancel_reason)
+
+        queue: asyncio.Queue = asyncio.Queue()
+
+        async def pump():
+            async for item in source:
+                queue.put_nowait(item)
+
+        self._task = asyncio.create_task(pump())
+        self._task.add_done_callback(lambda _: queue.put_nowait(_DONE))
+        try:
+            while True:
+                item = await queue.get()
+                if item is _DONE or self.cancelled:
+                    break
+                yield item
+            if self.cancelled:
+                raise RunCancelledError(self.thread_id, self.cancel_reason)
+            if self._task.exception() is not None:
+                raise self._task.exception()
+        finally:
+            # 消费方提前退出或自身被取消时，同样中止后台运行
+            if not self._task.done():
+                self._task.cancel()
+                with suppress(asyncio.CancelledError, Exception):
+                    await self._task
+
+
+class _ThreadSlot:
+    """单个会话的协调状态"""
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.latest = 0
+        self.waiting = 0
+        self.runs: Dict[int, ThreadRun] = {}
+
+
+class ThreadRunCoordinator:
+    """按 thread_id 串行化或取代图运行"""
+
+    def __init__(self, policy: str = THREAD_RUN_POLICY, redis_lease: bool = THREAD_RUN_REDIS_LEASE,
+                 lease_ttl: float = THREAD_RUN_LEASE_TTL, wait_timeout: float = THREAD_RUN_WAIT_TIMEOUT):
+        self.policy = policy
+        self.redis_lease = redis_lease
+        self.lease_ttl = lease_ttl
+        self.wait_timeout = wait_timeout
+        self._slots: Dict[str, _ThreadSlot] = {}
+        self._redis = None
+        self._supersede_listener: Optional[asyncio.Task] = None
+
+    def bind_redis(self, redis_client):
+        """绑定共享Redis客户端，开启租约时用于跨副本协调"""
+        self._redis = redis_client
+        if self._supersede_listener is not None:
+            self._supersede_listener.cancel()
+            self._supersede_listener = None
+
+    def active_threads(self) -> int:
+        return len(self._slots)
+
+    def cancel_thread(self, thread_id: str, reason: str = "cancelled") -> int:
+        """取消某会话进行中及排队中的全部运行，返回被取消的数量"""
+        slot = self._slots.get(thread_id)
+        if slot is None:
+            return 0
+        runs = list(slot.runs.values())
+        for run in runs:
+            run.cancel(reason)
+        return len(runs)
+
+    @asynccontextmanager
+    async def acquire(self, thread_id: str):
+        """获取会话的运行权，返回 ThreadRun 句柄"""
+        if self.policy == "none" or not thread_id:
+            yield ThreadRun(thread_id, 0)
+            return
+
+        slot = self._slots.setdefault(thread_id, _ThreadSlot())
+        slot.latest += 1
+        run = ThreadRun(thread_id, slot.latest)
+        slot.runs[run.seq] = run
+        if self.policy == "supersede":
+            for older in list(slot.runs.values()):
+                if older is not run:
+                    older.cancel("superseded")
+
+        metrics.inc("thread_run_started", policy=self.policy)
+        wait_start = time.perf_counter()
+        slot.waiting += 1
+        acquired = False
+        try:
+            await asyncio.wait_for(slot.lock.acquire(), timeout=self.wait_timeout)
+            acquired = True
+        except asyncio.TimeoutError:
+            run.cancel("queue_timeout")
+            raise RunCancelledError(thread_id, "queue_timeout")
+        finally:
+            slot.waiting -= 1
+            if not acquired:
+                slot.runs.pop(run.seq, None)
+                self._cleanup(thread_id, slot)
+
+        keeper = None
+        try:
+            metrics.observe("thread_run_wait_seconds", time.perf_counter() - wait_start, policy=self.policy)
+            if run.cancelled:
+                raise RunCancelledError(thread_id, run.cancel_reason)
+            if self.redis_lease and self._redis is not None:
+                keeper = await self._acquire_lease(run)
+            yield run
+        finally:
+            if keeper is not None:
+                keeper.cancel()
+                with suppress(asyncio.CancelledError):
+                    await keeper
+                await self._release_lease(run)
+            slot.runs.pop(run.seq, None)
+            slot.lock.release()
+            self._cleanup(thread_id, slot)
+
+    def _cleanup(self, thread_id: str, slot: _ThreadSlot):
+        if slot.waiting == 0 and not slot.lock.locked() and self._slots.get(thread_id) is slot:
+            del self._slots[thread_id]
+
+    # ==================== Redis租约 ====================
+
+    def _lease_keys(self, thread_id: str):
+        return f"{LEASE_KEY_PREFIX}:{thread_id}:lease", f"{LEASE_KEY_PREFIX}:{thread_id}:latest"
+
+    async def _acquire_lease(self, run: ThreadRun) -> Optional[asyncio.Task]:
+        """
+        获取跨副本租约并启动续期任务
+
+        supersede 模式下先登记自己为最新运行并发布通知，其他副本上的旧运行收到通知后立即取消
+        （通知丢失时仍会在续期时发现）。Redis不可用时放弃租约（仅保留进程内协调），不阻塞对话。
+        """
+        lease_key, latest_key = self._lease_keys(run.thread_id)
+        ttl_ms = int(self.lease_ttl * 1000)
+        deadline = time.perf_counter() + self.wait_timeout
+        try:
+            if self.policy == "supersede":
+                self._ensure_supersede_listener()
+                await self._redis.set(latest_key, run.token, px=ttl_ms)
+                run.registered = True
+                await self._redis.publish(SUPERSEDE_CHANNEL, run.thread_id)
+            while not await self._redis.set(lease_key, run.token, nx=True, px=ttl_ms):
+                if self.policy == "supersede" and await self._is_superseded(run):
+                    run.cancel("superseded")
+                    raise RunCancelledError(run.thread_id, "superseded")
+                if time.perf_counter() > deadline:
+                    run.cancel("queue_timeout")
+                    raise RunCancelledError(run.thread_id, "queue_timeout")
+                await asyncio.sleep(0.1)
+        except RunCancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"获取会话 {run.thread_id} 的Redis租约失败，仅使用进程内协调: {e}")
+            metrics.inc("thread_run_lease_error")
+            return None
+        return asyncio.create_task(self._keep_lease(run))
+
+    async def _is_superseded(self, run: ThreadRun) -> bool:
+        _, latest_key = self._lease_keys(run.thread_id)
+        latest = await self._redis.get(latest_key)
+        if isinstance(latest, bytes):
+            latest = latest.decode("utf-8")
+        return latest is not None and latest != run.token
+
+    def _ensure_supersede_listener(self):
+        if self._supersede_listener is None or self._supersede_listener.done():
+            self._supersede_listener = asyncio.create_task(self._listen_supersede())
+
+    async def _listen_supersede(self):
+        """订阅取代通知：任一副本上有新运行登记为最新时，立即取消本副本上同一会话已登记的旧运行"""
+        while self._redis is not None:
+            pubsub = self._redis.pubsub()
+            try:
+                await pubsub.subscribe(SUPERSEDE_CHANNEL)
+                async for message in pubsub.listen():
+                    if message.get("type") != "message":
+                        continue
+                    thread_id = message["data"]
+                    if isinstance(thread_id, bytes):
+                        thread_id = thread_id.decode("utf-8")
+                    await self._cancel_superseded(thread_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"订阅运行取代通知失败，1秒后重试: {e}")
+                metrics.inc("thread_run_lease_error")
+                await asyncio.sleep(1)
+            finally:
+                with suppress(Exception):
+                    await pubsub.aclose()
+
+    async def _cancel_superseded(self, thread_id: str):
+        slot = self._slots.get(thread_id)
+        if slot is None:
+            return
+        # 以Redis中登记的最新运行为准，自己发布的通知以及通知与新运行登记的先后乱序都不会误取消
+        for run in list(slot.runs.values()):
+            if run.registered and not run.cancelled and await self._is_superseded(run):
+                run.cancel("superseded")
+
+    async def _keep_lease(self, run: ThreadRun):
+        """定期续期租约，supersede 模式下同时检查是否已被其他副本上的新运行取代"""
+        lease_key, latest_key = self._lease_keys(run.thread_id)
+        ttl_ms = int(self.lease_ttl * 1000)
+        while True:
+            await asyncio.sleep(self.lease_ttl / 3)
+            try:
+                await self._redis.eval(_RENEW_SCRIPT, 1, lease_key, run.token, ttl_ms)
+                if self.policy == "supersede":
+                    if await self._is_superseded(run):
+                        run.cancel("superseded")
+                        return
+                    await self._redis.pexpire(latest_key, ttl_ms)
+            except Exception as e:
+                logger.warning(f"会话 {run.thread_id} 租约续期失败: {e}")
+
+    async def _release_lease(self, run: ThreadRun):
+        lease_key, _ = self._lease_keys(run.thread_id)
+        try:
+            await self._redis.eval(_RELEASE_SCRIPT, 1, lease_key, run.token)
+        except Exception as e:
+            logger.warning(f"释放会话 {run.thread_id} 的租约失败: {e}")
@@ -19,8 +19,8 @@ class TranslationResult(BaseModel):
 
 class RetrievalResult(BaseModel):
     """统一的检索结果模型"""
-    source: Literal["expert_qa", "knowledge_base", "flight","none"] = Field(
-        description="检索来源类型：expert_qa(专家问答), knowledge_base(知识库), none(无结果)"
+    source: Literal["expert_qa", "knowledge_base", "flight", "answer_cache", "none"] = Field(
+        description="检索来源类型：expert_qa(专家问答), knowledge_base(知识库), answer_cache(语义答案缓存), none(无结果)"
     )
     content: Optional[str] = Field(
         default=None, 
@@ -43,6 +43,21 @@ class RetrievalResult(BaseModel):
         description="相关查询列表（如果有）"
     )
 
+class QueryUnderstanding(BaseModel):
+    """合并的问题理解结果：一次LLM调用得到意图和检索用的改写问题"""
+    step: Literal["flight_query", "business_service", "airport_info"] = Field(
+        description=(
+            "用户当前问题的意图分类：flight_query(航班动态/航班搜索), "
+            "business_service(轮椅租赁等业务办理), airport_info(机场设施、规定、服务等咨询)"
+        )
+    )
+    rewritten_query: str = Field(description="结合对话历史改写后、适合检索机场知识库的完整问题")
+    step_back_query: str = Field(description="按物品在航空安检中的属性泛化后的回退问题")
+    flight_rewrite: Optional[str] = Field(
+        default=None,
+        description="意图为 flight_query 时，补全时间等要素、适合检索航班数据库的问题"
+    )
+
 def dict_merge(old_dict, new_dict):
     """合并字典，处理状态更新"""
     if not old_dict:
@@ -59,8 +74,10 @@ class AirportMainServiceState(MessagesState):
     emotion_result: Optional[Dict] = None
     pre_retrieval_result: Optional[RetrievalResult] = None
     retrieval_result: Optional[RetrievalResult] = None  # 统一的检索结果
+    query_understanding: Optional[QueryUnderstanding] = None  # 合并问题理解的结果（仅本轮有效）
     chart_config: Optional[Dict] = None
     metadata: Optional[Dict] = None
+    summary: Optional[str] = None  # 已折叠出messages的早期对话的滚动摘要
 
 class BusinessServiceState(AgentState):
     pass
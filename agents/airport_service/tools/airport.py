@@ -2,11 +2,14 @@ import sys
 import os
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../../../")))
 import asyncio
-from text2kb.retrieval import retrieve_from_kb
+import time
+from text2kb.retrieval import retrieve_many_from_kb, get_kb_client
+from text2kb.replica import KnowledgeBaseReplica
 from langchain_core.messages import AnyMessage
-from typing import List
+from typing import List, Optional, Tuple
 from config.utils import config_manager
-from agents.airport_service.core import comprehensive_query_transform,rerank_results
+from agents.airport_service.core import comprehensive_query_transform,rerank_results,rerank_enabled,fuse_candidates,models
+from common.metrics import metrics
 from agents.airport_service.context_engineering.agent_memory import get_relevant_expert_qa_memories
 from agents.airport_service.state import RetrievalResult
 from common.logging import get_logger
@@ -22,99 +25,285 @@ KB_KEY_WORDS = bool(_text2kb_config.get("kb_key_words"))
 RERANKER_MODEL = _text2kb_config.get("reranker_model")
 RERANKER_BASE_URL = _text2kb_config.get("reranker_base_url")
 RERANKER_API_KEY = _text2kb_config.get("reranker_api_key")
+RERANK_ENABLED = rerank_enabled(RERANKER_MODEL, RERANKER_BASE_URL)
+KB_RETRIEVAL_BACKEND = _text2kb_config.get("kb_retrieval_backend", "ragflow")
+KB_RRF_K = _text2kb_config.get("kb_rrf_k", 60)
+KB_FUSION_TOP_N = _text2kb_config.get("kb_fusion_top_n", 15)
+KB_NEAR_DUPLICATE_DISTANCE = _text2kb_config.get("kb_near_duplicate_distance", 10)
+KB_ADAPTIVE_RETRIEVAL = _text2kb_config.get("kb_adaptive_retrieval", False)
+KB_ADAPTIVE_MIN_SCORE = _text2kb_config.get("kb_adaptive_min_score", 0.7)
+KB_ADAPTIVE_MIN_MARGIN = _text2kb_config.get("kb_adaptive_min_margin", 0.05)
+KB_ADAPTIVE_DECOMPOSE = _text2kb_config.get("kb_adaptive_decompose", True)
+# 固定多路检索的查询数和改写LLM调用数（原问题 + 重写 + 回退），用于统计自适应检索省下的扇出
+_FIXED_FAN_OUT_QUERIES = 3
+_FIXED_FAN_OUT_REWRITE_CALLS = 2
 
+_graph_config = config_manager.get_agents_config().get("graph", {})
+EXPERT_QA_SCORE_LIMIT = _graph_config.get("expert_qa_score_limit", 0.2)
+EXPERT_QA_SHORT_CIRCUIT = _graph_config.get("expert_qa_short_circuit", True)
+EXPERT_QA_SHORT_CIRCUIT_SCORE = _graph_config.get("expert_qa_short_circuit_score", 0.05)
 
+# 知识库本地副本（KB_RETRIEVAL_BACKEND=local 时由应用启动时 start）
+kb_replica = KnowledgeBaseReplica(
+    get_kb_client(KB_ADDRESS, KB_API_KEY),
+    KB_DATASET_NAME,
+    embeddings=lambda: models.emb_model,
+    embedding_id=config_manager.get_agents_config().get("embedding", {}).get("embedding_model", ""),
+    sync_interval=_text2kb_config.get("kb_local_sync_interval", 600),
+    snapshot_dir=_text2kb_config.get("kb_local_snapshot_dir") or None,
+    embed_batch_size=_text2kb_config.get("kb_local_embed_batch_size", 32)
+)
 
-async def airport_knowledge_query2docs_main(user_question:str,messages:List[AnyMessage]) -> RetrievalResult:
+
+async def retrieve_kb(query_list: List[str], top_k: int) -> List[List[dict]]:
+    """按配置的检索后端检索多个问题；本地副本未就绪时回退到 RAGFlow"""
+    kwargs = dict(similarity_threshold=0.01,
+                  vector_similarity_weight=KB_VECTOR_SIMILARITY_WEIGHT,
+                  top_k=top_k,
+                  key_words=KB_KEY_WORDS)
+    if KB_RETRIEVAL_BACKEND == "local":
+        if kb_replica.ready:
+            metrics.inc("kb_retrieval", backend="local")
+            return await kb_replica.retrieve_many(query_list, **kwargs)
+        metrics.inc("kb_retrieval", backend="ragflow_fallback")
+    else:
+        metrics.inc("kb_retrieval", backend="ragflow")
+    return await retrieve_many_from_kb(questions=query_list,
+                                       dataset_name=KB_DATASET_NAME,
+                                       address=KB_ADDRESS,
+                                       api_key=KB_API_KEY,
+                                       **kwargs)
+
+
+def _retrieval_confidence(results_lists: List[List[dict]]) -> Tuple[bool, float, float]:
+    """
+    多路检索结果的把握程度：内容相同的分块取最高相似度，看第一名的相似度及其领先第二名的差距
+
+    只看向量余弦相似度（vector_similarity）：RAGFlow 与本地副本都返回该字段且含义相同，
+    而 similarity 在本地副本上是 BM25 与向量的加权分数，量纲不同。阈值默认值按 RAGFlow 的向量相似度调得
+
+    Returns:
+        (是否有把握, 最高相似度, 领先差距)
+    """
+    best_by_content = {}
+    for results in results_lists:
+        if isinstance(results, Exception):
+            continue
+        for result in results:
+            similarity = float(result.get("vector_similarity") or 0.0)
+            if similarity > best_by_content.get(result["content"], -1.0):
+                best_by_content[result["content"]] = similarity
+    scores = sorted(best_by_content.values(), reverse=True)
+    if not scores:
+        return False, 0.0, 0.0
+    margin = scores[0] - scores[1] if len(scores) > 1 else scores[0]
+    return scores[0] >= KB_ADAPTIVE_MIN_SCORE and margin >= KB_ADAPTIVE_MIN_MARGIN, scores[0], margin
+
+
+async def adaptive_retrieve_kb(user_question: str, messages: List[AnyMessage], top_k: int,
+                               rewritten_query: Optional[str] = None,
+                               step_back_query: Optional[str] = None) -> Tuple[List[str], List[List[dict]]]:
+    """
+    自适应多路检索：按检索把握逐级扩展查询
+
+    1. 只检索原问题，有把握时直接返回，不调用改写LLM
+    2. 加入重写问题和回退问题（已由路由节点给出时直接使用，否则调用LLM生成）
+    3. 仍无把握时加入组件分解问题（KB_ADAPTIVE_DECOMPOSE）
+
+    Args:
+        user_question: 用户问题
+        messages: 历史消息列表
+        top_k: 每个查询的检索数量
+        rewritten_query: 已生成的重写问题
+        step_back_query: 已生成的回退问题
+
+    Returns:
+        (实际检索的查询列表, 与查询列表一一对应的检索结果)
+    """
+    # 固定扇出下本轮需要的改写LLM调用数（路由节点已给出改写结果时为0）
+    fixed_rewrite_calls = 0 if (rewritten_query and step_back_query) else _FIXED_FAN_OUT_REWRITE_CALLS
+    query_list = [user_question]
+    results_lists = await retrieve_kb(query_list, top_k)
+    rewrite_calls = 0
+    stage = "original"
+    confident, top_score, margin = _retrieval_confidence(results_lists)
+
+    if not confident:
+        stage = "rewrite"
+        if not (rewritten_query and step_back_query):
+            rewrite_calls += 2
+            rewritten_query, step_back_query = await asyncio.gather(
+                comprehensive_query_transform(user_question, 'rewrite', messages),
+                comprehensive_query_transform(user_question, 'step_back', messages),
+                return_exceptions=True
+            )
+        variants = []
+        for query in (rewritten_query, step_back_query):
+            if query and not isinstance(query, Exception) and query not in query_list and query not in variants:
+                variants.append(query)
+        if variants:
+            query_list += variants
+            results_lists += await retrieve_kb(variants, top_k)
+            confident, top_score, margin = _retrieval_confidence(results_lists)
+
+    if not confident and KB_ADAPTIVE_DECOMPOSE:
+        stage = "decompose"
+        # 组件分解不依赖对话历史，不传消息以便跨会话复用改写缓存
+        rewrite_calls += 1
+        decomposed_query = await comprehensive_query_transform(user_question, 'decompose')
+        if decomposed_query and decomposed_query not in query_list:
+            query_list.append(decomposed_query)
+            results_lists += await retrieve_kb([decomposed_query], top_k)
+            confident, top_score, margin = _retrieval_confidence(results_lists)
+
+    metrics.inc("kb_adaptive_retrieval", stage=stage, result="confident" if confident else "low_confidence")
+    metrics.observe("kb_adaptive_top_score", top_score, stage=stage)
+    metrics.inc("kb_adaptive_queries", len(query_list))
+    metrics.inc("kb_adaptive_rewrite_calls", rewrite_calls)
+    # 相对固定三路检索省下的查询数和改写LLM调用数（分解阶段会多于固定扇出，不计入）
+    metrics.inc("kb_adaptive_avoided", max(0, _FIXED_FAN_OUT_QUERIES - len(query_list)), resource="kb_queries")
+    metrics.inc("kb_adaptive_avoided", max(0, fixed_rewrite_calls - rewrite_calls), resource="rewrite_calls")
+    logger.info(f"自适应检索: 阶段 {stage}, 查询 {len(query_list)} 个, 最高相似度 {top_score:.3f}, 领先差距 {margin:.3f}")
+    return query_list, results_lists
+
+
+def _record_turn(path: str, start: float):
+    """按检索路径统计轮次和耗时（expert_qa_short_circuit / expert_qa / knowledge_base / none）"""
+    metrics.inc("airport_retrieval_turns", path=path)
+    metrics.observe("airport_retrieval_seconds", time.perf_counter() - start, path=path)
+
+
+def _cancel(future: asyncio.Future):
+    """取消后台任务，并取走其异常，避免 "exception was never retrieved" 警告"""
+    future.cancel()
+    future.add_done_callback(lambda f: f.cancelled() or f.exception())
+
+
+async def _retrieve_candidates(user_question: str, messages: List[AnyMessage],
+                               rewritten_query: Optional[str] = None,
+                               step_back_query: Optional[str] = None) -> Tuple[List[str], List[List[dict]]]:
+    """
+    问题重写（未给出时）+ 多路知识库检索
+
+    Returns:
+        (查询列表, 与查询列表一一对应的检索结果)
+    """
+    if KB_ADAPTIVE_RETRIEVAL:
+        # 自适应检索：先检索原问题，把握不足时才按需生成改写问题并扩展查询
+        return await adaptive_retrieve_kb(user_question, messages, KB_TOP_K*5, rewritten_query, step_back_query)
+
+    if not (rewritten_query and step_back_query):
+        rewritten_query, step_back_query = await asyncio.gather(
+            comprehensive_query_transform(user_question,'rewrite',messages),
+            comprehensive_query_transform(user_question,'step_back',messages),
+            return_exceptions=True
+        )
+    # 构建查询列表
+    query_list = [user_question]  # 原始用户问题
+    query_list.append(rewritten_query) if rewritten_query and not isinstance(rewritten_query, Exception) else None
+    query_list.append(step_back_query) if step_back_query and not isinstance(step_back_query, Exception) else None
+    logger.info(f"重写后的问题: {query_list}")
+    return query_list, await retrieve_kb(query_list, KB_TOP_K*5)
+
+
+def _expert_qa_result(expert_qa: dict, query_list: List[str]) -> RetrievalResult:
+    return RetrievalResult(
+        source="expert_qa",
+        content=expert_qa["answer"],
+        score=expert_qa.get("score", 1.0),
+        images=expert_qa.get("images"),
+        query_list=query_list
+    )
+
+
+async def airport_knowledge_query2docs_main(user_question:str,messages:List[AnyMessage],
+                                            rewritten_query:Optional[str]=None,
+                                            step_back_query:Optional[str]=None) -> RetrievalResult:
     """
     统一的知识检索入口，返回标准化的检索结果
     
     Args:
         user_question: 用户问题
         messages: 历史消息列表
+        rewritten_query: 已生成的重写问题（合并问题理解时由路由节点给出），为空则调用LLM重写
+        step_back_query: 已生成的回退问题，为空则调用LLM生成
         
     Returns:
         RetrievalResult: 统一的检索结果对象
     """
+    start = time.perf_counter()
     user_query = user_question
     
-    # 第一步：先完成问题重写（知识库检索依赖这个）
-    rewritten_query_task = comprehensive_query_transform(user_query,'rewrite',messages)
-    step_back_query_task = comprehensive_query_transform(user_query,'step_back',messages)
-    rewritten_query, step_back_query = await asyncio.gather(
-        rewritten_query_task, 
-        step_back_query_task, 
-        return_exceptions=True
-    )
-    
-    # 第二步：并行执行专家QA检索和知识库检索
-    expert_qa_task = get_relevant_expert_qa_memories(
+    # 用原问题检索专家QA，同时开始问题重写和知识库检索，两者互不等待
+    expert_qa_task = asyncio.create_task(get_relevant_expert_qa_memories(
         query=user_query,
-        score_limit=0.2,
+        score_limit=EXPERT_QA_SCORE_LIMIT,
         limit=1
+    ))
+    retrieval_task = asyncio.create_task(
+        _retrieve_candidates(user_question, messages, rewritten_query, step_back_query)
     )
     
-    # 构建查询列表
-    query_list = [user_question]  # 原始用户问题
-    query_list.append(rewritten_query) if rewritten_query and not isinstance(rewritten_query, Exception) else None
-    query_list.append(step_back_query) if step_back_query and not isinstance(step_back_query, Exception) else None
-    logger.info(f"重写后的问题: {query_list}")
-    
-    # 并行执行所有查询的知识库检索
-    retrieval_tasks = [
-        retrieve_from_kb(question=query,
-                        dataset_name=KB_DATASET_NAME,
-                        address=KB_ADDRESS,
-                        api_key=KB_API_KEY,
-                        similarity_threshold=0.01,
-                        vector_similarity_weight=KB_VECTOR_SIMILARITY_WEIGHT,
-                        top_k=KB_TOP_K*5,
-                        key_words=KB_KEY_WORDS)
-        for query in query_list
-    ]
-    
-    # 并行等待专家QA检索和知识库检索完成
-    expert_qa_memories, all_results_list = await asyncio.gather(
-        expert_qa_task,
-        asyncio.gather(*retrieval_tasks, return_exceptions=True),
-        return_exceptions=True
-    )
+    try:
+        # 专家QA短路：命中专家QA时最终一定采用专家QA作答，立即取消问题重写、知识库检索和重排
+        if EXPERT_QA_SHORT_CIRCUIT:
+            with metrics.timer("expert_qa_lookup_seconds"):
+                try:
+                    expert_qa_memories = await expert_qa_task
+                except Exception as e:
+                    logger.error(f"专家QA检索失败: {e}")
+                    expert_qa_memories = None
+            if expert_qa_memories:
+                _cancel(retrieval_task)
+                distance = expert_qa_memories[0].get("relevance_score", 1.0)
+                # 距离阈值只用于区分近乎原题（exact）和一般命中（near），不影响是否短路
+                metrics.inc("expert_qa_short_circuit", result="hit",
+                            match="exact" if distance <= EXPERT_QA_SHORT_CIRCUIT_SCORE else "near")
+                _record_turn("expert_qa_short_circuit", start)
+                logger.info(f"专家QA短路命中，距离: {distance}，跳过问题重写和知识库检索")
+                return _expert_qa_result(expert_qa_memories[0], [user_question])
+            metrics.inc("expert_qa_short_circuit", result="miss")
+        
+        # 并行等待专家QA检索和知识库检索完成
+        expert_qa_memories, retrieval = await asyncio.gather(
+            expert_qa_task,
+            retrieval_task,
+            return_exceptions=True
+        )
+    except asyncio.CancelledError:
+        # 检索被取消（如推测执行落空）时一并取消后台任务
+        _cancel(expert_qa_task)
+        _cancel(retrieval_task)
+        raise
+    if isinstance(retrieval, Exception):
+        logger.error(f"知识库检索失败: {retrieval}")
+        query_list, all_results_list = [user_question], []
+    else:
+        query_list, all_results_list = retrieval
     
     # 优先使用专家QA的结果
     if expert_qa_memories and not isinstance(expert_qa_memories, Exception) and len(expert_qa_memories) > 0:
         expert_qa = expert_qa_memories[0]
         logger.info(f"使用专家QA结果，分数: {expert_qa.get('score', 1.0)}")
-        return RetrievalResult(
-            source="expert_qa",
-            content=expert_qa["answer"],
-            score=expert_qa.get("score", 1.0),
-            images=expert_qa.get("images"),
-            query_list=query_list
-        )
-    
-    # 合并所有检索结果
-    all_results = []
-    for result_list in all_results_list:
-        if not isinstance(result_list, Exception):
-            all_results.extend(result_list)
-    
-    # 去重（基于文档内容）
-    seen_contents = set()
-    unique_results = []
-    for result in all_results:
-        if result['content'] not in seen_contents:
-            seen_contents.add(result['content'])
-            unique_results.append(result)
+        _record_turn("expert_qa", start)
+        return _expert_qa_result(expert_qa, query_list)
     
-    results = unique_results
+    # 多路检索结果融合：RRF + 近重复去除，只保留前 KB_FUSION_TOP_N 个候选送入重排
+    results = fuse_candidates(
+        [result_list for result_list in all_results_list if not isinstance(result_list, Exception)],
+        top_n=KB_FUSION_TOP_N,
+        rrf_k=KB_RRF_K,
+        max_distance=KB_NEAR_DUPLICATE_DISTANCE
+    )
     max_score = 0.0
     
     # 重排模型
-    if len(results) > 0 and RERANKER_MODEL and RERANKER_BASE_URL:
+    if len(results) > 0 and RERANK_ENABLED:
         results, max_score = await rerank_results(results, user_question, RERANKER_MODEL, RERANKER_BASE_URL, RERANKER_API_KEY, KB_TOP_K)
         # text = "\n\n".join(f"第{i+1}个与用户问题相关的文档内容如下：\n{doc['content']}" for i, doc in enumerate(results))
         text = "\n\n".join(f"{doc['content']}" for i, doc in enumerate(results))
         logger.info(f"知识库检索成功，最高分数: {max_score}")
+        _record_turn("knowledge_base", start)
         return RetrievalResult(
             source="knowledge_base",
             content=text,
@@ -126,6 +315,7 @@ async def airport_knowledge_query2docs_main(user_question:str,messages:List[AnyM
         text = "\n\n".join(f"{doc['content']}" for i, doc in enumerate(results))
         # text = "\n\n".join(f"第{i+1}个与用户问题相关的文档内容如下：\n{doc['content']}" for i, doc in enumerate(results))
         logger.info(f"知识库检索成功（未使用重排）")
+        _record_turn("knowledge_base", start)
         return RetrievalResult(
             source="knowledge_base",
             content=text,
@@ -136,6 +326,7 @@ async def airport_knowledge_query2docs_main(user_question:str,messages:List[AnyM
     
     # 没有找到任何结果
     logger.warning("未找到任何相关检索结果")
+    _record_turn("none", start)
     return RetrievalResult(
         source="none",
         content="抱歉，在知识库中没有找到与问题相关的信息。",
@@ -173,38 +364,19 @@ async def airport_knowledge_query2docs(user_question:str,messages:List[AnyMessag
     logger.info(f"重写后的问题: {query_list}")
     
     # 并行执行所有查询的检索
-    retrieval_tasks = [
-        retrieve_from_kb(question=query,
-                        dataset_name=KB_DATASET_NAME,
-                        address=KB_ADDRESS,
-                        api_key=KB_API_KEY,
-                        similarity_threshold=0.01,
-                        vector_similarity_weight=KB_VECTOR_SIMILARITY_WEIGHT,
-                        top_k=KB_TOP_K,
-                        key_words=KB_KEY_WORDS)
-        for query in query_list
-    ]
-    all_results_list = await asyncio.gather(*retrieval_tasks, return_exceptions=True)
-    
-    # 合并所有检索结果
-    all_results = []
-    for result_list in all_results_list:
-        if not isinstance(result_list, Exception):
-            all_results.extend(result_list)
+    all_results_list = await retrieve_kb(query_list, KB_TOP_K)
     
-    # 去重（基于文档内容）
-    seen_contents = set()
-    unique_results = []
-    for result in all_results:
-        if result['content'] not in seen_contents:
-            seen_contents.add(result['content'])
-            unique_results.append(result)
-    
-    results = unique_results
+    # 多路检索结果融合：RRF + 近重复去除，只保留前 KB_FUSION_TOP_N 个候选送入重排
+    results = fuse_candidates(
+        [result_list for result_list in all_results_list if not isinstance(result_list, Exception)],
+        top_n=KB_FUSION_TOP_N,
+        rrf_k=KB_RRF_K,
+        max_distance=KB_NEAR_DUPLICATE_DISTANCE
+    )
     max_score = 0.0
     
     # 重排模型
-    if len(results) > 0 and RERANKER_MODEL and RERANKER_BASE_URL:
+    if len(results) > 0 and RERANK_ENABLED:
         results, max_score = await rerank_results(results, query_list[1], RERANKER_MODEL, RERANKER_BASE_URL, RERANKER_API_KEY, KB_TOP_K)
         # text = "\n\n".join(f"第{i+1}个与用户问题相关的文档内容如下：\n{doc['content']}" for i, doc in enumerate(results))
         text = "\n\n".join(f"{doc['content']}" for i, doc in enumerate(results))
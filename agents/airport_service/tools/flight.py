@@ -2,7 +2,7 @@ import sys
 import os
 # 添加项目根目录到系统路径
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../../..")))
-from typing import List
+from typing import List, Optional
 from langchain_core.messages import AnyMessage
 import asyncio
 import json
@@ -40,7 +40,7 @@ async def get_text2sql_instance():
 
 
 
-async def flight_info_query2docs(question: str, messages:List[AnyMessage]) -> str:
+async def flight_info_query2docs(question: str, messages:List[AnyMessage], rewritten_query: Optional[str] = None) -> str:
     """
     查询航班信息的工具
     此工具用于回答用户关于航班的各类查询
@@ -48,6 +48,8 @@ async def flight_info_query2docs(question: str, messages:List[AnyMessage]) -> st
     Args:
         question: 用户提出的航班相关问题，应当是一个表达完整，意图明确的问句，例如"CA1234航班什么时候到达？"
                  "从北京到上海的航班有哪些？"或"明天的MU5678航班是什么机型？"等。如果问题不清晰，则需要用户继续澄清诉求。
+        messages: 历史消息列表
+        rewritten_query: 已改写的航班问题（合并问题理解时由路由节点给出），为空则调用LLM改写
     Examples:
         >>> flight_info_query("CA1234航班现在的状态是什么？")
         "CA1234航班目前正在飞行中，预计17:30到达目的地，暂无延误。"
@@ -67,7 +69,8 @@ async def flight_info_query2docs(question: str, messages:List[AnyMessage]) -> st
             return error_msg
 
     # 执行异步查询
-    rewritten_query = await comprehensive_query_transform(question,'flight_rewrite',messages)
+    if not rewritten_query:
+        rewritten_query = await comprehensive_query_transform(question,'flight_rewrite',messages)
     result = await perform_query(rewritten_query)
     logger.debug(f"查询结果: {result}")
     return RetrievalResult(
@@ -8,25 +8,16 @@ from common.logging import get_logger
 # 使用专门的商业推荐日志记录器
 logger = get_logger("api.business_recommend")
 router = APIRouter(prefix="/api/v1/business-recommend", tags=["商业推荐"])
-@router.post("/business", response_model=BusinessRecommendResponse)
-async def get_business_recommendations(request: BusinessRecommendRequest, http_request: Request):
+
+
+async def recommend_business(request: BusinessRecommendRequest, token: str = "") -> BusinessRecommendResponse:
     """
-    获取商业推荐（非流式接口）
-    
-    基于用户的当前问题和上下文，推荐相关的机场业务
+    商业推荐核心处理逻辑，供HTTP接口和WebSocket多路复用模式共用
+
+    Args:
+        request: 商业推荐请求
+        token: 认证token
     """
-    logger.info(f"收到商业推荐请求 - ThreadID: {request.thread_id}, UserID: {request.user_id}, Query: {request.query or 'None'}, HasImage: {bool(request.image)}")
-    
-    # 验证必要字段
-    if not request.thread_id or not request.user_id:
-        logger.error("商业推荐请求缺少必要字段")
-        raise HTTPException(status_code=400, detail="thread_id和user_id为必填字段")
-    
-    # query和image的验证已在模型层面完成，这里不需要额外验证
-    
-    # 获取请求头中的token
-    token = http_request.headers.get("token", "")
-    
     # 处理metadata，提取系统参数
     metadata = request.metadata or {}
     Is_translate = metadata.get("Is_translate", False)
@@ -108,4 +99,26 @@ async def get_business_recommendations(request: BusinessRecommendRequest, http_r
             ret_code="999999",
             ret_msg="商业推荐服务暂时不可用",
             item=error_item.dict()
-        )
\ No newline at end of file
+        )
+
+
+@router.post("/business", response_model=BusinessRecommendResponse)
+async def get_business_recommendations(request: BusinessRecommendRequest, http_request: Request):
+    """
+    获取商业推荐（非流式接口）
+    
+    基于用户的当前问题和上下文，推荐相关的机场业务
+    """
+    logger.info(f"收到商业推荐请求 - ThreadID: {request.thread_id}, UserID: {request.user_id}, Query: {request.query or 'None'}, HasImage: {bool(request.image)}")
+    
+    # 验证必要字段
+    if not request.thread_id or not request.user_id:
+        logger.error("商业推荐请求缺少必要字段")
+        raise HTTPException(status_code=400, detail="thread_id和user_id为必填字段")
+    
+    # query和image的验证已在模型层面完成，这里不需要额外验证
+    
+    # 获取请求头中的token
+    token = http_request.headers.get("token", "")
+    
+    return await recommend_business(request, token)
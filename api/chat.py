@@ -3,16 +3,33 @@ import asyncio
 import time
 import os
 import base64
+from contextlib import suppress
+from typing import AsyncIterator, Awaitable, Callable, Dict, Optional
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
+from pydantic import ValidationError
 from models.schemas import (
-    TextEventContent, RichContentEventContent, FormEventContent, FlightListEventContent, FlightInfo, EndEventContent, ErrorEventContent, ChatEvent
+    TextEventContent, RichContentEventContent, DataEventContent, FormEventContent, FlightListEventContent, FlightInfo, EndEventContent, ErrorEventContent, ChatEvent,
+    QuestionRecommendRequest, BusinessRecommendRequest
 )
+from config.factory import get_websocket_config
 from agents.airport_service import graph_manager
+from agents.airport_service.run_coordinator import RunCancelledError
+from agents.airport_service.admission import AdmissionRejectedError
 from common.logging import get_logger
+from common.metrics import metrics
+from .event_stream import ConnectionWriter, EventSender
+from .question_recommend import recommend_questions
+from .business_recommend import recommend_business
 
 # 使用专门的API聊天日志记录器
 logger = get_logger("api.chat")
 
+_websocket_config = get_websocket_config()
+WS_MUX_MAX_INFLIGHT = _websocket_config.get("mux_max_inflight", 4)
+WS_COALESCE_WINDOW_MS = _websocket_config.get("coalesce_window_ms", 30)
+WS_COALESCE_MAX_BYTES = _websocket_config.get("coalesce_max_bytes", 512)
+WS_SEND_QUEUE_MAX_BYTES = _websocket_config.get("send_queue_max_bytes", 1048576)
+
 class EventGenerator:
     """事件生成器，负责生成符合协议的事件流"""
     
@@ -32,6 +49,11 @@ class EventGenerator:
             return f"{event_type}-{timestamp}-{suffix}"
         return f"{event_type}-{timestamp}-{self._next_sequence()}"
     
+    def next_event_ids(self, event_type: str):
+        """分配事件ID和序号（与 create_*_event 一致），供模板编码的快速路径使用"""
+        event_id = self._generate_id(event_type)
+        return event_id, self._next_sequence()
+    
     def create_text_event(self, text: str, format_type: str = "plain") -> ChatEvent:
         """创建文本事件"""
         return ChatEvent(
@@ -123,6 +145,14 @@ class EventGenerator:
             content=ErrorEventContent(error_code=error_code, error_message=error_message)
         )
     
+    def create_data_event(self, data_type: str, data, data_summary: str = None) -> ChatEvent:
+        """创建数据事件"""
+        return ChatEvent(
+            id=self._generate_id("data"),
+            sequence=self._next_sequence(),
+            content=DataEventContent(data_type=data_type, data=data, data_summary=data_summary)
+        )
+    
     def create_flight_list_event(
         self,
         title: str,
@@ -142,15 +172,394 @@ class EventGenerator:
             )
         )
 
+class WebSocketReader:
+    """后台持续读取WebSocket消息，使流式输出期间也能立即发现客户端断开"""
+
+    def __init__(self, websocket: WebSocket):
+        self.websocket = websocket
+        self.inbox: asyncio.Queue = asyncio.Queue()
+        self.disconnected = asyncio.Event()
+        self._task = asyncio.create_task(self._read())
+
+    async def _read(self):
+        try:
+            while True:
+                message = await self.websocket.receive()
+                if message["type"] == "websocket.disconnect":
+                    break
+                text = message.get("text")
+                if text is None and message.get("bytes") is not None:
+                    text = message["bytes"].decode("utf-8", errors="replace")
+                if text is not None:
+                    self.inbox.put_nowait(text)
+        except Exception as e:
+            logger.info(f"WebSocket 读取结束: {e}")
+        finally:
+            self.disconnected.set()
+            self.inbox.put_nowait(None)
+
+    async def receive(self) -> Optional[str]:
+        """获取下一条客户端消息，连接断开时返回None"""
+        if self.disconnected.is_set() and self.inbox.empty():
+            return None
+        return await self.inbox.get()
+
+    async def close(self):
+        self._task.cancel()
+        with suppress(asyncio.CancelledError):
+            await self._task
+
+
+def make_connection_writer(websocket: WebSocket) -> ConnectionWriter:
+    """创建并启动连接的发送队列，积压超限时以 1013（稍后重试）关闭连接"""
+    writer = ConnectionWriter(
+        websocket.send_text,
+        max_bytes=WS_SEND_QUEUE_MAX_BYTES,
+        on_overflow=lambda: websocket.close(code=1013)
+    )
+    writer.start()
+    return writer
+
+
+def make_event_sender(writer: ConnectionWriter, request_id: Optional[str] = None) -> EventSender:
+    """
+    创建事件发送器
+
+    Args:
+        writer: 连接的发送队列
+        request_id: 多路复用模式下的请求ID，会附加到每个事件上
+    """
+    return EventSender(
+        writer,
+        request_id=request_id,
+        coalesce_window=WS_COALESCE_WINDOW_MS / 1000,
+        coalesce_max_bytes=WS_COALESCE_MAX_BYTES
+    )
+
+
+async def stream_until_disconnect(source: AsyncIterator, reader: WebSocketReader) -> AsyncIterator:
+    """
+    转发流式结果，客户端断开时立即取消仍在执行的图运行
+
+    取消会传递到正在执行的节点，中断其进行中的LLM、重排序等上游请求。
+    """
+    disconnect_wait = asyncio.create_task(reader.disconnected.wait())
+    next_item = None
+    try:
+        while True:
+            next_item = asyncio.ensure_future(source.__anext__())
+            done, _ = await asyncio.wait({next_item, disconnect_wait}, return_when=asyncio.FIRST_COMPLETED)
+            if next_item in done:
+                try:
+                    item = next_item.result()
+                except StopAsyncIteration:
+                    return
+                yield item
+                continue
+            next_item.cancel()
+            with suppress(asyncio.CancelledError, StopAsyncIteration, Exception):
+                await next_item
+            metrics.inc("chat_run_cancelled", reason="client_disconnected")
+            logger.info("客户端已断开，已取消进行中的图运行")
+            raise WebSocketDisconnect(code=1001)
+    finally:
+        disconnect_wait.cancel()
+        # 所在任务被取消（如多路复用模式下的 cancel 请求）时，同样中止图运行
+        if next_item is not None and not next_item.done():
+            next_item.cancel()
+            with suppress(asyncio.CancelledError, StopAsyncIteration, Exception):
+                await next_item
+        with suppress(Exception):
+            await source.aclose()
+
+
+async def process_chat_request(message_data: dict, send_event: EventSender, reader: WebSocketReader):
+    """
+    处理一次机场智能客服对话请求，将事件流通过 send_event 发送给客户端
+
+    Args:
+        message_data: 客户端请求
+        send_event: 事件发送器
+        reader: 连接读取器，用于在客户端断开时及时取消图运行
+    """
+    # 提取并验证必要字段
+    thread_id = message_data.get("thread_id")
+    user_id = message_data.get("user_id") 
+    query = message_data.get("query", "")
+    image_data = message_data.get("image", None)
+    metadata = message_data.get("metadata", {})
+    token = message_data.get("token", "")
+    Is_translate = metadata.get("Is_translate", False)
+    Is_emotion = metadata.get("Is_emotion", False)
+    
+    # 提取技术环境信息字段
+    query_source = metadata.get("query_source","小程序")
+    query_device = metadata.get("query_device","手机")
+    query_ip = metadata.get("query_ip","")
+    network_type = metadata.get("network_type","5g")
+    
+    # 构建技术环境metadata
+    technical_metadata = {}
+    technical_metadata["query_source"] = query_source
+    technical_metadata["query_device"] = query_device
+    technical_metadata["query_ip"] = query_ip
+    technical_metadata["network_type"] = network_type
+    
+    # 检查是否提供了query或image中的至少一项
+    if not thread_id or not user_id or (not query and not image_data):
+        logger.warning("❌ WebSocket 请求缺少必要字段")
+        event_gen = EventGenerator()
+        error_event = event_gen.create_error_event(
+            error_code="missing_fields",
+            error_message="必要字段缺失：thread_id, user_id, 以及query或image至少需要一项"
+        )
+        error_response = {
+            "event": "error",
+            "data": error_event.model_dump()
+        }
+        await send_event(error_response)
+        return
+    event_gen = EventGenerator()
+    try:
+        # 构建线程配置
+        threads = {
+            "configurable": {
+                "user_id": user_id,
+                "thread_id": thread_id,
+                "user_query": query,
+                # "image_url": image_url,  # 添加图片URL
+                "image_data": image_data,
+                "token": token,
+                "Is_translate": Is_translate,
+                "Is_emotion": Is_emotion,
+                "metadata": technical_metadata
+            }
+        }
+        if Is_translate:
+            msg_nodes = ["translate_output_node"]
+            custom_nodes = []
+        else:
+            msg_nodes = ["airport_assistant_node", "flight_assistant_node", "chitchat_node", "business_assistant_node","transfer_to_human"]           
+            custom_nodes = ["airport_info_search_node","flight_assistant_node","business_assistant_node"]
+        
+        # 发送开始事件（与原始接口保持一致）
+        start_response = {
+            "event": "start",
+            "thread_id": thread_id,
+            "user_id": user_id
+        }
+        await send_event(start_response)                
+        # 按请求开关选择去掉无效节点的特化图
+        graph_id = graph_manager.resolve_graph_id(
+            "airport_service_graph",
+            translate=Is_translate,
+            emotion=Is_emotion,
+            image=bool(image_data)
+        )
+        # 处理聊天消息并发送事件
+        result_count = 0
+        async for msg_type, node, result in stream_until_disconnect(graph_manager.process_chat_message_stream(
+            message=query,
+            thread_id=threads,
+            graph_id=graph_id,
+            msg_nodes=msg_nodes,
+            custom_nodes=custom_nodes,
+            # 特化图可能不含输入翻译节点，由输入直接写入本轮问题
+            extra_input={"user_query": query}
+        ), reader):
+            result_count += 1                    
+            # 根据节点类型创建不同类型的事件
+            if node=="business_assistant_node":
+                # 业务节点 - 解析表单结构
+                try:
+                    # 尝试解析JSON结构的表单数据
+                    form_data = json.loads(result)
+                    if form_data.get("type") == "form":
+                        # 如果有服务说明，先发送文本事件
+                        if form_data.get("info", {}).get("service_description"):
+                            text_event = event_gen.create_text_event(
+                                form_data["info"]["service_description"], "plain"
+                            )
+                            text_response = {
+                                "event": "text",
+                                "data": text_event.model_dump()
+                            }
+                            await send_event(text_response)
+                            await asyncio.sleep(0.01)
+                        
+                        # 生成表单事件
+                        form_event = event_gen.create_form_event(
+                            form_id=f"business-{int(time.time())}",
+                            title=form_data.get("title", "业务办理"),
+                            description=form_data.get("description", ""),
+                            action=form_data.get("action", "/api/v1/forms/submit"),
+                            fields=form_data.get("fields", []),
+                            buttons=form_data.get("buttons", [])
+                        )
+                        
+                        # 发送表单事件
+                        form_response = {
+                            "event": "form",
+                            "data": form_event.model_dump()
+                        }
+                        await send_event(form_response)
+                        logger.info("✅ WebSocket 发送了表单事件")
+                        continue  # 跳过后面的文本事件发送
+                    else:
+                        # 不是表单结构，按普通文本处理
+                        text_event = event_gen.create_text_event(result)
+                except json.JSONDecodeError:
+                    # JSON解析失败，按普通文本处理
+                    text_event = event_gen.create_text_event(result)
+            
+            elif msg_type=="custom" and node=="flight_assistant_node":
+                # 处理航班信息
+                try:
+                    flight_list_event = event_gen.create_flight_list_event(
+                        title=result.get("title", "相关航班号信息"),
+                        flights=result.get("data", []),
+                        action_hint=result.get("action_hint")
+                    )
+                    flight_list_response = {
+                        "event": "flight_list",
+                        "data": flight_list_event.model_dump()
+                    }
+                    await send_event(flight_list_response)
+                    logger.info("✅ WebSocket 发送了航班列表事件")
+                    continue  # 跳过后面的文本事件发送
+
+                except json.JSONDecodeError:
+                    # JSON解析失败，按普通文本处理
+                    text_event = event_gen.create_text_event(result)
+            elif msg_type=="custom" and node=="airport_info_search_node":
+                # 处理机场知识                        
+                # 尝试解析 qa 事件的 JSON 数据
+                try:
+                    # 专家QA与语义缓存命中的答案均直接输出
+                    if result.get('type') in ('expert_qa', 'cached_answer') and 'answer' in result:
+                        logger.info(f"1111111result: {result}")
+                        answer = result.get('answer', '')
+                        images = result.get('images', '')
+                       
+                        # 如果有图片数据，创建富文本事件
+                        if images:
+                            rich_event = event_gen.create_rich_content_event(
+                                text=answer,
+                                images=images,
+                                format_type="plain",
+                                layout="text_first"
+                            )
+                            
+                            rich_response = {
+                                "event": "rich_content",
+                                "data": rich_event.model_dump()
+                            }
+                            await send_event(rich_response)
+                            logger.info("✅ WebSocket 发送了富文本内容事件")
+                            continue  # 跳过后面的文本事件发送
+                        else:
+                            # 只有文本，创建普通文本事件
+                            text_event = event_gen.create_text_event(answer)
+                    else:
+                        # 不是qa结构或缺少answer，按普通文本处理
+                        text_event = event_gen.create_text_event(result)
+                except json.JSONDecodeError:
+                    # JSON解析失败，按普通文本处理
+                    text_event = event_gen.create_text_event(result)
+            elif node=="transfer_to_human":
+                text_event = event_gen.create_text_event(result)
+                text_response = {
+                    "event": "transfer_to_human",
+                    "data": text_event.model_dump()
+                }
+                await send_event(text_response)
+                logger.info("✅ WebSocket 发送了转人工事件")
+                continue
+            else:
+                # 其他节点 - LLM流式token，走模板编码并按窗口合并发送
+                await send_event.send_text(event_gen, result)
+                continue
+            
+            # 发送文本事件
+            text_response = {
+                "event": "text",
+                "data": text_event.model_dump()
+            }
+            await send_event(text_response)
+            # await asyncio.sleep(0.01)  # 控制流式输出速度
+                         
+        # 发送结束事件
+        end_event = event_gen.create_end_event(
+            suggestions=["查询行李规定", "值机办理", "航班动态"],
+            metadata={"processing_time": "1.2s", "results_count": result_count}
+        )
+        end_response = {
+            "event": "end",
+            "data": end_event.model_dump()
+        }
+        await send_event(end_response)
+        logger.info("✅ WebSocket 发送了结束事件")
+        
+    except WebSocketDisconnect:
+        raise
+
+    except RunCancelledError as e:
+        # 同一会话的新消息取代了本次运行，或排队超时
+        logger.info(f"机场 WebSocket 本轮运行已取消: {e.reason}")
+        error_event = event_gen.create_error_event(
+            error_code=e.reason,
+            error_message="本条消息已被新的消息取代" if e.reason == "superseded" else "当前会话繁忙，请稍后再试"
+        )
+        error_response = {
+            "event": "error",
+            "data": error_event.model_dump()
+        }
+        await send_event(error_response)
+
+    except AdmissionRejectedError as e:
+        # 系统过载，快速失败而不是排队到超时
+        logger.info(f"机场 WebSocket 请求未被准入: {e.reason}")
+        error_event = event_gen.create_error_event(
+            error_code="service_unavailable",
+            error_message="当前咨询人数较多，请稍后再试"
+        )
+        error_response = {
+            "event": "error",
+            "data": error_event.model_dump()
+        }
+        await send_event(error_response)
+
+    except Exception as e:
+        logger.error(f"机场 WebSocket 聊天处理异常: {str(e)}", exc_info=True)
+        
+        # 发送错误事件
+        error_event = event_gen.create_error_event(
+            error_code="service_unavailable",
+            error_message="服务暂时不可用，请稍后再试"
+        )
+        error_response = {
+            "event": "error",
+            "data": error_event.model_dump()
+        }
+        await send_event(error_response)
+
+
 # 新增机场聊天接口路由
 airport_router = APIRouter(prefix="/api/v1/airport-assistant", tags=["机场智能助手"])
 @airport_router.websocket("/chat/ws")
 async def airport_chat_websocket(websocket: WebSocket):
     await websocket.accept()    
+    reader = WebSocketReader(websocket)
+    writer = make_connection_writer(websocket)
+    send_event = make_event_sender(writer)
+    metrics.add_gauge("ws_active_connections", 1)
     try:
         while True:
+            raw_message = await reader.receive()
+            if raw_message is None:
+                raise WebSocketDisconnect(code=1000)
             try:
-                message_data = await websocket.receive_json()
+                message_data = json.loads(raw_message)
             except json.JSONDecodeError as e:
                 logger.error(f"❌ WebSocket JSON解析失败: {e}")
                 error_response = {
@@ -164,235 +573,162 @@ async def airport_chat_websocket(websocket: WebSocket):
                         }
                     }
                 }
-                await websocket.send_text(json.dumps(error_response, ensure_ascii=False))
+                await send_event(error_response)
                 continue
             
-            # 提取并验证必要字段
-            thread_id = message_data.get("thread_id")
-            user_id = message_data.get("user_id") 
-            query = message_data.get("query", "")
-            image_data = message_data.get("image", None)
-            metadata = message_data.get("metadata", {})
-            token = message_data.get("token", "")
-            Is_translate = metadata.get("Is_translate", False)
-            Is_emotion = metadata.get("Is_emotion", False)
-            
-            # 提取技术环境信息字段
-            query_source = metadata.get("query_source","小程序")
-            query_device = metadata.get("query_device","手机")
-            query_ip = metadata.get("query_ip","")
-            network_type = metadata.get("network_type","5g")
-            
-            # 构建技术环境metadata
-            technical_metadata = {}
-            technical_metadata["query_source"] = query_source
-            technical_metadata["query_device"] = query_device
-            technical_metadata["query_ip"] = query_ip
-            technical_metadata["network_type"] = network_type
-            
-            # 检查是否提供了query或image中的至少一项
-            if not thread_id or not user_id or (not query and not image_data):
-                logger.warning("❌ WebSocket 请求缺少必要字段")
-                event_gen = EventGenerator()
-                error_event = event_gen.create_error_event(
-                    error_code="missing_fields",
-                    error_message="必要字段缺失：thread_id, user_id, 以及query或image至少需要一项"
-                )
-                error_response = {
-                    "event": "error",
-                    "data": error_event.model_dump()
-                }
-                await websocket.send_text(json.dumps(error_response, ensure_ascii=False))
-                continue
-            event_gen = EventGenerator()
-            try:
-                # 构建线程配置
-                threads = {
-                    "configurable": {
-                        "user_id": user_id,
-                        "thread_id": thread_id,
-                        "user_query": query,
-                        # "image_url": image_url,  # 添加图片URL
-                        "image_data": image_data,
-                        "token": token,
-                        "Is_translate": Is_translate,
-                        "Is_emotion": Is_emotion,
-                        "metadata": technical_metadata
-                    }
-                }
-                if Is_translate:
-                    msg_nodes = ["translate_output_node"]
-                    custom_nodes = []
-                else:
-                    msg_nodes = ["airport_assistant_node", "flight_assistant_node", "chitchat_node", "business_assistant_node","transfer_to_human"]           
-                    custom_nodes = ["airport_info_search_node","flight_assistant_node","business_assistant_node"]
-                
-                # 发送开始事件（与原始接口保持一致）
-                start_response = {
-                    "event": "start",
-                    "thread_id": thread_id,
-                    "user_id": user_id
-                }
-                await websocket.send_text(json.dumps(start_response, ensure_ascii=False))                
-                # 处理聊天消息并发送事件
-                result_count = 0
-                async for msg_type, node, result in graph_manager.process_chat_message_stream(
-                    message=query,
-                    thread_id=threads,
-                    graph_id="airport_service_graph",
-                    msg_nodes=msg_nodes,
-                    custom_nodes=custom_nodes
-                ):
-                    result_count += 1                    
-                    # 根据节点类型创建不同类型的事件
-                    if node=="business_assistant_node":
-                        # 业务节点 - 解析表单结构
-                        try:
-                            # 尝试解析JSON结构的表单数据
-                            form_data = json.loads(result)
-                            if form_data.get("type") == "form":
-                                # 如果有服务说明，先发送文本事件
-                                if form_data.get("info", {}).get("service_description"):
-                                    text_event = event_gen.create_text_event(
-                                        form_data["info"]["service_description"], "plain"
-                                    )
-                                    text_response = {
-                                        "event": "text",
-                                        "data": text_event.model_dump()
-                                    }
-                                    await websocket.send_text(json.dumps(text_response, ensure_ascii=False))
-                                    await asyncio.sleep(0.01)
-                                
-                                # 生成表单事件
-                                form_event = event_gen.create_form_event(
-                                    form_id=f"business-{int(time.time())}",
-                                    title=form_data.get("title", "业务办理"),
-                                    description=form_data.get("description", ""),
-                                    action=form_data.get("action", "/api/v1/forms/submit"),
-                                    fields=form_data.get("fields", []),
-                                    buttons=form_data.get("buttons", [])
-                                )
-                                
-                                # 发送表单事件
-                                form_response = {
-                                    "event": "form",
-                                    "data": form_event.model_dump()
-                                }
-                                await websocket.send_text(json.dumps(form_response, ensure_ascii=False))
-                                logger.info("✅ WebSocket 发送了表单事件")
-                                continue  # 跳过后面的文本事件发送
-                            else:
-                                # 不是表单结构，按普通文本处理
-                                text_event = event_gen.create_text_event(result)
-                        except json.JSONDecodeError:
-                            # JSON解析失败，按普通文本处理
-                            text_event = event_gen.create_text_event(result)
-                    
-                    elif msg_type=="custom" and node=="flight_assistant_node":
-                        # 处理航班信息
-                        try:
-                            flight_list_event = event_gen.create_flight_list_event(
-                                title=result.get("title", "相关航班号信息"),
-                                flights=result.get("data", []),
-                                action_hint=result.get("action_hint")
-                            )
-                            flight_list_response = {
-                                "event": "flight_list",
-                                "data": flight_list_event.model_dump()
-                            }
-                            await websocket.send_text(json.dumps(flight_list_response, ensure_ascii=False))
-                            logger.info("✅ WebSocket 发送了航班列表事件")
-                            continue  # 跳过后面的文本事件发送
+            await process_chat_request(message_data, send_event, reader)
 
-                        except json.JSONDecodeError:
-                            # JSON解析失败，按普通文本处理
-                            text_event = event_gen.create_text_event(result)
-                    elif msg_type=="custom" and node=="airport_info_search_node":
-                        # 处理机场知识                        
-                        # 尝试解析 qa 事件的 JSON 数据
-                        try:
-                            if result.get('type') == 'expert_qa' and 'answer' in result:
-                                logger.info(f"1111111result: {result}")
-                                answer = result.get('answer', '')
-                                images = result.get('images', '')
-                               
-                                # 如果有图片数据，创建富文本事件
-                                if images:
-                                    rich_event = event_gen.create_rich_content_event(
-                                        text=answer,
-                                        images=images,
-                                        format_type="plain",
-                                        layout="text_first"
-                                    )
-                                    
-                                    rich_response = {
-                                        "event": "rich_content",
-                                        "data": rich_event.model_dump()
-                                    }
-                                    await websocket.send_text(json.dumps(rich_response, ensure_ascii=False))
-                                    logger.info("✅ WebSocket 发送了富文本内容事件")
-                                    continue  # 跳过后面的文本事件发送
-                                else:
-                                    # 只有文本，创建普通文本事件
-                                    text_event = event_gen.create_text_event(answer)
-                            else:
-                                # 不是qa结构或缺少answer，按普通文本处理
-                                text_event = event_gen.create_text_event(result)
-                        except json.JSONDecodeError:
-                            # JSON解析失败，按普通文本处理
-                            text_event = event_gen.create_text_event(result)
-                    elif node=="transfer_to_human":
-                        text_event = event_gen.create_text_event(result)
-                        text_response = {
-                            "event": "transfer_to_human",
-                            "data": text_event.model_dump()
-                        }
-                        await websocket.send_text(json.dumps(text_response, ensure_ascii=False))
-                        logger.info("✅ WebSocket 发送了转人工事件")
-                        continue
-                    else:
-                        # 其他节点 - 默认文本事件
-                        text_event = event_gen.create_text_event(result)
-                    
-                    # 发送文本事件
-                    text_response = {
-                        "event": "text",
-                        "data": text_event.model_dump()
-                    }
-                    await websocket.send_text(json.dumps(text_response, ensure_ascii=False))
-                    # await asyncio.sleep(0.01)  # 控制流式输出速度
-                                 
-                # 发送结束事件
-                end_event = event_gen.create_end_event(
-                    suggestions=["查询行李规定", "值机办理", "航班动态"],
-                    metadata={"processing_time": "1.2s", "results_count": result_count}
-                )
-                end_response = {
-                    "event": "end",
-                    "data": end_event.model_dump()
-                }
-                await websocket.send_text(json.dumps(end_response, ensure_ascii=False))
-                logger.info("✅ WebSocket 发送了结束事件")
-                
-            except Exception as e:
-                logger.error(f"机场 WebSocket 聊天处理异常: {str(e)}", exc_info=True)
-                
-                # 发送错误事件
-                error_event = event_gen.create_error_event(
-                    error_code="service_unavailable",
-                    error_message="服务暂时不可用，请稍后再试"
-                )
-                error_response = {
-                    "event": "error",
-                    "data": error_event.model_dump()
-                }
-                await websocket.send_text(json.dumps(error_response, ensure_ascii=False))
-                
     except WebSocketDisconnect:
         logger.info("机场智能客服 WebSocket 连接已断开")
+        metrics.inc("ws_disconnects")
     except Exception as e:
         logger.error(f"机场智能客服 WebSocket 连接异常: {str(e)}", exc_info=True)
         try:
             await websocket.close()
         except:
-            pass 
\ No newline at end of file
+            pass
+    finally:
+        metrics.add_gauge("ws_active_connections", -1)
+        await writer.close()
+        await reader.close() 
+
+
+
+def make_recommend_handler(request_model, recommend_func, data_type: str):
+    """把推荐接口包装为多路复用模式下的请求处理函数，结果以 data 事件返回"""
+    async def handler(message_data: dict, send_event: Callable[[dict], Awaitable], reader: WebSocketReader):
+        event_gen = EventGenerator()
+        try:
+            request = request_model(**message_data)
+        except ValidationError as e:
+            error_event = event_gen.create_error_event(error_code="missing_fields", error_message=str(e))
+            await send_event({"event": "error", "data": error_event.model_dump()})
+            return
+        # 与HTTP接口一致：thread_id 和 user_id 不能为空
+        if not request.thread_id or not request.user_id:
+            logger.warning(f"❌ {data_type} 请求缺少必要字段")
+            error_event = event_gen.create_error_event(error_code="missing_fields", error_message="thread_id和user_id为必填字段")
+            await send_event({"event": "error", "data": error_event.model_dump()})
+            return
+        response = await recommend_func(request, message_data.get("token", ""))
+        data_event = event_gen.create_data_event(data_type, response.item, data_summary=response.ret_msg)
+        await send_event({"event": "data", "data": data_event.model_dump()})
+        end_event = event_gen.create_end_event(metadata={"ret_code": response.ret_code})
+        await send_event({"event": "end", "data": end_event.model_dump()})
+    return handler
+
+
+# 多路复用模式下支持的请求类型
+MUX_HANDLERS = {
+    "chat": process_chat_request,
+    "question_recommend": make_recommend_handler(QuestionRecommendRequest, recommend_questions, "question_recommend"),
+    "business_recommend": make_recommend_handler(BusinessRecommendRequest, recommend_business, "business_recommend"),
+}
+
+
+def _error_response(error_code: str, error_message: str) -> dict:
+    error_event = EventGenerator().create_error_event(error_code=error_code, error_message=error_message)
+    return {"event": "error", "data": error_event.model_dump()}
+
+
+@airport_router.websocket("/chat/ws/mux")
+async def airport_chat_websocket_mux(websocket: WebSocket):
+    """
+    多路复用模式的机场智能客服WebSocket接口
+
+    客户端消息通过 type 区分：chat（默认）/ question_recommend / business_recommend / cancel / ping，
+    除 ping 外均需携带 request_id。同一连接上可同时进行多个请求，服务端事件均附带对应的 request_id，
+    cancel 会立即取消对应请求的图运行并返回 cancelled 事件。
+    """
+    await websocket.accept()
+    reader = WebSocketReader(websocket)
+    writer = make_connection_writer(websocket)
+    send_event = make_event_sender(writer)
+    inflight: Dict[str, asyncio.Task] = {}
+    metrics.add_gauge("ws_active_connections", 1)
+
+    async def run_request(request_id: str, handler, message_data: dict):
+        request_sender = make_event_sender(writer, request_id)
+        try:
+            await handler(message_data, request_sender, reader)
+        except asyncio.CancelledError:
+            if reader.disconnected.is_set():
+                raise
+            metrics.inc("chat_run_cancelled", reason="client_cancel")
+            logger.info(f"多路复用请求 {request_id} 已被客户端取消")
+            with suppress(Exception):
+                await request_sender({"event": "cancelled"})
+        except WebSocketDisconnect:
+            pass
+        except Exception as e:
+            logger.error(f"多路复用请求 {request_id} 处理异常: {str(e)}", exc_info=True)
+            with suppress(Exception):
+                await request_sender(_error_response("service_unavailable", "服务暂时不可用，请稍后再试"))
+
+    try:
+        while True:
+            raw_message = await reader.receive()
+            if raw_message is None:
+                raise WebSocketDisconnect(code=1000)
+            try:
+                message_data = json.loads(raw_message)
+                if not isinstance(message_data, dict):
+                    raise ValueError("请求必须是JSON对象")
+            except ValueError as e:
+                logger.error(f"❌ WebSocket JSON解析失败: {e}")
+                await send_event(_error_response("invalid_json", "请求格式错误，请发送有效的JSON数据"))
+                continue
+
+            message_type = message_data.get("type", "chat")
+            request_id = message_data.get("request_id")
+            if message_type == "ping":
+                # 客户端积压时只保留最新的 pong
+                await send_event({"event": "pong", "request_id": request_id, "timestamp": int(time.time() * 1000)}, supersede_key="pong")
+                continue
+            if not request_id:
+                await send_event(_error_response("missing_request_id", "多路复用模式下请求必须携带request_id"))
+                continue
+
+            request_sender = make_event_sender(writer, request_id)
+            if message_type == "cancel":
+                task = inflight.get(request_id)
+                if task is None:
+                    await request_sender(_error_response("unknown_request", "请求不存在或已结束"))
+                else:
+                    task.cancel()
+                continue
+
+            handler = MUX_HANDLERS.get(message_type)
+            if handler is None:
+                await request_sender(_error_response("unsupported_type", f"不支持的请求类型: {message_type}"))
+                continue
+            if request_id in inflight:
+                await request_sender(_error_response("duplicate_request_id", "该request_id的请求仍在处理中"))
+                continue
+            if len(inflight) >= WS_MUX_MAX_INFLIGHT:
+                await request_sender(_error_response("too_many_requests", "进行中的请求过多，请稍后再试"))
+                continue
+
+            task = asyncio.create_task(run_request(request_id, handler, message_data))
+            inflight[request_id] = task
+            task.add_done_callback(lambda _, rid=request_id: inflight.pop(rid, None))
+            metrics.inc("ws_mux_requests", type=message_type)
+
+    except WebSocketDisconnect:
+        logger.info("机场智能客服多路复用 WebSocket 连接已断开")
+        metrics.inc("ws_disconnects")
+    except Exception as e:
+        logger.error(f"机场智能客服多路复用 WebSocket 连接异常: {str(e)}", exc_info=True)
+        try:
+            await websocket.close()
+        except:
+            pass
+    finally:
+        tasks = list(inflight.values())
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+        metrics.add_gauge("ws_active_connections", -1)
+        await writer.close()
+        await reader.close()
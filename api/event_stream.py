@@ -0,0 +1,274 @@
+"""
+聊天事件流编码
+
+LLM每个token都会生成一个文本事件，逐个经过 pydantic 构建、model_dump、json.dumps 和
+send_text 时序列化开销占主导。这里提供：
+
+- 文本事件的模板编码：直接拼接JSON字符串，输出与 ChatEvent.model_dump() + json.dumps 等价
+- 其他事件的快速序列化：优先使用 orjson（可选依赖 fast-json），未安装时回退到标准库 json
+- token合并：按时间窗口或字节预算把连续的文本token合并为一帧发送，协议格式不变
+- 连接级发送队列：独立写任务发送，慢客户端不阻塞图运行，积压时合并/丢弃/断开
+"""
+import asyncio
+import json
+from collections import deque
+from contextlib import suppress
+from json.encoder import encode_basestring
+from typing import Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+
+from fastapi import WebSocketDisconnect
+
+from common.logging import get_logger
+from common.metrics import metrics
+
+try:
+    import orjson
+except ImportError:  # orjson 为可选依赖：uv sync --extra fast-json
+    orjson = None
+
+logger = get_logger("api.event_stream")
+
+
+def dumps_event(response: dict) -> str:
+    """序列化任意事件（非ASCII字符保持原样，与 ensure_ascii=False 一致）"""
+    if orjson is not None:
+        return orjson.dumps(response).decode("utf-8")
+    return json.dumps(response, ensure_ascii=False)
+
+
+def encode_text_event(event_id: str, sequence: int, text: str, format_type: str = "plain",
+                      request_id: Optional[str] = None) -> str:
+    """按模板编码文本事件，字段顺序与 ChatEvent 模型保持一致"""
+    suffix = f',"request_id":{encode_basestring(request_id)}' if request_id is not None else ""
+    return (
+        f'{{"event":"text","data":{{"id":{encode_basestring(event_id)},"sequence":{sequence},'
+        f'"content":{{"text":{encode_basestring(text)},"format":{encode_basestring(format_type)}}}}}{suffix}}}'
+    )
+
+
+class _Frame:
+    """发送队列中的一帧；文本帧保留原始token以便合并，发送时再编码"""
+
+    __slots__ = ("text", "parts", "size", "request_id", "event_id", "sequence", "supersede_key", "dropped")
+
+    def __init__(self, size: int, text: Optional[str] = None, parts: Optional[List[str]] = None,
+                 request_id: Optional[str] = None, event_id: str = "", sequence: int = 0,
+                 supersede_key: Optional[str] = None):
+        self.text = text
+        self.parts = parts
+        self.size = size
+        self.request_id = request_id
+        self.event_id = event_id
+        self.sequence = sequence
+        self.supersede_key = supersede_key
+        self.dropped = False
+
+    def encode(self) -> str:
+        if self.parts is None:
+            return self.text
+        return encode_text_event(self.event_id, self.sequence, "".join(self.parts), request_id=self.request_id)
+
+
+class ConnectionWriter:
+    """
+    连接级发送队列
+
+    事件先入队，由独立的写任务发送，慢客户端不会阻塞图运行。客户端跟不上时：
+    - 队尾尚未发送的同一请求的文本帧直接合并
+    - 带 supersede_key 的事件（如 pong）只保留最新一条
+    - 积压超过 max_bytes 时关闭连接，后续入队抛出 WebSocketDisconnect
+    """
+
+    def __init__(self, send_text: Callable[[str], Awaitable], max_bytes: int = 0,
+                 on_overflow: Optional[Callable[[], Awaitable]] = None):
+        """
+        Args:
+            send_text: 底层发送函数（websocket.send_text）
+            max_bytes: 队列积压的字节上限，0表示不限制
+            on_overflow: 积压超限时调用，用于关闭连接
+        """
+        self._send_text = send_text
+        self.max_bytes = max_bytes
+        self._on_overflow = on_overflow
+        self._queue: Deque[_Frame] = deque()
+        self._superseded: Dict[str, _Frame] = {}
+        self._pending_bytes = 0
+        self._wakeup = asyncio.Event()
+        self._closed = False
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    @property
+    def pending_bytes(self) -> int:
+        return self._pending_bytes
+
+    def put_text(self, request_id: Optional[str], event_id: str, sequence: int, text: str):
+        """文本帧入队，队尾同一请求的文本帧尚未发送时直接合并"""
+        self._check_open()
+        size = len(text.encode("utf-8"))
+        tail = self._queue[-1] if self._queue else None
+        if tail is not None and tail.parts is not None and not tail.dropped and tail.request_id == request_id:
+            tail.parts.append(text)
+            tail.size += size
+            metrics.inc("ws_send_merged")
+            self._account(size)
+            return
+        self._enqueue(_Frame(size, parts=[text], request_id=request_id, event_id=event_id, sequence=sequence))
+
+    def put_event(self, text: str, supersede_key: Optional[str] = None):
+        """已序列化的事件入队，supersede_key 相同的未发送事件会被丢弃"""
+        self._check_open()
+        frame = _Frame(len(text.encode("utf-8")), text=text, supersede_key=supersede_key)
+        if supersede_key is not None:
+            older = self._superseded.get(supersede_key)
+            if older is not None and not older.dropped:
+                older.dropped = True
+                self._account(-older.size)
+                metrics.inc("ws_send_superseded")
+            self._superseded[supersede_key] = frame
+        self._enqueue(frame)
+
+    def _check_open(self):
+        if self._closed:
+            raise WebSocketDisconnect(code=1006)
+
+    def _enqueue(self, frame: _Frame):
+        self._queue.append(frame)
+        self._account(frame.size)
+        self._wakeup.set()
+
+    def _account(self, delta: int):
+        self._pending_bytes += delta
+        metrics.add_gauge("ws_send_queue_bytes", delta)
+        if delta > 0 and self.max_bytes and self._pending_bytes > self.max_bytes:
+            metrics.inc("ws_send_overflow")
+            logger.warning(f"客户端接收过慢，发送队列积压 {self._pending_bytes} 字节，关闭连接")
+            self._shutdown()
+            if self._on_overflow is not None:
+                asyncio.create_task(self._close_connection())
+            raise WebSocketDisconnect(code=1013)
+
+    async def _close_connection(self):
+        try:
+            await self._on_overflow()
+        except Exception as e:
+            logger.warning(f"关闭积压连接失败: {e}")
+
+    async def _run(self):
+        try:
+            while True:
+                while not self._queue:
+                    self._wakeup.clear()
+                    await self._wakeup.wait()
+                metrics.observe("ws_send_queue_depth", len(self._queue))
+                frame = self._queue.popleft()
+                if frame.supersede_key is not None and self._superseded.get(frame.supersede_key) is frame:
+                    del self._superseded[frame.supersede_key]
+                if frame.dropped:
+                    continue
+                self._account(-frame.size)
+                await self._send_text(frame.encode())
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.info(f"发送失败，停止写任务: {e}")
+            self._shutdown()
+
+    def _shutdown(self):
+        self._closed = True
+        metrics.add_gauge("ws_send_queue_bytes", -self._pending_bytes)
+        self._pending_bytes = 0
+        self._queue.clear()
+        self._superseded.clear()
+        if self._task is not None and self._task is not asyncio.current_task():
+            self._task.cancel()
+
+    async def close(self):
+        """停止写任务并丢弃未发送的事件"""
+        if not self._closed:
+            self._shutdown()
+        if self._task is not None:
+            with suppress(asyncio.CancelledError):
+                await self._task
+
+
+class EventSender:
+    """
+    单个请求的事件发送器：负责序列化，并合并连续的文本token后交给连接发送队列
+
+    以 await sender(response) 发送普通事件（会先发出已缓冲的文本），
+    以 await sender.send_text(event_gen, text) 发送流式文本token。
+    """
+
+    def __init__(self, writer: ConnectionWriter, request_id: Optional[str] = None,
+                 coalesce_window: float = 0.0, coalesce_max_bytes: int = 0):
+        """
+        Args:
+            writer: 连接发送队列
+            request_id: 多路复用模式下附加到每个事件上的请求ID
+            coalesce_window: 文本合并的时间窗口（秒），0表示不合并
+            coalesce_max_bytes: 合并帧的字节上限，达到后立即发送
+        """
+        self._writer = writer
+        self.request_id = request_id
+        self.coalesce_window = coalesce_window
+        self.coalesce_max_bytes = coalesce_max_bytes
+        self._buffer: List[str] = []
+        self._buffer_bytes = 0
+        # 帧的事件ID和序号在缓冲第一个token时分配，保证序号与之后创建的事件保持先后顺序
+        self._buffer_ids: Optional[Tuple[str, int]] = None
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    async def __call__(self, response: dict, supersede_key: Optional[str] = None):
+        if self.request_id is not None:
+            response = {**response, "request_id": self.request_id}
+        self._flush_buffer()
+        self._writer.put_event(dumps_event(response), supersede_key)
+
+    async def send_text(self, event_gen, text: str, format_type: str = "plain"):
+        """发送流式文本token，开启合并时先缓冲"""
+        if self.coalesce_window <= 0 or format_type != "plain":
+            self._flush_buffer()
+            event_id, sequence = event_gen.next_event_ids("text")
+            if format_type == "plain":
+                self._writer.put_text(self.request_id, event_id, sequence, text)
+            else:
+                self._writer.put_event(encode_text_event(event_id, sequence, text, format_type, self.request_id))
+            return
+
+        if self._buffer_ids is None:
+            self._buffer_ids = event_gen.next_event_ids("text")
+        self._buffer.append(text)
+        self._buffer_bytes += len(text.encode("utf-8"))
+        if self.coalesce_max_bytes and self._buffer_bytes >= self.coalesce_max_bytes:
+            self._flush_buffer()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.coalesce_window, self._on_timer)
+
+    async def flush(self):
+        """立即发送已缓冲的文本"""
+        self._flush_buffer()
+
+    def _flush_buffer(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._buffer:
+            return
+        text = "".join(self._buffer)
+        event_id, sequence = self._buffer_ids
+        metrics.inc("chat_stream_tokens", len(self._buffer))
+        metrics.inc("chat_stream_frames")
+        self._buffer.clear()
+        self._buffer_bytes = 0
+        self._buffer_ids = None
+        self._writer.put_text(self.request_id, event_id, sequence, text)
+
+    def _on_timer(self):
+        self._timer = None
+        try:
+            self._flush_buffer()
+        except Exception as e:
+            logger.warning(f"定时发送缓冲文本失败: {e}")
@@ -0,0 +1,27 @@
+from fastapi import APIRouter
+
+from agents.airport_service import graph_manager
+from common.metrics import metrics
+from common.logging import get_logger
+
+logger = get_logger("api.metrics")
+
+router = APIRouter(prefix="/chat/v1", tags=["监控"])
+
+
+@router.get("/metrics")
+async def get_runtime_metrics():
+    """查看进程内运行时指标及Redis连接池状态"""
+    try:
+        redis_stats = await graph_manager.get_redis_stats()
+    except Exception as e:
+        logger.error(f"获取Redis状态失败: {e}")
+        redis_stats = {}
+    return {
+        "ret_code": "000000",
+        "ret_msg": "操作成功",
+        "item": {
+            **metrics.snapshot(),
+            "redis": redis_stats
+        }
+    }
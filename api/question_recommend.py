@@ -8,25 +8,16 @@ from common.logging import get_logger
 # 使用专门的问题推荐日志记录器
 logger = get_logger("api.question_recommend")
 router = APIRouter(prefix="/api/v1/question-recommend", tags=["问题推荐"])
-@router.post("/questions", response_model=QuestionRecommendResponse)
-async def get_question_recommendations(request: QuestionRecommendRequest, http_request: Request):
+
+
+async def recommend_questions(request: QuestionRecommendRequest, token: str = "") -> QuestionRecommendResponse:
     """
-    获取问题推荐（非流式接口）
-    
-    基于用户的当前问题和上下文，推荐相关的后续问题
+    问题推荐核心处理逻辑，供HTTP接口和WebSocket多路复用模式共用
+
+    Args:
+        request: 问题推荐请求
+        token: 认证token
     """
-    logger.info(f"收到问题推荐请求 - ThreadID: {request.thread_id}, UserID: {request.user_id}, Query: {request.query or 'None'}, HasImage: {bool(request.image)}")
-    
-    # 验证必要字段
-    if not request.thread_id or not request.user_id:
-        logger.error("问题推荐请求缺少必要字段")
-        raise HTTPException(status_code=400, detail="thread_id和user_id为必填字段")
-    
-    # query和image的验证已在模型层面完成，这里不需要额外验证
-    
-    # 获取请求头中的token
-    token = http_request.headers.get("token", "")
-    
     # 处理metadata，提取系统参数
     metadata = request.metadata or {}
     Is_translate = metadata.get("Is_translate", False)
@@ -109,4 +100,26 @@ async def get_question_recommendations(request: QuestionRecommendRequest, http_r
             ret_code="999999",
             ret_msg="问题推荐服务暂时不可用",
             item=error_item.model_dump()
-        )
\ No newline at end of file
+        )
+
+
+@router.post("/questions", response_model=QuestionRecommendResponse)
+async def get_question_recommendations(request: QuestionRecommendRequest, http_request: Request):
+    """
+    获取问题推荐（非流式接口）
+    
+    基于用户的当前问题和上下文，推荐相关的后续问题
+    """
+    logger.info(f"收到问题推荐请求 - ThreadID: {request.thread_id}, UserID: {request.user_id}, Query: {request.query or 'None'}, HasImage: {bool(request.image)}")
+    
+    # 验证必要字段
+    if not request.thread_id or not request.user_id:
+        logger.error("问题推荐请求缺少必要字段")
+        raise HTTPException(status_code=400, detail="thread_id和user_id为必填字段")
+    
+    # query和image的验证已在模型层面完成，这里不需要额外验证
+    
+    # 获取请求头中的token
+    token = http_request.headers.get("token", "")
+    
+    return await recommend_questions(request, token)
@@ -7,6 +7,7 @@ from .question_recommend import router as question_recommend_router
 from .business_recommend import router as business_recommend_router
 from .memory_management import router as memory_management_router
 from .text2qa import router as text2qa_router
+from .metrics import router as metrics_router
 
 api_router = APIRouter()
 api_router.include_router(airport_router)
@@ -16,4 +17,5 @@ api_router.include_router(image_router)
 api_router.include_router(question_recommend_router)
 api_router.include_router(business_recommend_router)
 api_router.include_router(memory_management_router)
-api_router.include_router(text2qa_router)
\ No newline at end of file
+api_router.include_router(text2qa_router)
+api_router.include_router(metrics_router)
\ No newline at end of file
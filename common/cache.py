@@ -0,0 +1,154 @@
+"""
+异步结果缓存模块
+
+进程内 LRU + TTL 缓存，可选 Redis 作为跨副本的二级缓存；
+相同键的并发调用合并为一次（single-flight），后到的调用直接等待进行中的结果。
+"""
+
+import asyncio
+import json
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from .logging import get_logger
+from .metrics import metrics
+
+logger = get_logger("common.cache")
+
+
+class _Flight:
+    """一次进行中的计算及其等待者数量"""
+
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class AsyncResultCache:
+    """进程内 LRU + TTL 缓存，支持 single-flight 与可选的 Redis 二级缓存"""
+
+    def __init__(self, name: str, max_entries: int = 1024, ttl: float = 300, use_redis: bool = False):
+        """
+        Args:
+            name: 缓存名称，用作指标标签和Redis键前缀
+            max_entries: 进程内缓存的条目上限，0表示不缓存（仅合并并发调用）
+            ttl: 缓存有效期（秒）
+            use_redis: 是否使用Redis二级缓存（需调用 bind_redis 绑定客户端）
+        """
+        self.name = name
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.use_redis = use_redis
+        self._entries: "OrderedDict[str, Tuple[Any, float]]" = OrderedDict()
+        self._inflight: Dict[str, _Flight] = {}
+        self._redis = None
+
+    def bind_redis(self, redis_client):
+        """绑定共享Redis客户端"""
+        self._redis = redis_client
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get_local(self, key: str) -> Tuple[bool, Any]:
+        """读取进程内缓存，返回 (是否命中, 值)"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return False, None
+        value, expires = entry
+        if expires < time.monotonic():
+            del self._entries[key]
+            return False, None
+        self._entries.move_to_end(key)
+        return True, value
+
+    def set_local(self, key: str, value: Any):
+        if self.max_entries <= 0:
+            return
+        self._entries[key] = (value, time.monotonic() + self.ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, key: Optional[str] = None):
+        """删除单个键或清空进程内缓存"""
+        if key is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(key, None)
+
+    def _redis_key(self, key: str) -> str:
+        return f"cache:{self.name}:{key}"
+
+    async def _get_redis(self, key: str) -> Tuple[bool, Any]:
+        if not self.use_redis or self._redis is None:
+            return False, None
+        try:
+            raw = await self._redis.get(self._redis_key(key))
+        except Exception as e:
+            logger.warning(f"读取Redis缓存 {self.name} 失败: {e}")
+            return False, None
+        if raw is None:
+            return False, None
+        return True, json.loads(raw)
+
+    async def _set_redis(self, key: str, value: Any):
+        if not self.use_redis or self._redis is None:
+            return
+        try:
+            await self._redis.set(self._redis_key(key), json.dumps(value, ensure_ascii=False), ex=int(self.ttl))
+        except Exception as e:
+            logger.warning(f"写入Redis缓存 {self.name} 失败: {e}")
+
+    async def get_or_compute(self, key: str, compute: Callable[[], Awaitable[Any]],
+                             cacheable: Optional[Callable[[Any], bool]] = None) -> Any:
+        """
+        读取缓存，未命中时执行 compute 并写入缓存
+
+        Args:
+            key: 缓存键
+            compute: 计算结果的协程函数
+            cacheable: 判断结果是否可缓存（如失败时的兜底值不缓存）
+        """
+        hit, value = self.get_local(key)
+        if hit:
+            metrics.inc("cache_lookup", cache=self.name, result="hit_local")
+            return value
+
+        flight = self._inflight.get(key)
+        if flight is None:
+            flight = _Flight(asyncio.create_task(self._compute(key, compute, cacheable)))
+            self._inflight[key] = flight
+            flight.task.add_done_callback(lambda _: self._inflight.pop(key, None) if self._inflight.get(key) is flight else None)
+        else:
+            metrics.inc("cache_lookup", cache=self.name, result="coalesced")
+
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task)
+        except asyncio.CancelledError:
+            # 最后一个等待者离开时才取消计算，其余调用方仍可取得结果
+            if flight.waiters == 1 and not flight.task.done():
+                flight.task.cancel()
+            raise
+        finally:
+            flight.waiters -= 1
+
+    async def _compute(self, key: str, compute: Callable[[], Awaitable[Any]],
+                       cacheable: Optional[Callable[[Any], bool]]) -> Any:
+        hit, value = await self._get_redis(key)
+        if hit:
+            metrics.inc("cache_lookup", cache=self.name, result="hit_redis")
+            self.set_local(key, value)
+            return value
+
+        metrics.inc("cache_lookup", cache=self.name, result="miss")
+        with metrics.timer("cache_compute_seconds", cache=self.name):
+            value = await compute()
+        if cacheable is None or cacheable(value):
+            self.set_local(key, value)
+            await self._set_redis(key, value)
+        return value
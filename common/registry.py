@@ -0,0 +1,76 @@
+"""
+延迟初始化组件注册表
+
+模型客户端、抽取器、子图等组件在模块导入时只登记构建函数，首次使用时才构建；
+应用启动的 lifespan 阶段可以调用 warmup 统一预构建，避免首个请求承担构建耗时。
+"""
+
+import asyncio
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Optional
+
+from .logging import get_logger
+from .metrics import metrics
+
+logger = get_logger("common.registry")
+
+
+class LazyRegistry:
+    """按名称登记构建函数，首次 get 时构建并缓存实例（线程安全）"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._factories: Dict[str, Callable[[], Any]] = {}
+        self._instances: Dict[str, Any] = {}
+        self._build_seconds: Dict[str, float] = {}
+        # 构建函数内部可能再 get 其他组件，使用可重入锁
+        self._lock = threading.RLock()
+
+    def register(self, name: str, factory: Callable[[], Any]):
+        """登记构建函数；同名组件已登记时保留先登记的（多个模块可以登记同一个共享组件）"""
+        self._factories.setdefault(name, factory)
+
+    def is_built(self, name: str) -> bool:
+        return name in self._instances
+
+    def get(self, name: str) -> Any:
+        """获取组件实例，未构建时先构建"""
+        instance = self._instances.get(name)
+        if instance is not None:
+            return instance
+        with self._lock:
+            if name in self._instances:
+                return self._instances[name]
+            factory = self._factories.get(name)
+            if factory is None:
+                raise KeyError(f"组件未登记: {name}")
+            start = time.perf_counter()
+            instance = factory()
+            elapsed = time.perf_counter() - start
+            self._instances[name] = instance
+            self._build_seconds[name] = elapsed
+            metrics.observe("component_build_seconds", elapsed, component=name)
+            logger.debug(f"组件 {name} 构建完成，耗时 {elapsed * 1000:.1f}ms")
+            return instance
+
+    async def warmup(self, names: Optional[Iterable[str]] = None):
+        """在线程中预构建组件，单个组件失败只记录日志（首次使用时会重试）"""
+        names = list(names) if names is not None else list(self._factories)
+        start = time.perf_counter()
+        for name in names:
+            if self.is_built(name):
+                continue
+            try:
+                await asyncio.to_thread(self.get, name)
+            except Exception as e:
+                logger.warning(f"组件 {name} 预构建失败: {e}")
+        logger.info(f"{self.name} 预构建完成，共 {len(names)} 个组件，耗时 {(time.perf_counter() - start) * 1000:.0f}ms")
+
+    def stats(self) -> Dict[str, Optional[float]]:
+        """各组件的构建耗时（秒），未构建为None"""
+        return {name: self._build_seconds.get(name) for name in self._factories}
+
+
+# 应用级组件注册表
+component_registry = LazyRegistry("components")
@@ -15,7 +15,9 @@ CONFIG = {
         "version": "1.0.0",
         "cors_origins": ["*"],
         "host": "0.0.0.0",
-        "port": 8081
+        "port": 8081,
+        # 启动时预构建模型客户端、抽取器等组件（false则全部在首次使用时构建）
+        "warmup": os.environ.get("APP_WARMUP", "true").lower() == "true"
     },
     # 日志配置
     "logging": {
@@ -29,6 +31,17 @@ CONFIG = {
         "data": os.environ.get("DATA_DIR", "data"),
         "logs": os.environ.get("LOG_DIR", "logs")
     },
+    # WebSocket 聊天配置
+    "websocket": {
+        # 多路复用模式下单个连接同时进行中的请求上限
+        "mux_max_inflight": int(os.environ.get("WS_MUX_MAX_INFLIGHT", "4")),
+        # 文本token合并的时间窗口（毫秒），0表示逐token发送
+        "coalesce_window_ms": int(os.environ.get("WS_COALESCE_WINDOW_MS", "30")),
+        # 单帧合并文本的字节上限，达到后立即发送
+        "coalesce_max_bytes": int(os.environ.get("WS_COALESCE_MAX_BYTES", "512")),
+        # 单个连接发送队列的积压上限（字节），超过后断开慢客户端，0表示不限制
+        "send_queue_max_bytes": int(os.environ.get("WS_SEND_QUEUE_MAX_BYTES", "1048576"))
+    },
     # 图配置
     "graph": {
         "name": "airport_service_graph"
@@ -68,6 +68,22 @@ class ConfigFactory:
             "logs": "logs"
         })
     
+    @staticmethod
+    def create_websocket_config() -> Dict[str, Any]:
+        """
+        创建WebSocket聊天配置
+        
+        Returns:
+            WebSocket配置字典
+        """
+        base_config = load_config()
+        return base_config.get("websocket", {
+            "mux_max_inflight": 4,
+            "coalesce_window_ms": 30,
+            "coalesce_max_bytes": 512,
+            "send_queue_max_bytes": 1048576
+        })
+    
     @staticmethod
     def create_graph_config() -> Dict[str, Any]:
         """
@@ -98,6 +114,11 @@ def get_directories_config() -> Dict[str, Any]:
     return ConfigFactory.create_directories_config()
 
 
+def get_websocket_config() -> Dict[str, Any]:
+    """获取WebSocket聊天配置的便捷函数"""
+    return ConfigFactory.create_websocket_config()
+
+
 def get_graph_config() -> Dict[str, Any]:
     """获取图配置的便捷函数"""
     return ConfigFactory.create_graph_config()
@@ -11,6 +11,12 @@ AGENTS_CONFIG = {
         "enable_thinking": os.getenv("LLM_ENABLE_THINKING"),
         "temperature": os.getenv("LLM_TEMPERATURE"),
         "max_history_turns": int(os.getenv("LLM_MAX_HISTORY_TURNS", "10")),
+        # 历史轮次超过 max_history_turns + 该值时，将较早的轮次折叠进滚动摘要；0 表示不压缩
+        "history_compaction_batch": int(os.getenv("LLM_HISTORY_COMPACTION_BATCH", "5")),
+        # 查询变换（重写/回退/航班重写）结果缓存：条目上限（0表示仅合并并发调用）、有效期（秒）、是否使用Redis二级缓存
+        "query_transform_cache_size": int(os.getenv("LLM_QUERY_TRANSFORM_CACHE_SIZE", "1024")),
+        "query_transform_cache_ttl": float(os.getenv("LLM_QUERY_TRANSFORM_CACHE_TTL", "300")),
+        "query_transform_cache_redis": os.getenv("LLM_QUERY_TRANSFORM_CACHE_REDIS", "false").lower() == "true",
         "max_tokens": int(os.getenv("LLM_MAX_TOKENS", "1000")),
         "router_base_url": os.getenv("ROUTER_LLM_BASE_URL",os.getenv("LLM_BASE_URL")),
         "router_api_key": os.getenv("ROUTER_LLM_API_KEY",os.getenv("LLM_API_KEY")),
@@ -36,6 +42,14 @@ AGENTS_CONFIG = {
         
         # 连接池优化配置
         "max_connections": int(os.getenv("REDIS_MAX_CONNECTIONS", "50")),  # 增加到50  
+        "pool_timeout": float(os.getenv("REDIS_POOL_TIMEOUT", "5")),  # 连接池耗尽时的等待秒数
+        # 启动时预编译所有图并共享连接池；关闭则每次请求重新建连编译
+        "compile_once": os.getenv("REDIS_COMPILE_ONCE", "true").lower() == "true",
+        # 增量checkpoint：只写入新增消息和变化的通道，每N次增量压缩为一次完整快照
+        "delta_checkpoint": os.getenv("REDIS_DELTA_CHECKPOINT", "false").lower() == "true",
+        "delta_compaction_interval": int(os.getenv("REDIS_DELTA_COMPACTION_INTERVAL", "20")),
+        # checkpoint写入时机：per_node（每个节点同步写入）/ end_of_turn（本轮结束时写一次）/ async（每个节点异步写入，默认）
+        "durability": os.getenv("REDIS_CHECKPOINT_DURABILITY", "async"),
         # TTL 过期时间配置（秒）
         "checkpoint_ttl": int(os.getenv("REDIS_CHECKPOINT_TTL", "7200")),  # checkpoint过期时间，默认2小时
         "store_ttl": int(os.getenv("REDIS_STORE_TTL", "86400")),          # store过期时间，默认24小时
@@ -43,7 +57,56 @@ AGENTS_CONFIG = {
         
         # 注意：TTL清理由LangGraph内置管理，无需额外配置
     },
+    "graph": {
+        # 合并问题理解：一次结构化调用同时完成意图识别、问题重写、回退问题和航班问题改写
+        "fused_query_understanding": os.getenv("GRAPH_FUSED_QUERY_UNDERSTANDING", "false").lower() == "true",
+        # 本地意图分类：规则 + 历史路由样本kNN，把握不足时才调用路由LLM
+        "intent_classifier": os.getenv("GRAPH_INTENT_CLASSIFIER", "false").lower() == "true",
+        "intent_classifier_threshold": float(os.getenv("GRAPH_INTENT_CLASSIFIER_THRESHOLD", "0.8")),
+        "intent_classifier_min_similarity": float(os.getenv("GRAPH_INTENT_CLASSIFIER_MIN_SIMILARITY", "0.85")),
+        "intent_classifier_k": int(os.getenv("GRAPH_INTENT_CLASSIFIER_K", "7")),
+        "intent_classifier_max_examples": int(os.getenv("GRAPH_INTENT_CLASSIFIER_MAX_EXAMPLES", "5000")),
+        "intent_classifier_refresh_interval": float(os.getenv("GRAPH_INTENT_CLASSIFIER_REFRESH_INTERVAL", "3600")),
+        # 推测执行：路由LLM与机场知识检索并行，路由结果不是 airport_info 时取消检索
+        "speculative_retrieval": os.getenv("GRAPH_SPECULATIVE_RETRIEVAL", "false").lower() == "true",
+        # 特化图：按翻译/情感识别/图片开关预编译去掉无效节点的图变体
+        "specialized_variants": os.getenv("GRAPH_SPECIALIZED_VARIANTS", "true").lower() == "true",
+        # 同一会话的并发运行：queue（排队）/ supersede（新消息取消旧运行）/ none（不协调）
+        "thread_run_policy": os.getenv("GRAPH_THREAD_RUN_POLICY", "queue"),
+        # 跨副本协调：通过Redis租约保证同一会话同时只有一个副本在运行，supersede 模式下通过发布/订阅即时通知旧运行取消
+        "thread_run_redis_lease": os.getenv("GRAPH_THREAD_RUN_REDIS_LEASE", "false").lower() == "true",
+        "thread_run_lease_ttl": float(os.getenv("GRAPH_THREAD_RUN_LEASE_TTL", "30")),
+        "thread_run_wait_timeout": float(os.getenv("GRAPH_THREAD_RUN_WAIT_TIMEOUT", "60")),
+        # 准入控制：全局并发运行上限（0表示不限制）、等待队列长度、排队期限（秒）、单用户并发上限
+        # 均为单进程内的限制，不跨副本共享，多副本部署时整体上限为各进程之和
+        "admission_max_concurrency": int(os.getenv("GRAPH_ADMISSION_MAX_CONCURRENCY", "0")),
+        "admission_queue_size": int(os.getenv("GRAPH_ADMISSION_QUEUE_SIZE", "100")),
+        "admission_queue_timeout": float(os.getenv("GRAPH_ADMISSION_QUEUE_TIMEOUT", "10")),
+        "admission_per_user_limit": int(os.getenv("GRAPH_ADMISSION_PER_USER_LIMIT", "2")),
+        # 机场知识语义答案缓存：相似度阈值、有效期（秒）、每种语言的条目上限、知识库变化检查间隔（秒）
+        "answer_cache": os.getenv("GRAPH_ANSWER_CACHE", "false").lower() == "true",
+        "answer_cache_threshold": float(os.getenv("GRAPH_ANSWER_CACHE_THRESHOLD", "0.95")),
+        "answer_cache_ttl": float(os.getenv("GRAPH_ANSWER_CACHE_TTL", "3600")),
+        "answer_cache_max_entries": int(os.getenv("GRAPH_ANSWER_CACHE_MAX_ENTRIES", "2000")),
+        "answer_cache_kb_check_interval": float(os.getenv("GRAPH_ANSWER_CACHE_KB_CHECK_INTERVAL", "60")),
+        # 专家QA：采用的最大向量距离；开启短路时命中专家QA即跳过问题重写、知识库检索和重排，
+        # 短路阈值只用于指标中区分近乎原题的命中（match=exact）与一般命中（match=near）
+        "expert_qa_score_limit": float(os.getenv("GRAPH_EXPERT_QA_SCORE_LIMIT", "0.2")),
+        "expert_qa_short_circuit": os.getenv("GRAPH_EXPERT_QA_SHORT_CIRCUIT", "true").lower() == "true",
+        "expert_qa_short_circuit_score": float(os.getenv("GRAPH_EXPERT_QA_SHORT_CIRCUIT_SCORE", "0.05")),
+    },
     "emotions":{
-        'model_path':os.getenv("EMOTION_MODEL","tabularisai/multilingual-sentiment-analysis")
+        'model_path':os.getenv("EMOTION_MODEL","tabularisai/multilingual-sentiment-analysis"),
+        # 推理后端：transformers / onnx（ONNX Runtime CPU推理，可配合int8量化模型）
+        'backend':os.getenv("EMOTION_BACKEND","transformers"),
+        'onnx_file':os.getenv("EMOTION_ONNX_FILE","model.onnx"),
+        'threads':int(os.getenv("EMOTION_THREADS","0")),
+        # 动态批处理：单批上限、凑批等待（毫秒）、等待队列长度、单请求超时（秒，超时按中性处理）
+        'max_batch_size':int(os.getenv("EMOTION_MAX_BATCH_SIZE","16")),
+        'max_wait_ms':float(os.getenv("EMOTION_MAX_WAIT_MS","5")),
+        'queue_size':int(os.getenv("EMOTION_QUEUE_SIZE","256")),
+        'timeout':float(os.getenv("EMOTION_TIMEOUT","2")),
+        # 启动时预加载情感模型；默认在首个需要情感识别的请求时加载，不使用情感识别的副本不会加载torch
+        'warmup':os.getenv("EMOTION_WARMUP","false").lower() == "true"
     }
 } 
\ No newline at end of file
@@ -23,7 +23,42 @@ TEXT2KB_CONFIG = {
     "kb_vector_similarity_weight": os.getenv("KB_VACTOR_SIMILARITY_WEIGHT"),
     "kb_topK": os.getenv("KB_TOPK"),
     "kb_key_words": os.getenv("KB_KEY_WORDS"),
+    "kb_timeout": float(os.getenv("KB_TIMEOUT", "10")),  # 单次请求总超时（秒）
+    "kb_connect_timeout": float(os.getenv("KB_CONNECT_TIMEOUT", "3")),
+    "kb_pool_size": int(os.getenv("KB_POOL_SIZE", "100")),  # 连接池总连接数上限
+    "kb_pool_size_per_host": int(os.getenv("KB_POOL_SIZE_PER_HOST", "20")),
+    "kb_keepalive_timeout": float(os.getenv("KB_KEEPALIVE_TIMEOUT", "30")),  # 空闲连接保持时间（秒）
+    "kb_dataset_id_ttl": float(os.getenv("KB_DATASET_ID_TTL", "300")),  # 数据集ID缓存有效期（秒）
+    # 检索后端：ragflow（远程检索）/ local（进程内 BM25 + 向量副本，未就绪时回退到 ragflow）
+    "kb_retrieval_backend": os.getenv("KB_RETRIEVAL_BACKEND", "ragflow"),
+    "kb_local_sync_interval": float(os.getenv("KB_LOCAL_SYNC_INTERVAL", "600")),  # 副本同步间隔（秒）
+    "kb_local_snapshot_dir": os.getenv("KB_LOCAL_SNAPSHOT_DIR", "data/kb_replica"),  # 副本快照目录，留空不保存
+    "kb_local_embed_batch_size": int(os.getenv("KB_LOCAL_EMBED_BATCH_SIZE", "32")),
+    # 多路检索结果融合：RRF 平滑常数、送入重排的候选数（0不限制）、近重复判定的 SimHash 海明距离（-1不去重）
+    "kb_rrf_k": int(os.getenv("KB_RRF_K", "60")),
+    "kb_fusion_top_n": int(os.getenv("KB_FUSION_TOP_N", "15")),
+    "kb_near_duplicate_distance": int(os.getenv("KB_NEAR_DUPLICATE_DISTANCE", "10")),
+    # 自适应多路检索：先只检索原问题，最高相似度和与第二名的差距都达到阈值时不再检索重写/回退/分解问题
+    # 相似度为向量余弦相似度（vector_similarity，RAGFlow 与本地副本一致），默认值按 RAGFlow 检索结果调得
+    "kb_adaptive_retrieval": os.getenv("KB_ADAPTIVE_RETRIEVAL", "false").lower() == "true",
+    "kb_adaptive_min_score": float(os.getenv("KB_ADAPTIVE_MIN_SCORE", "0.7")),
+    "kb_adaptive_min_margin": float(os.getenv("KB_ADAPTIVE_MIN_MARGIN", "0.05")),
+    "kb_adaptive_decompose": os.getenv("KB_ADAPTIVE_DECOMPOSE", "true").lower() == "true",  # 仍不足时是否再做组件分解
     "reranker_model": os.getenv("RERANKER_MODEL"),
     "reranker_base_url": os.getenv("RERANKER_BASE_URL",reranker_add),
-    "reranker_api_key": os.getenv("RERANKER_API_KEY",os.getenv("LLM_API_KEY"))
+    "reranker_api_key": os.getenv("RERANKER_API_KEY",os.getenv("LLM_API_KEY")),
+    "reranker_timeout": float(os.getenv("RERANKER_TIMEOUT", "10")),  # 单次重排请求超时（秒）
+    "reranker_cache_size": int(os.getenv("RERANKER_CACHE_SIZE", "4096")),  # (问题, 分块) 分数缓存条数，0不缓存
+    "reranker_cache_ttl": float(os.getenv("RERANKER_CACHE_TTL", "3600")),  # 分数缓存有效期（秒）
+    "reranker_batch_window_ms": float(os.getenv("RERANKER_BATCH_WINDOW_MS", "5")),  # 合并同一问题并发重排的窗口（毫秒）
+    "reranker_max_batch_documents": int(os.getenv("RERANKER_MAX_BATCH_DOCUMENTS", "64")),  # 单次上游请求的分块数上限
+    # 重排后端：http（重排接口）/ onnx（本地CPU交叉编码器）
+    "reranker_backend": os.getenv("RERANKER_BACKEND", "http"),
+    "reranker_onnx_model_path": os.getenv("RERANKER_ONNX_MODEL_PATH"),  # 含onnx文件和tokenizer的模型目录
+    "reranker_onnx_file": os.getenv("RERANKER_ONNX_FILE", "model.onnx"),
+    "reranker_onnx_threads": int(os.getenv("RERANKER_ONNX_THREADS", "1")),  # 每个推理线程的算子内线程数
+    "reranker_onnx_workers": int(os.getenv("RERANKER_ONNX_WORKERS", "0")),  # 推理线程数，0为CPU核数
+    "reranker_onnx_max_batch_size": int(os.getenv("RERANKER_ONNX_MAX_BATCH_SIZE", "16")),  # 单批 (问题, 分块) 对数
+    "reranker_onnx_max_wait_ms": float(os.getenv("RERANKER_ONNX_MAX_WAIT_MS", "2")),  # 凑批最长等待（毫秒）
+    "reranker_max_length": int(os.getenv("RERANKER_MAX_LENGTH", "512")),  # 问题+分块的最大token数
 }
\ No newline at end of file
@@ -7,8 +7,14 @@ from contextlib import asynccontextmanager
 import warnings
 
 from agents.airport_service import graph_manager, build_airport_service_graph,build_question_recommend_graph,build_business_recommend_graph
+from agents.airport_service.graph_compile import startup_redis, shutdown_redis
 from agents.airport_service.context_engineering.scheduler import start_memory_scheduler, stop_memory_scheduler
 from agents.airport_service.context_engineering.memory_manager import memory_manager
+from agents.airport_service.core.emotion_classifier import emotion_classifier, EMOTION_WARMUP
+from agents.airport_service.core.query.rerank import close_rerank_services
+from common.registry import component_registry
+from text2kb import close_kb_clients
+from agents.airport_service.tools.airport import kb_replica, KB_RETRIEVAL_BACKEND
 from common.logging import setup_logger, get_logger
 from config.factory import get_logger_config, get_app_config, get_directories_config
 from api.router import api_router  # 导入API路由器
@@ -35,7 +41,7 @@ async def lifespan(app: FastAPI):
     # 注册自定义图
     try:
         logger.info("开始注册图...")
-        graph_manager.register_graph("airport_service_graph", build_airport_service_graph())
+        graph_manager.register_graph_variants("airport_service_graph", build_airport_service_graph, ["translate", "emotion", "image"])
         logger.info("成功注册 airport_service_graph")
         
         graph_manager.register_graph("question_recommend_graph", build_question_recommend_graph())
@@ -49,6 +55,23 @@ async def lifespan(app: FastAPI):
         logger.error(f"图注册失败：{e}", exc_info=True)
         raise
     
+    # 预编译图并建立共享Redis连接池
+    try:
+        await startup_redis()
+        logger.info(f"图管理器启动完成：{await graph_manager.get_redis_stats()}")
+    except Exception as e:
+        logger.error(f"图管理器启动失败：{e}", exc_info=True)
+        raise
+    
+    # 预构建模型客户端、抽取器等组件，避免首个请求承担构建耗时（构建图时已用到的会跳过）
+    if get_app_config().get("warmup", True):
+        await component_registry.warmup()
+    if EMOTION_WARMUP:
+        await emotion_classifier.warmup()
+    # 知识库本地副本：加载快照并启动后台同步
+    if KB_RETRIEVAL_BACKEND == "local":
+        await kb_replica.start()
+    
     # 启动记忆管理调度器
     # try:
     #     start_memory_scheduler()
@@ -65,6 +88,11 @@ async def lifespan(app: FastAPI):
     # except Exception as e:
     #     logger.error(f"停止记忆管理调度器失败：{e}", exc_info=True)
     
+    await shutdown_redis()
+    await kb_replica.stop()
+    await close_kb_clients()
+    await close_rerank_services()
+    emotion_classifier.shutdown()
     logger.info("Application shutting down")
 
 # 获取应用配置
@@ -0,0 +1,99 @@
+"""
+AdmissionController 测试：已有会话优先出队、排队期限、单用户限制、队列满时挤掉新会话
+"""
+import asyncio
+
+import pytest
+
+from agents.airport_service.admission import AdmissionController, AdmissionRejectedError
+
+
+async def _hold(controller: AdmissionController, thread_key, user_id, release: asyncio.Event, events: list, name: str):
+    try:
+        async with controller.admit(thread_key, user_id):
+            events.append(f"run:{name}")
+            await release.wait()
+    except AdmissionRejectedError as e:
+        events.append(f"{e.reason}:{name}")
+
+
+async def _start(coroutine) -> asyncio.Task:
+    task = asyncio.create_task(coroutine)
+    await asyncio.sleep(0)
+    return task
+
+
+@pytest.mark.asyncio
+async def test_ongoing_thread_is_dequeued_before_new_threads():
+    controller = AdmissionController(max_concurrency=1, queue_size=10, queue_timeout=5, per_user_limit=0)
+    # 先完成一次运行，thread-old 成为已有会话
+    async with controller.admit("thread-old", None):
+        pass
+
+    events = []
+    release = asyncio.Event()
+    tasks = [await _start(_hold(controller, "thread-a", None, release, events, "holder"))]
+    tasks.append(await _start(_hold(controller, "thread-new-1", None, release, events, "new-1")))
+    tasks.append(await _start(_hold(controller, "thread-new-2", None, release, events, "new-2")))
+    tasks.append(await _start(_hold(controller, "thread-old", None, release, events, "old")))
+    assert controller.stats()["queued"] == 3
+
+    release.set()
+    await asyncio.gather(*tasks)
+    assert events == ["run:holder", "run:old", "run:new-1", "run:new-2"]
+    assert controller.stats()["running"] == 0
+
+
+@pytest.mark.asyncio
+async def test_queued_run_is_rejected_after_deadline():
+    controller = AdmissionController(max_concurrency=1, queue_size=10, queue_timeout=0.05, per_user_limit=0)
+    events = []
+    release = asyncio.Event()
+    holder = await _start(_hold(controller, "thread-a", None, release, events, "holder"))
+
+    await _hold(controller, "thread-b", None, release, events, "late")
+
+    assert events == ["run:holder", "queue_timeout:late"]
+    assert controller.stats()["queued"] == 0
+    release.set()
+    await holder
+    assert controller.stats()["running"] == 0
+
+
+@pytest.mark.asyncio
+async def test_per_user_limit_rejects_extra_runs():
+    controller = AdmissionController(max_concurrency=10, queue_size=10, queue_timeout=5, per_user_limit=2)
+    events = []
+    release = asyncio.Event()
+    tasks = [await _start(_hold(controller, f"thread-{i}", "user-1", release, events, str(i))) for i in range(2)]
+
+    await _hold(controller, "thread-2", "user-1", release, events, "2")
+    # 其他用户不受影响
+    tasks.append(await _start(_hold(controller, "thread-3", "user-2", release, events, "3")))
+
+    release.set()
+    await asyncio.gather(*tasks)
+    assert events == ["run:0", "run:1", "user_limit:2", "run:3"]
+
+    # 运行结束后名额归还
+    async with controller.admit("thread-4", "user-1"):
+        pass
+
+
+@pytest.mark.asyncio
+async def test_full_queue_displaces_new_thread_for_ongoing_one():
+    controller = AdmissionController(max_concurrency=1, queue_size=1, queue_timeout=5, per_user_limit=0)
+    async with controller.admit("thread-old", None):
+        pass
+
+    events = []
+    release = asyncio.Event()
+    holder = await _start(_hold(controller, "thread-a", None, release, events, "holder"))
+    new = await _start(_hold(controller, "thread-new", None, release, events, "new"))
+    # 队列已满：新会话直接拒绝，已有会话挤掉排队中的新会话
+    await _hold(controller, "thread-new-2", None, release, events, "new-2")
+    old = await _start(_hold(controller, "thread-old", None, release, events, "old"))
+
+    release.set()
+    await asyncio.gather(holder, new, old)
+    assert events == ["run:holder", "queue_full:new-2", "displaced:new", "run:old"]
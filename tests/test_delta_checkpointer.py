@@ -0,0 +1,199 @@
+"""
+DeltaRedisSaver 增量checkpoint测试
+
+使用内存中的简易Redis替身，AsyncRedisSaver 自身的checkpoint读写替换为字典，只验证增量存储逻辑。
+"""
+from collections import OrderedDict
+
+import pytest
+from langgraph.checkpoint.redis.aio import AsyncRedisSaver
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+
+from agents.airport_service.delta_checkpointer import DeltaRedisSaver
+
+THREAD_ID = "thread-1"
+
+
+class _FakePipeline:
+    def __init__(self, redis: "_FakeRedis"):
+        self._redis = redis
+        self._ops = []
+
+    def __getattr__(self, name):
+        def queue(*args):
+            self._ops.append((name, args))
+        return queue
+
+    async def execute(self):
+        return [getattr(self._redis, f"_{name}")(*args) for name, args in self._ops]
+
+
+class _FakeRedis:
+    """只实现 DeltaRedisSaver 用到的命令"""
+
+    def __init__(self):
+        self.data = {}
+
+    def pipeline(self, transaction: bool = False):
+        return _FakePipeline(self)
+
+    async def get(self, key):
+        return self._get(key)
+
+    async def lrange(self, key, start, end):
+        return self._lrange(key, start, end)
+
+    async def eval(self, script, numkeys, *args):
+        """按 _WRITE_SCRIPT 的语义执行"""
+        head_key, base_key, log_key, archive_key, archived_base_key, archived_log_key = args[:numkeys]
+        expected, mode, payload, checkpoint_id, _ttl = args[numkeys:]
+        head = self.data.get(head_key)
+        if head is not None and head != expected:
+            return -1
+        if mode == "log":
+            self._rpush(log_key, payload)
+            return len(self.data[log_key])
+        if expected and base_key in self.data:
+            self.data[archived_base_key] = self.data.pop(base_key)
+            if log_key in self.data:
+                self.data[archived_log_key] = self.data.pop(log_key)
+            self.data.setdefault(archive_key, []).insert(0, expected.encode("utf-8"))
+        self.data[base_key] = payload
+        self.data[head_key] = checkpoint_id
+        self._delete(log_key)
+        return 0
+
+    def _get(self, key):
+        return self.data.get(key)
+
+    def _set(self, key, value):
+        self.data[key] = value
+
+    def _lrange(self, key, start, end):
+        return list(self.data.get(key, []))
+
+    def _rpush(self, key, value):
+        self.data.setdefault(key, []).append(value)
+
+    def _delete(self, key):
+        self.data.pop(key, None)
+
+    def _expire(self, key, seconds):
+        pass
+
+
+@pytest.fixture
+def inline_checkpoints(monkeypatch):
+    """AsyncRedisSaver 写入的checkpoint：checkpoint_id -> 内联通道值"""
+    stored = {}
+
+    async def aput(self, config, checkpoint, metadata, new_versions, stream_mode="values"):
+        stored[checkpoint["id"]] = checkpoint.get("channel_values", {})
+        return {"configurable": {**config["configurable"], "checkpoint_id": checkpoint["id"]}}
+
+    async def aget_channel_values(self, thread_id, checkpoint_ns="", checkpoint_id="", channel_versions=None):
+        return stored.get(checkpoint_id, {})
+
+    monkeypatch.setattr(AsyncRedisSaver, "aput", aput)
+    monkeypatch.setattr(AsyncRedisSaver, "aget_channel_values", aget_channel_values)
+    return stored
+
+
+def _make_saver(compaction_interval: int = 20, redis: "_FakeRedis" = None) -> DeltaRedisSaver:
+    saver = DeltaRedisSaver.__new__(DeltaRedisSaver)
+    saver.serde = JsonPlusSerializer()
+    saver.ttl_config = None
+    saver._redis = redis or _FakeRedis()
+    saver.compaction_interval = compaction_interval
+    saver._state_cache_size = 1000
+    saver._state_cache = OrderedDict()
+    return saver
+
+
+async def _put(saver: DeltaRedisSaver, parent_id, checkpoint_id: str, values: dict, changed):
+    config = {"configurable": {"thread_id": THREAD_ID, "checkpoint_ns": "", "checkpoint_id": parent_id}}
+    checkpoint = {"id": checkpoint_id, "channel_values": values}
+    return await saver.aput(config, checkpoint, {}, {channel: 1 for channel in changed})
+
+
+@pytest.mark.asyncio
+async def test_delta_chain_is_rebuilt_after_restart(inline_checkpoints):
+    saver = _make_saver()
+    await _put(saver, None, "cp1", {"messages": ["m1"], "summary": ""}, ["messages", "summary"])
+    await _put(saver, "cp1", "cp2", {"messages": ["m1", "m2"], "summary": ""}, ["messages"])
+    await _put(saver, "cp2", "cp3", {"messages": ["m1", "m2", "m3"], "summary": "s"}, ["messages", "summary"])
+
+    assert inline_checkpoints["cp3"] == {}
+    saver._state_cache.clear()
+    assert await saver.aget_channel_values(THREAD_ID, "", "cp3") == {"messages": ["m1", "m2", "m3"], "summary": "s"}
+    assert await saver.aget_channel_values(THREAD_ID, "", "cp2") == {"messages": ["m1", "m2"], "summary": ""}
+
+
+@pytest.mark.asyncio
+async def test_put_on_inline_parent_writes_base_snapshot(inline_checkpoints):
+    # 开启增量存储之前写入的旧格式checkpoint：通道值内联，增量存储中没有它
+    inline_checkpoints["legacy"] = {"messages": ["m1", "m2"], "summary": "s"}
+    saver = _make_saver()
+
+    await _put(saver, "legacy", "cp1", {"messages": ["m1", "m2", "m3"], "summary": "s"}, ["messages"])
+    base_key, log_key = saver._delta_keys(THREAD_ID, "")
+    assert saver._unpack(saver._redis.data[base_key])["checkpoint_id"] == "cp1"
+    assert log_key not in saver._redis.data
+
+    # 之后的写入正常追加增量记录
+    await _put(saver, "cp1", "cp2", {"messages": ["m1", "m2", "m3", "m4"], "summary": "s"}, ["messages"])
+    assert len(saver._redis.data[log_key]) == 1
+
+    # 重启（或其他副本）后缓存为空，仍可从基线 + 增量重建完整状态
+    saver._state_cache.clear()
+    assert await saver.aget_channel_values(THREAD_ID, "", "cp1") == {"messages": ["m1", "m2", "m3"], "summary": "s"}
+    assert await saver.aget_channel_values(THREAD_ID, "", "cp2") == {"messages": ["m1", "m2", "m3", "m4"], "summary": "s"}
+    assert await saver.aget_channel_values(THREAD_ID, "", "legacy") == {"messages": ["m1", "m2"], "summary": "s"}
+
+
+@pytest.mark.asyncio
+async def test_put_on_parent_before_compaction_writes_base_snapshot(inline_checkpoints):
+    saver = _make_saver(compaction_interval=2)
+    await _put(saver, None, "cp1", {"messages": ["m1"]}, ["messages"])
+    await _put(saver, "cp1", "cp2", {"messages": ["m1", "m2"]}, ["messages"])
+    # cp2 触发压缩后，从更早的 cp1 分叉写入：cp1 已不在增量链上
+    saver._state_cache.clear()
+    await _put(saver, "cp1", "cp1b", {"messages": ["m1", "x"]}, ["messages"])
+
+    saver._state_cache.clear()
+    assert await saver.aget_channel_values(THREAD_ID, "", "cp1b") == {"messages": ["m1", "x"]}
+
+
+@pytest.mark.asyncio
+async def test_checkpoints_before_compaction_stay_readable(inline_checkpoints):
+    saver = _make_saver(compaction_interval=2)
+    await _put(saver, None, "cp1", {"messages": ["m1"]}, ["messages"])
+    await _put(saver, "cp1", "cp2", {"messages": ["m1", "m2"]}, ["messages"])
+    await _put(saver, "cp2", "cp3", {"messages": ["m1", "m2", "m3"]}, ["messages"])
+    await _put(saver, "cp3", "cp4", {"messages": ["m1", "m2", "m3", "m4"]}, ["messages"])
+
+    # 历史列表 / 回溯读取压缩前的checkpoint：从归档段重建，而不是返回空状态
+    saver._state_cache.clear()
+    assert await saver.aget_channel_values(THREAD_ID, "", "cp1") == {"messages": ["m1"]}
+    assert await saver.aget_channel_values(THREAD_ID, "", "cp3") == {"messages": ["m1", "m2", "m3"]}
+    assert await saver.aget_channel_values(THREAD_ID, "", "cp4") == {"messages": ["m1", "m2", "m3", "m4"]}
+
+
+@pytest.mark.asyncio
+async def test_concurrent_compaction_on_another_replica_is_detected(inline_checkpoints):
+    redis = _FakeRedis()
+    replica_a = _make_saver(compaction_interval=3, redis=redis)
+    replica_b = _make_saver(compaction_interval=3, redis=redis)
+    await _put(replica_a, None, "cp1", {"messages": ["m1"]}, ["messages"])
+    await _put(replica_a, "cp1", "cp2", {"messages": ["m1", "m2"]}, ["messages"])
+
+    # 另一副本在同一会话上写入并触发压缩，副本A缓存的父状态对应的基线已被替换
+    await _put(replica_b, "cp2", "cp3", {"messages": ["m1", "m2", "b"]}, ["messages"])
+    await _put(replica_b, "cp3", "cp4", {"messages": ["m1", "m2", "b", "b2"]}, ["messages"])
+    await _put(replica_a, "cp2", "cp3a", {"messages": ["m1", "m2", "a"]}, ["messages"])
+
+    for saver in (replica_a, replica_b):
+        saver._state_cache.clear()
+    assert await replica_b.aget_channel_values(THREAD_ID, "", "cp3a") == {"messages": ["m1", "m2", "a"]}
+    assert await replica_b.aget_channel_values(THREAD_ID, "", "cp4") == {"messages": ["m1", "m2", "b", "b2"]}
+    assert await replica_b.aget_channel_values(THREAD_ID, "", "cp2") == {"messages": ["m1", "m2"]}
@@ -0,0 +1,69 @@
+"""
+ConnectionWriter 发送队列测试：慢客户端积压超限时以 1013 关闭连接
+"""
+import asyncio
+
+import pytest
+from fastapi import WebSocketDisconnect
+
+from api.chat import make_connection_writer
+from api.event_stream import ConnectionWriter
+
+
+class _SlowWebSocket:
+    """send_text 一直阻塞，模拟接收过慢的客户端"""
+
+    def __init__(self):
+        self.sent = []
+        self.close_codes = []
+        self.unblock = asyncio.Event()
+
+    async def send_text(self, text: str):
+        await self.unblock.wait()
+        self.sent.append(text)
+
+    async def close(self, code: int = 1000):
+        self.close_codes.append(code)
+
+
+@pytest.mark.asyncio
+async def test_overflow_closes_connection_with_1013(monkeypatch):
+    monkeypatch.setattr("api.chat.WS_SEND_QUEUE_MAX_BYTES", 100)
+    websocket = _SlowWebSocket()
+    writer = make_connection_writer(websocket)
+
+    # 第一条被写任务取出后阻塞在发送上，之后的事件在队列中积压
+    writer.put_event("x" * 60)
+    await asyncio.sleep(0)
+    writer.put_event("y" * 60)
+    with pytest.raises(WebSocketDisconnect) as exc_info:
+        writer.put_event("z" * 60)
+    assert exc_info.value.code == 1013
+
+    await asyncio.sleep(0)
+    assert websocket.close_codes == [1013]
+    assert writer.pending_bytes == 0
+    # 连接关闭后继续入队立即失败，图运行随之结束
+    with pytest.raises(WebSocketDisconnect):
+        writer.put_text(None, "e1", 1, "token")
+    await writer.close()
+
+
+@pytest.mark.asyncio
+async def test_backlog_within_limit_is_delivered_in_order():
+    websocket = _SlowWebSocket()
+    writer = ConnectionWriter(websocket.send_text, max_bytes=1000, on_overflow=websocket.close)
+    writer.start()
+
+    writer.put_event("a")
+    writer.put_event("ping-1", supersede_key="pong")
+    writer.put_event("b")
+    writer.put_event("ping-2", supersede_key="pong")
+    websocket.unblock.set()
+    while writer.pending_bytes:
+        await asyncio.sleep(0.001)
+
+    # 未发送的 pong 只保留最新一条
+    assert websocket.sent == ["a", "b", "ping-2"]
+    assert websocket.close_codes == []
+    await writer.close()
@@ -0,0 +1,38 @@
+"""
+多路检索结果融合测试：RRF 排序与 SimHash 近重复去除
+"""
+from agents.airport_service.core.query.fusion import (
+    fuse_candidates, hamming_distance, prune_near_duplicates, simhash
+)
+
+POWER_BANK = "您好，根据民航规定，充电宝严禁托运，只能随身携带；额定能量超过160Wh的充电宝严禁携带，标识不清的充电宝也不能带上飞机。"
+RIDE_HAILING = "您好，深圳机场网约车通道位于地面交通中心（GTC）二层15号门出口处或B区位于GTC一层预约迎客区。"
+BAGGAGE = "您好，普通航空公司托运行李免费额度为：头等舱40KG，商务舱30KG，经济舱20KG。不同航空公司对于免费行李额有不同规定。"
+
+
+def test_simhash_is_stable_and_ignores_formatting():
+    assert simhash(POWER_BANK) == simhash(POWER_BANK)
+    assert simhash(POWER_BANK) == simhash(POWER_BANK.replace("，", ", ").replace("。", ".\n"))
+
+
+def test_near_duplicate_is_pruned_and_distinct_chunk_is_kept():
+    # 同一条知识的两个版本：只把一处“严禁”改成了“禁止”
+    near_duplicate = POWER_BANK.replace("严禁", "禁止", 1)
+    assert hamming_distance(simhash(POWER_BANK), simhash(near_duplicate)) <= 10
+
+    results = [{"content": POWER_BANK}, {"content": near_duplicate}, {"content": RIDE_HAILING}, {"content": BAGGAGE}]
+    kept = prune_near_duplicates(results, max_distance=10)
+    assert [item["content"] for item in kept] == [POWER_BANK, RIDE_HAILING, BAGGAGE]
+    # 关闭去重时原样返回
+    assert prune_near_duplicates(results, max_distance=-1) == results
+
+
+def test_fuse_candidates_ranks_by_rrf_and_drops_near_duplicates():
+    near_duplicate = POWER_BANK.replace("严禁", "禁止", 1)
+    original_query = [{"content": RIDE_HAILING}, {"content": POWER_BANK}]
+    rewritten_query = [{"content": near_duplicate}, {"content": RIDE_HAILING}, {"content": BAGGAGE}]
+
+    kept = fuse_candidates([original_query, rewritten_query], top_n=15, rrf_k=60)
+
+    # 网约车分块两路都排名靠前，融合分数最高；近重复的充电宝分块只保留排名更高的一个
+    assert [item["content"] for item in kept] == [RIDE_HAILING, near_duplicate, BAGGAGE]
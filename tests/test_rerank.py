@@ -0,0 +1,77 @@
+"""
+RerankService 请求合并测试
+
+打分后端替换为记录调用的替身：分数由分块内容决定，便于核对拆分回各调用方的结果。
+"""
+import asyncio
+
+import pytest
+
+from agents.airport_service.core.query.rerank import RerankService
+
+
+class _FakeBackend:
+    name = "fake"
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.calls = []
+        self.release = asyncio.Event()
+        self.release.set()
+
+    async def score(self, query, documents):
+        self.calls.append((query, list(documents)))
+        await self.release.wait()
+        await asyncio.sleep(self.delay)
+        return [float(len(document)) for document in documents]
+
+    async def close(self):
+        pass
+
+
+@pytest.mark.asyncio
+async def test_coalesced_callers_get_their_own_scores():
+    backend = _FakeBackend()
+    service = RerankService(backend, cache_size=0, batch_window_ms=20)
+
+    first, second = await asyncio.gather(
+        service.score("充电宝能带吗", ["a", "bbb", "cc"]),
+        service.score("充电宝能带吗", ["cc", "dddd"]),
+    )
+
+    assert first == [1.0, 3.0, 2.0]
+    assert second == [2.0, 4.0]
+    # 两次调用合并为一次上游请求，重复的分块只发送一次
+    assert len(backend.calls) == 1
+    assert sorted(backend.calls[0][1]) == ["a", "bbb", "cc", "dddd"]
+
+
+@pytest.mark.asyncio
+async def test_different_questions_are_not_coalesced():
+    backend = _FakeBackend()
+    service = RerankService(backend, cache_size=0, batch_window_ms=20)
+
+    await asyncio.gather(service.score("问题一", ["a"]), service.score("问题二", ["a"]))
+
+    assert sorted(query for query, _ in backend.calls) == ["问题一", "问题二"]
+
+
+@pytest.mark.asyncio
+async def test_cancelled_caller_does_not_cancel_others():
+    backend = _FakeBackend()
+    backend.release.clear()
+    service = RerankService(backend, cache_size=0, batch_window_ms=5)
+
+    cancelled = asyncio.create_task(service.score("值机柜台在哪", ["a", "bb"]))
+    survivor = asyncio.create_task(service.score("值机柜台在哪", ["bb", "ccc"]))
+    while not backend.calls:
+        await asyncio.sleep(0.001)
+
+    # 上游请求已发出，其中一个调用方被取消
+    cancelled.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await cancelled
+    backend.release.set()
+
+    assert await survivor == [2.0, 3.0]
+    assert len(backend.calls) == 1
@@ -0,0 +1,63 @@
+"""
+ThreadRunCoordinator 进程内协调测试：queue 按到达顺序串行，supersede 由最新一次运行取代旧运行
+"""
+import asyncio
+
+import pytest
+
+from agents.airport_service.run_coordinator import RunCancelledError, ThreadRunCoordinator
+
+
+async def _run(coordinator: ThreadRunCoordinator, name: str, events: list, duration: float = 0.02):
+    try:
+        async with coordinator.acquire("thread-1") as run:
+            events.append(f"start:{name}")
+            await run.execute(asyncio.sleep(duration))
+            events.append(f"end:{name}")
+    except RunCancelledError as e:
+        events.append(f"{e.reason}:{name}")
+
+
+async def _start_in_order(*coroutines):
+    """依次启动任务，每个任务先进入协调器再启动下一个"""
+    tasks = []
+    for coroutine in coroutines:
+        tasks.append(asyncio.create_task(coroutine))
+        await asyncio.sleep(0)
+    await asyncio.gather(*tasks)
+
+
+@pytest.mark.asyncio
+async def test_queue_runs_serially_in_arrival_order():
+    coordinator = ThreadRunCoordinator(policy="queue", redis_lease=False, wait_timeout=5)
+    events = []
+
+    await _start_in_order(*(_run(coordinator, name, events) for name in ("a", "b", "c")))
+
+    assert events == ["start:a", "end:a", "start:b", "end:b", "start:c", "end:c"]
+    assert coordinator.active_threads() == 0
+
+
+@pytest.mark.asyncio
+async def test_supersede_cancels_running_and_queued_runs():
+    coordinator = ThreadRunCoordinator(policy="supersede", redis_lease=False, wait_timeout=5)
+    events = []
+
+    await _start_in_order(*(_run(coordinator, name, events, duration=1) for name in ("a", "b")),
+                          _run(coordinator, "c", events))
+
+    # a 正在运行时被取消，排队中的 b 未开始即被取消，只有最新的 c 完成
+    assert events[0] == "start:a"
+    assert sorted(events[1:3]) == ["superseded:a", "superseded:b"]
+    assert events[3:] == ["start:c", "end:c"]
+    assert coordinator.active_threads() == 0
+
+
+@pytest.mark.asyncio
+async def test_queue_timeout_rejects_waiting_run():
+    coordinator = ThreadRunCoordinator(policy="queue", redis_lease=False, wait_timeout=0.05)
+    events = []
+
+    await _start_in_order(_run(coordinator, "a", events, duration=0.2), _run(coordinator, "b", events))
+
+    assert events == ["start:a", "queue_timeout:b", "end:a"]
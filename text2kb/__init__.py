@@ -2,7 +2,9 @@
 text2kb - 知识库检索模块
 """
 
-from .retrieval import retrieve_from_kb
+from .client import KnowledgeBaseClient
+from .replica import KnowledgeBaseReplica
+from .retrieval import retrieve_from_kb, retrieve_many_from_kb, get_kb_client, close_kb_clients
 
 # 确保导入时不会引起循环导入
 try:
@@ -21,5 +23,10 @@ except ImportError:
     pass
 
 __all__ = [
-    'retrieve_from_kb'
+    'KnowledgeBaseClient',
+    'KnowledgeBaseReplica',
+    'retrieve_from_kb',
+    'retrieve_many_from_kb',
+    'get_kb_client',
+    'close_kb_clients'
 ] 
\ No newline at end of file
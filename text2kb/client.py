@@ -0,0 +1,259 @@
+"""
+知识库（RAGFlow）长连接客户端
+
+- 进程内共享一个 aiohttp 会话：连接池 + keep-alive，连接数有上限，避免每次检索重新建立TCP/HTTP连接
+- 数据集名称 -> ID 使用TTL缓存，并发的首次查询合并为一次列表请求；检索返回数据集错误时失效重新获取
+- 所有请求带超时，失败时返回空结果，不向上抛出
+"""
+
+import asyncio
+import time
+from typing import Any, Dict, List, Optional
+
+import aiohttp
+
+from common.cache import AsyncResultCache
+from common.logging import get_logger
+from common.metrics import metrics
+
+logger = get_logger("text2kb")
+
+
+class KnowledgeBaseClient:
+    """RAGFlow 知识库异步客户端，应用生命周期内复用，退出时调用 close"""
+
+    def __init__(self, address: str, api_key: str, timeout: float = 10, connect_timeout: float = 3,
+                 pool_size: int = 100, pool_size_per_host: int = 20, keepalive_timeout: float = 30,
+                 dataset_id_ttl: float = 300):
+        """
+        Args:
+            address: API地址（host:port）
+            api_key: API密钥
+            timeout: 单次请求总超时（秒）
+            connect_timeout: 建立连接超时（秒）
+            pool_size: 连接池总连接数上限
+            pool_size_per_host: 单个主机的连接数上限
+            keepalive_timeout: 空闲连接保持时间（秒）
+            dataset_id_ttl: 数据集ID缓存有效期（秒）
+        """
+        self.address = address
+        self.api_key = api_key
+        self.base_url = f"http://{address}/api/v1"
+        self._timeout = aiohttp.ClientTimeout(total=timeout, connect=connect_timeout)
+        self._pool_size = pool_size
+        self._pool_size_per_host = pool_size_per_host
+        self._keepalive_timeout = keepalive_timeout
+        self._headers = {"Authorization": f"Bearer {api_key}"}
+        self._dataset_ids = AsyncResultCache("kb_dataset_id", max_entries=64, ttl=dataset_id_ttl)
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._session_loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        """获取共享会话；会话绑定事件循环，循环变化（如脚本多次 asyncio.run）时重建"""
+        loop = asyncio.get_running_loop()
+        if self._session is None or self._session.closed or self._session_loop is not loop:
+            connector = aiohttp.TCPConnector(
+                limit=self._pool_size,
+                limit_per_host=self._pool_size_per_host,
+                keepalive_timeout=self._keepalive_timeout,
+                ttl_dns_cache=300
+            )
+            self._session = aiohttp.ClientSession(connector=connector, timeout=self._timeout, headers=self._headers)
+            self._session_loop = loop
+        return self._session
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+        self._session_loop = None
+
+    async def get_dataset_info(self, name: str) -> Optional[Dict[str, Any]]:
+        """
+        获取知识库数据集信息（含 id、chunk_count、update_time 等字段），不经过缓存
+
+        Returns:
+            数据集信息字典，如果获取失败则返回None
+        """
+        logger.info(f"获取数据集信息: {name}")
+        params = {
+            "page": 1,
+            "page_size": 10,
+            "orderby": "create_time",
+            "name": name
+        }
+        start = time.perf_counter()
+        try:
+            async with self._get_session().get(f"{self.base_url}/datasets", params=params) as response:
+                if response.status != 200:
+                    metrics.inc("kb_requests", op="dataset", result="http_error")
+                    logger.warning(f"获取数据集ID API请求失败，状态码: {response.status}")
+                    return None
+                data = await response.json()
+        except Exception as e:
+            metrics.inc("kb_requests", op="dataset", result="error")
+            logger.error(f"获取数据集ID异常: {e}", exc_info=True)
+            return None
+        finally:
+            metrics.observe("kb_request_seconds", time.perf_counter() - start, op="dataset")
+
+        metrics.inc("kb_requests", op="dataset", result="ok")
+        if data.get('data'):
+            dataset = data['data'][0]
+            logger.debug(f"成功获取数据集ID: {dataset['id']} (数据集: {name})")
+            return dataset
+        logger.warning(f"数据集不存在: {name}")
+        return None
+
+    async def get_dataset_id(self, name: str) -> str:
+        """获取数据集ID（TTL缓存，获取失败返回空字符串且不缓存）"""
+        async def fetch() -> str:
+            dataset = await self.get_dataset_info(name)
+            return dataset.get("id", "") if dataset else ""
+        return await self._dataset_ids.get_or_compute(name, fetch, cacheable=bool)
+
+    async def _get_pages(self, path: str, key: str, page_size: int, op: str) -> List[Dict[str, Any]]:
+        """逐页拉取列表接口的全部条目，任一页失败即抛出异常（同步任务不能使用不完整的数据）"""
+        items: List[Dict[str, Any]] = []
+        page = 1
+        while True:
+            start = time.perf_counter()
+            try:
+                async with self._get_session().get(f"{self.base_url}{path}",
+                                                   params={"page": page, "page_size": page_size}) as response:
+                    response.raise_for_status()
+                    data = await response.json()
+            except Exception:
+                metrics.inc("kb_requests", op=op, result="error")
+                raise
+            finally:
+                metrics.observe("kb_request_seconds", time.perf_counter() - start, op=op)
+            if data.get("code", 0) != 0:
+                metrics.inc("kb_requests", op=op, result="api_error")
+                raise RuntimeError(f"知识库列表请求失败: {data.get('message')}")
+            metrics.inc("kb_requests", op=op, result="ok")
+            batch = data.get("data", {}).get(key) or []
+            items.extend(batch)
+            if len(batch) < page_size:
+                return items
+            page += 1
+
+    async def list_documents(self, dataset_id: str, page_size: int = 100) -> List[Dict[str, Any]]:
+        """列出数据集下的全部文档"""
+        return await self._get_pages(f"/datasets/{dataset_id}/documents", "docs", page_size, "documents")
+
+    async def list_chunks(self, dataset_id: str, document_id: str, page_size: int = 256) -> List[Dict[str, Any]]:
+        """列出文档的全部分块（含 id、content、available 等字段）"""
+        return await self._get_pages(f"/datasets/{dataset_id}/documents/{document_id}/chunks", "chunks",
+                                     page_size, "chunks")
+
+    async def _post_retrieval(self, payload: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        start = time.perf_counter()
+        try:
+            async with self._get_session().post(f"{self.base_url}/retrieval", json=payload) as response:
+                if response.status != 200:
+                    metrics.inc("kb_requests", op="retrieval", result="http_error")
+                    logger.error(f"检索请求失败，状态码: {response.status}")
+                    return None
+                data = await response.json()
+        except asyncio.TimeoutError:
+            metrics.inc("kb_requests", op="retrieval", result="timeout")
+            logger.error(f"检索请求超时（{self._timeout.total}s）")
+            return None
+        except Exception:
+            metrics.inc("kb_requests", op="retrieval", result="error")
+            raise
+        finally:
+            metrics.observe("kb_request_seconds", time.perf_counter() - start, op="retrieval")
+        metrics.inc("kb_requests", op="retrieval", result="ok" if data.get("code", 0) == 0 else "api_error")
+        return data
+
+    async def retrieve(self, question: str, dataset_name: str, similarity_threshold: float = 0.2,
+                       vector_similarity_weight: float = 0.5, top_k: int = 5,
+                       key_words: bool = True) -> List[Dict[str, Any]]:
+        """
+        从知识库中检索信息
+
+        Args:
+            question: 问题文本
+            dataset_name: 数据集名称
+            similarity_threshold: 相似度阈值，低于此值的结果将被标记
+            vector_similarity_weight: 向量相似度权重
+            top_k: 检索结果数量上限
+            key_words: 是否启用关键词检索
+
+        Returns:
+            检索结果列表，包含内容和标记信息，按相关性排序
+        """
+        logger.info(f"开始从知识库检索: '{question[:50]}...' (数据集: {dataset_name}, top_k: {top_k})")
+        try:
+            dataset_id = await self.get_dataset_id(dataset_name)
+            if not dataset_id:
+                logger.warning(f"未找到数据集: {dataset_name}")
+                return []
+
+            payload = {
+                "question": question,
+                "dataset_ids": [dataset_id],
+                "similarity_threshold": similarity_threshold,
+                "vector_similarity_weight": vector_similarity_weight,
+                "top_k": top_k,
+                "key_words": key_words
+            }
+            retrieval_data = await self._post_retrieval(payload)
+            if retrieval_data is None:
+                return []
+            if retrieval_data.get("code", 0) != 0:
+                # 数据集可能已被删除重建，ID失效，下次重新获取
+                self._dataset_ids.invalidate(dataset_name)
+                logger.error(f"检索请求失败: {retrieval_data.get('message')}")
+                return []
+
+            all_content = sorted(
+                retrieval_data['data']['chunks'],
+                key=lambda x: x['vector_similarity'],
+                reverse=True
+            )
+            # 添加相似度标记
+            results = []
+            for content in all_content:
+                similarity = content['vector_similarity']
+                results.append({
+                    'content': content['content'],
+                    'similarity': similarity,
+                    'vector_similarity': similarity,
+                    'low_similarity': similarity < similarity_threshold
+                })
+            logger.info(f"检索完成: 找到 {len(results)} 条结果 (数据集: {dataset_name})")
+            # 记录低相似度结果的数量
+            low_similarity_count = sum(1 for r in results if r['low_similarity'])
+            if low_similarity_count > 0:
+                logger.warning(f"有 {low_similarity_count} 条结果的相似度低于阈值 {similarity_threshold}")
+            return results
+        except Exception as e:
+            logger.error(f"检索异常: {e}", exc_info=True)
+            return []
+
+    async def retrieve_many(self, questions: List[str], dataset_name: str,
+                            **kwargs) -> List[List[Dict[str, Any]]]:
+        """
+        批量检索多个问题，结果与 questions 一一对应
+
+        RAGFlow 的检索接口一次只接受一个问题，这里先解析一次数据集ID，
+        再在共享连接池上并发发出各个问题的检索请求。
+
+        Args:
+            questions: 问题列表
+            dataset_name: 数据集名称
+            **kwargs: 透传给 retrieve 的检索参数
+        """
+        if not questions:
+            return []
+        # 预先解析数据集ID，并发检索直接命中缓存
+        if not await self.get_dataset_id(dataset_name):
+            logger.warning(f"未找到数据集: {dataset_name}")
+            return [[] for _ in questions]
+        metrics.observe("kb_batch_size", len(questions))
+        return list(await asyncio.gather(
+            *(self.retrieve(question, dataset_name, **kwargs) for question in questions)
+        ))
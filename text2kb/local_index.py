@@ -0,0 +1,152 @@
+"""
+进程内混合检索索引
+
+jieba 分词的 BM25 关键词检索 + 稠密向量余弦相似度，打分方式与 RAGFlow 一致：
+    similarity = (1 - vector_similarity_weight) * term_similarity + vector_similarity_weight * vector_similarity
+
+BM25 分数没有上界，这里除以"查询中每个词各命中一次"时的分数（即查询词的 idf 之和，未登录词按最大 idf 计），
+得到 0~1 的 term_similarity，含义接近"查询词的信息量被命中了多少"，不同查询之间可比较。
+"""
+
+import json
+import math
+import os
+import re
+from collections import Counter, defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+import jieba
+import numpy as np
+
+jieba.setLogLevel(60)
+
+# 纯标点/空白的分词结果不参与检索
+_PUNCTUATION = re.compile(r"^[\W_]+$")
+
+
+def tokenize(text: str) -> List[str]:
+    """搜索引擎模式分词，去掉标点并统一小写"""
+    return [token.lower() for token in jieba.cut_for_search(text) if token.strip() and not _PUNCTUATION.match(token)]
+
+
+class BM25:
+    """Okapi BM25，倒排表存储"""
+
+    def __init__(self, corpus: List[List[str]], k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.size = len(corpus)
+        doc_len = np.array([len(tokens) for tokens in corpus], dtype=np.float32)
+        avg_len = float(doc_len.mean()) if self.size else 0.0
+        # 每篇文档的长度归一化项，检索时直接复用
+        self._norm = k1 * (1 - b + b * doc_len / avg_len) if avg_len else np.full(self.size, k1, dtype=np.float32)
+
+        postings: Dict[str, List[Tuple[int, int]]] = defaultdict(list)
+        for doc_id, tokens in enumerate(corpus):
+            for term, tf in Counter(tokens).items():
+                postings[term].append((doc_id, tf))
+        self._postings: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        self._idf: Dict[str, float] = {}
+        for term, items in postings.items():
+            ids, tfs = zip(*items)
+            self._postings[term] = (np.array(ids, dtype=np.int32), np.array(tfs, dtype=np.float32))
+            self._idf[term] = math.log(1 + (self.size - len(items) + 0.5) / (len(items) + 0.5))
+        self._max_idf = math.log(1 + (self.size + 0.5) / 0.5)
+
+    def scores(self, query: List[str]) -> np.ndarray:
+        """返回每篇文档归一化到 0~1 的关键词相似度"""
+        scores = np.zeros(self.size, dtype=np.float32)
+        terms = set(query)
+        if not terms or not self.size:
+            return scores
+        upper = 0.0
+        for term in terms:
+            idf = self._idf.get(term)
+            if idf is None:
+                upper += self._max_idf
+                continue
+            upper += idf
+            ids, tfs = self._postings[term]
+            scores[ids] += idf * tfs * (self.k1 + 1) / (tfs + self._norm[ids])
+        return np.minimum(scores / upper, 1.0)
+
+
+class HybridIndex:
+    """分块内容 + BM25 + 向量矩阵，构建后只读，可在线程间共享"""
+
+    def __init__(self, chunk_ids: List[str], contents: List[str], vectors: np.ndarray):
+        """
+        Args:
+            chunk_ids: 分块ID
+            contents: 分块内容
+            vectors: 分块向量，形状 (分块数, 维度)
+        """
+        self.chunk_ids = chunk_ids
+        self.contents = contents
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True) if len(vectors) else 1
+        self.vectors = (vectors / np.maximum(norms, 1e-12)).astype(np.float32)
+        self.bm25 = BM25([tokenize(content) for content in contents])
+
+    def __len__(self) -> int:
+        return len(self.contents)
+
+    def search(self, query: str, query_vector: Optional[List[float]], top_k: int = 5,
+               vector_similarity_weight: float = 0.5, similarity_threshold: float = 0.2) -> List[Dict[str, Any]]:
+        """
+        混合检索
+
+        Args:
+            query: 查询文本
+            query_vector: 查询向量，为空时只使用关键词相似度
+            top_k: 返回结果数量上限
+            vector_similarity_weight: 向量相似度权重
+            similarity_threshold: 综合相似度低于此值的结果不返回
+
+        Returns:
+            按综合相似度降序排列的结果，字段与 RAGFlow 检索接口一致
+        """
+        if not len(self):
+            return []
+        term_similarity = self.bm25.scores(tokenize(query))
+        if query_vector is not None:
+            vector = np.asarray(query_vector, dtype=np.float32)
+            vector_similarity = self.vectors @ (vector / max(float(np.linalg.norm(vector)), 1e-12))
+            similarity = (1 - vector_similarity_weight) * term_similarity + vector_similarity_weight * vector_similarity
+        else:
+            vector_similarity = np.zeros(len(self), dtype=np.float32)
+            similarity = term_similarity
+
+        top_k = min(top_k, len(self))
+        candidates = np.argpartition(-similarity, top_k - 1)[:top_k]
+        candidates = candidates[np.argsort(-similarity[candidates])]
+        return [
+            {
+                "id": self.chunk_ids[i],
+                "content": self.contents[i],
+                "similarity": float(similarity[i]),
+                "vector_similarity": float(vector_similarity[i]),
+                "term_similarity": float(term_similarity[i]),
+            }
+            for i in candidates if similarity[i] >= similarity_threshold
+        ]
+
+    def save(self, path: str, meta: Dict[str, Any]):
+        """保存快照：<path>.json 存分块和元信息，<path>.npy 存向量（BM25 加载时重建）"""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        np.save(f"{path}.npy", self.vectors)
+        with open(f"{path}.json.tmp", "w", encoding="utf-8") as f:
+            json.dump({"meta": meta, "chunk_ids": self.chunk_ids, "contents": self.contents}, f, ensure_ascii=False)
+        # 元信息最后落盘，加载时以它为准
+        os.replace(f"{path}.json.tmp", f"{path}.json")
+
+    @classmethod
+    def load(cls, path: str) -> Tuple[Optional["HybridIndex"], Dict[str, Any]]:
+        """加载快照，不存在或不完整时返回 (None, {})"""
+        if not (os.path.exists(f"{path}.json") and os.path.exists(f"{path}.npy")):
+            return None, {}
+        with open(f"{path}.json", encoding="utf-8") as f:
+            data = json.load(f)
+        vectors = np.load(f"{path}.npy")
+        if len(vectors) != len(data["contents"]):
+            return None, {}
+        return cls(data["chunk_ids"], data["contents"], vectors), data["meta"]
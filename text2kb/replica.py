@@ -0,0 +1,212 @@
+"""
+知识库本地副本
+
+把 RAGFlow 数据集的全部分块同步到进程内的 HybridIndex（BM25 + 向量），检索不再经过 RAGFlow：
+- 同步任务按间隔比较数据集的 chunk_count / update_time，变化时全量拉取分块并重建索引；
+  内容未变的分块复用已有向量，只为新增/修改的分块调用嵌入模型
+- 索引重建在线程中进行，完成后整体替换，检索期间不加锁
+- 可选把索引快照保存到磁盘，重启后立即可用，同步任务在后台追平
+- 查询向量按查询文本缓存；嵌入模型不可用时退化为纯关键词检索
+"""
+
+import asyncio
+import hashlib
+import os
+import re
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+from common.cache import AsyncResultCache
+from common.logging import get_logger
+from common.metrics import metrics
+from .client import KnowledgeBaseClient
+from .local_index import HybridIndex
+
+logger = get_logger("text2kb")
+
+_UNSAFE_FILENAME = re.compile(r"[^\w\-]+")
+
+
+def _content_hash(content: str) -> str:
+    return hashlib.sha1(content.encode("utf-8")).hexdigest()
+
+
+class KnowledgeBaseReplica:
+    """单个数据集的本地混合检索副本"""
+
+    def __init__(self, client: KnowledgeBaseClient, dataset_name: str, embeddings: Callable[[], Any],
+                 embedding_id: str = "", sync_interval: float = 600, snapshot_dir: Optional[str] = None,
+                 embed_batch_size: int = 32, query_cache_size: int = 1024):
+        """
+        Args:
+            client: 知识库客户端，用于拉取分块
+            dataset_name: 数据集名称
+            embeddings: 返回嵌入模型（langchain Embeddings）的函数，首次使用时才调用
+            embedding_id: 嵌入模型标识，写入快照，模型变化时快照作废
+            sync_interval: 同步间隔（秒）
+            snapshot_dir: 快照目录，为空则不保存快照
+            embed_batch_size: 每次嵌入请求的分块数
+            query_cache_size: 查询向量缓存条数
+        """
+        self.client = client
+        self.dataset_name = dataset_name
+        self.embedding_id = embedding_id
+        self.sync_interval = sync_interval
+        self.embed_batch_size = embed_batch_size
+        self._embeddings = embeddings
+        self._snapshot_path = (
+            os.path.join(snapshot_dir, _UNSAFE_FILENAME.sub("_", dataset_name)) if snapshot_dir and dataset_name else None
+        )
+        self._index: Optional[HybridIndex] = None
+        self._version: Optional[str] = None
+        self._sync_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._query_vectors = AsyncResultCache("kb_query_embedding", max_entries=query_cache_size, ttl=3600)
+
+    @property
+    def ready(self) -> bool:
+        return self._index is not None
+
+    def __len__(self) -> int:
+        return len(self._index) if self._index is not None else 0
+
+    async def start(self):
+        """加载快照并启动后台同步任务"""
+        if self._task is not None and not self._task.done():
+            return
+        if self._snapshot_path:
+            try:
+                index, meta = await asyncio.to_thread(HybridIndex.load, self._snapshot_path)
+                if index is not None and meta.get("embedding_id") == self.embedding_id:
+                    self._index, self._version = index, meta.get("version")
+                    metrics.set_gauge("kb_replica_chunks", len(index), dataset=self.dataset_name)
+                    logger.info(f"知识库副本从快照加载: {self.dataset_name}，共 {len(index)} 个分块")
+            except Exception as e:
+                logger.warning(f"加载知识库副本快照失败: {e}")
+        self._task = asyncio.create_task(self._sync_loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _sync_loop(self):
+        while True:
+            try:
+                await self.sync()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                metrics.inc("kb_replica_sync", dataset=self.dataset_name, result="error")
+                logger.error(f"知识库副本同步失败: {e}", exc_info=True)
+            await asyncio.sleep(self.sync_interval)
+
+    async def sync(self, force: bool = False) -> bool:
+        """
+        同步一次，数据集有变化（或 force）时重建索引
+
+        Returns:
+            是否重建了索引
+        """
+        async with self._sync_lock:
+            dataset = await self.client.get_dataset_info(self.dataset_name)
+            if not dataset:
+                raise RuntimeError(f"未找到数据集: {self.dataset_name}")
+            version = f"{dataset.get('id')}:{dataset.get('chunk_count')}:{dataset.get('update_time')}"
+            if not force and self._index is not None and version == self._version:
+                metrics.inc("kb_replica_sync", dataset=self.dataset_name, result="unchanged")
+                return False
+
+            start = time.perf_counter()
+            chunks = await self._fetch_chunks(dataset["id"])
+            vectors = await self._embed_chunks([chunk["content"] for chunk in chunks])
+            index = await asyncio.to_thread(
+                HybridIndex, [chunk["id"] for chunk in chunks], [chunk["content"] for chunk in chunks], vectors
+            )
+            self._index, self._version = index, version
+            elapsed = time.perf_counter() - start
+            metrics.inc("kb_replica_sync", dataset=self.dataset_name, result="rebuilt")
+            metrics.observe("kb_replica_sync_seconds", elapsed, dataset=self.dataset_name)
+            metrics.set_gauge("kb_replica_chunks", len(index), dataset=self.dataset_name)
+            logger.info(f"知识库副本已重建: {self.dataset_name}，共 {len(index)} 个分块，耗时 {elapsed:.1f}s")
+
+            if self._snapshot_path:
+                meta = {"version": version, "embedding_id": self.embedding_id, "dataset": self.dataset_name}
+                try:
+                    await asyncio.to_thread(index.save, self._snapshot_path, meta)
+                except Exception as e:
+                    logger.warning(f"保存知识库副本快照失败: {e}")
+            return True
+
+    async def _fetch_chunks(self, dataset_id: str) -> List[Dict[str, Any]]:
+        documents = await self.client.list_documents(dataset_id)
+        chunk_lists = await asyncio.gather(
+            *(self.client.list_chunks(dataset_id, document["id"]) for document in documents)
+        )
+        chunks = []
+        for chunk_list in chunk_lists:
+            chunks.extend(
+                chunk for chunk in chunk_list
+                if chunk.get("available", True) is not False and (chunk.get("content") or "").strip()
+            )
+        return chunks
+
+    async def _embed_chunks(self, contents: List[str]) -> np.ndarray:
+        """为分块生成向量，内容未变的分块复用当前索引中的向量"""
+        reusable: Dict[str, np.ndarray] = {}
+        if self._index is not None:
+            reusable = {_content_hash(content): vector
+                        for content, vector in zip(self._index.contents, self._index.vectors)}
+        hashes = [_content_hash(content) for content in contents]
+        missing = [i for i, h in enumerate(hashes) if h not in reusable]
+        logger.info(f"知识库副本需要生成 {len(missing)} 个分块向量，复用 {len(contents) - len(missing)} 个")
+
+        embedded: Dict[int, List[float]] = {}
+        embeddings = self._embeddings()
+        for offset in range(0, len(missing), self.embed_batch_size):
+            batch = missing[offset:offset + self.embed_batch_size]
+            for i, vector in zip(batch, await embeddings.aembed_documents([contents[i] for i in batch])):
+                embedded[i] = vector
+        metrics.inc("kb_replica_embedded_chunks", len(missing), dataset=self.dataset_name)
+
+        if not contents:
+            return np.zeros((0, 0), dtype=np.float32)
+        return np.array([embedded[i] if i in embedded else reusable[h] for i, h in enumerate(hashes)],
+                        dtype=np.float32)
+
+    async def _query_vector(self, question: str) -> Optional[List[float]]:
+        try:
+            return await self._query_vectors.get_or_compute(
+                question, lambda: self._embeddings().aembed_query(question)
+            )
+        except Exception as e:
+            logger.warning(f"查询向量生成失败，退化为关键词检索: {e}")
+            return None
+
+    async def retrieve(self, question: str, similarity_threshold: float = 0.2,
+                       vector_similarity_weight: float = 0.5, top_k: int = 5,
+                       key_words: bool = True) -> List[Dict[str, Any]]:
+        """
+        本地混合检索，参数和返回格式与 KnowledgeBaseClient.retrieve 一致
+        （key_words 为 RAGFlow 的LLM关键词扩展开关，本地检索不使用）
+        """
+        index = self._index
+        if index is None:
+            return []
+        query_vector = await self._query_vector(question)
+        with metrics.timer("kb_local_search_seconds"):
+            results = index.search(question, query_vector, top_k, vector_similarity_weight, similarity_threshold)
+        for result in results:
+            result["low_similarity"] = result["similarity"] < similarity_threshold
+        logger.info(f"本地检索完成: '{question[:50]}' 找到 {len(results)} 条结果 (数据集: {self.dataset_name})")
+        return results
+
+    async def retrieve_many(self, questions: List[str], **kwargs) -> List[List[Dict[str, Any]]]:
+        """批量检索，结果与 questions 一一对应"""
+        return list(await asyncio.gather(*(self.retrieve(question, **kwargs) for question in questions)))
@@ -0,0 +1,113 @@
+"""
+情感识别吞吐基准测试
+
+对比以下方式在并发请求下的吞吐和事件循环阻塞情况：
+  1. 原方式：在协程中直接同步调用 transformers pipeline（逐条推理，阻塞事件循环）
+  2. EmotionClassifier + transformers 后端（推理线程 + 动态批处理）
+  3. EmotionClassifier + ONNX Runtime 后端（模型目录下存在对应onnx文件时）
+  4. EmotionClassifier + ONNX Runtime int8量化模型（存在 model_int8.onnx 时）
+
+"事件循环最大停顿"由一个每毫秒唤醒一次的协程测量，反映推理期间其他WebSocket的最长卡顿。
+
+用法：
+    python tools/benchmarks/bench_emotion.py [请求数] [并发数]
+    python tools/benchmarks/bench_emotion.py --quantize <模型目录>   # 把 model.onnx 动态量化为 model_int8.onnx
+
+模型路径读取 .env 中的 EMOTION_MODEL；ONNX模型需先用 optimum-cli 导出到该目录。
+ONNX 推理需要可选依赖 onnx，导出和 --quantize 需要可选依赖 onnx-export（uv sync --extra onnx-export）。
+"""
+import os
+import sys
+import time
+import asyncio
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+
+from agents.airport_service.core.emotion_classifier import (
+    EmotionClassifier, TransformersEmotionBackend, OnnxEmotionBackend,
+    EMOTION_MODEL_PATH, EMOTION_ONNX_FILE
+)
+
+# 典型的旅客输入
+TEXTS = [
+    "充电宝可以带上飞机吗", "航班延误了三个小时也没人通知，太差劲了", "谢谢你，帮了大忙",
+    "T3航站楼的值机柜台在哪里", "行李丢了找谁都不管，我要投诉", "请问轮椅服务怎么预约",
+    "为什么又取消航班？！", "好的，明白了",
+]
+INT8_ONNX_FILE = "model_int8.onnx"
+
+
+async def measure_loop_lag(stop: asyncio.Event) -> float:
+    """返回事件循环的最大停顿（毫秒）"""
+    worst = 0.0
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(0.001)
+        worst = max(worst, time.perf_counter() - start - 0.001)
+    return worst * 1000
+
+
+async def run_requests(classify, total: int, concurrency: int):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i: int):
+        async with semaphore:
+            await classify(TEXTS[i % len(TEXTS)])
+
+    stop = asyncio.Event()
+    lag_task = asyncio.create_task(measure_loop_lag(stop))
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(total)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    return elapsed, await lag_task
+
+
+def report(name: str, total: int, elapsed: float, lag_ms: float):
+    print(f"{name:<32} {total / elapsed:>10,.1f} 条/s   事件循环最大停顿 {lag_ms:>8.1f} ms")
+
+
+async def bench_sync_pipeline(backend: TransformersEmotionBackend, total: int, concurrency: int):
+    async def classify(text: str):
+        return backend.predict([text])[0]
+    return await run_requests(classify, total, concurrency)
+
+
+async def bench_classifier(backend, total: int, concurrency: int):
+    classifier = EmotionClassifier(backend_factory=lambda: backend, timeout=600)
+    await classifier.warmup()
+    try:
+        return await run_requests(classifier.classify, total, concurrency)
+    finally:
+        classifier.shutdown()
+
+
+def quantize(model_dir: str):
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+    source = os.path.join(model_dir, EMOTION_ONNX_FILE)
+    target = os.path.join(model_dir, INT8_ONNX_FILE)
+    quantize_dynamic(source, target, weight_type=QuantType.QInt8)
+    print(f"已生成int8量化模型: {target}（{os.path.getsize(source) / 1e6:.0f}MB -> {os.path.getsize(target) / 1e6:.0f}MB）")
+
+
+async def main(total: int, concurrency: int):
+    print(f"模型: {EMOTION_MODEL_PATH}, 请求数: {total}, 并发数: {concurrency}\n")
+    backend = TransformersEmotionBackend(EMOTION_MODEL_PATH)
+    backend.predict(TEXTS)
+
+    report("同步 pipeline（原方式）", total, *await bench_sync_pipeline(backend, total, concurrency))
+    report("推理线程 + 批处理 transformers", total, *await bench_classifier(backend, total, concurrency))
+
+    for name, onnx_file in (("推理线程 + 批处理 onnx", EMOTION_ONNX_FILE), ("推理线程 + 批处理 onnx int8", INT8_ONNX_FILE)):
+        if not os.path.exists(os.path.join(EMOTION_MODEL_PATH, onnx_file)):
+            print(f"{name:<32} 跳过：{EMOTION_MODEL_PATH} 下没有 {onnx_file}")
+            continue
+        report(name, total, *await bench_classifier(OnnxEmotionBackend(EMOTION_MODEL_PATH, onnx_file), total, concurrency))
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 2 and sys.argv[1] == "--quantize":
+        quantize(sys.argv[2])
+    else:
+        total = int(sys.argv[1]) if len(sys.argv) > 1 else 256
+        concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 32
+        asyncio.run(main(total, concurrency))
@@ -0,0 +1,122 @@
+"""
+聊天事件编码基准测试
+
+单核对比流式文本事件的几种编码/发送方式：
+  1. 原方式：构建 ChatEvent 模型 + model_dump + json.dumps
+  2. 模板编码：encode_text_event 直接拼接JSON
+  3. EventSender 逐token发送（模板编码 + 连接发送队列）
+  4. EventSender 按字节上限合并token后发送
+
+前两项只统计编码；后两项模拟图流式输出（每个token之间让出事件循环），还包含写任务
+的调度开销。发送端只做UTF-8编码（不含网络写入与WebSocket分帧），真实连接上每帧还有
+一次 send_text 的系统调用开销，合并后节省更多。
+
+用法：
+    python tools/benchmarks/bench_event_encoding.py [token数] [合并字节上限]
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+
+from models.schemas import ChatEvent, TextEventContent
+from api.event_stream import ConnectionWriter, EventSender, encode_text_event, orjson
+
+# 典型的中文LLM流式token
+TOKENS = ["您好", "，", "T3", "航站楼", "的", "安检口", "位于", "出发层", "，", "请", "提前", "两小时", "到达", "。"]
+
+
+class _EventIds:
+    """与 EventGenerator 相同的ID/序号分配方式"""
+
+    def __init__(self):
+        self.sequence = 0
+
+    def next_event_ids(self, event_type: str):
+        self.sequence += 1
+        event_id = f"{event_type}-{int(time.time() * 1000)}-{self.sequence}"
+        self.sequence += 1
+        return event_id, self.sequence
+
+
+def bench_model_dump(n: int) -> int:
+    ids = _EventIds()
+    total = 0
+    for i in range(n):
+        event_id, sequence = ids.next_event_ids("text")
+        event = ChatEvent(id=event_id, sequence=sequence, content=TextEventContent(text=TOKENS[i % len(TOKENS)], format="plain"))
+        total += len(json.dumps({"event": "text", "data": event.model_dump()}, ensure_ascii=False))
+    return n
+
+
+def bench_template(n: int) -> int:
+    ids = _EventIds()
+    total = 0
+    for i in range(n):
+        event_id, sequence = ids.next_event_ids("text")
+        total += len(encode_text_event(event_id, sequence, TOKENS[i % len(TOKENS)]))
+    return n
+
+
+async def bench_sender(n: int, window: float, max_bytes: int) -> int:
+    """返回实际发送的帧数"""
+    frames = 0
+
+    async def counting_sink(text: str):
+        nonlocal frames
+        frames += 1
+        text.encode("utf-8")
+
+    ids = _EventIds()
+    writer = ConnectionWriter(counting_sink)
+    writer.start()
+    sender = EventSender(writer, coalesce_window=window, coalesce_max_bytes=max_bytes)
+    for i in range(n):
+        await sender.send_text(ids, TOKENS[i % len(TOKENS)])
+        # 与真实图流式输出一样，每个token之间让出事件循环，写任务得以及时发送
+        await asyncio.sleep(0)
+    await sender.flush()
+    while writer.pending_bytes:
+        await asyncio.sleep(0)
+    await writer.close()
+    return frames
+
+
+def report(name: str, n: int, elapsed: float, frames: int = None):
+    line = f"{name:<28} {n / elapsed:>12,.0f} token/s"
+    if frames is not None:
+        line += f"   帧数 {frames:,}（平均每帧 {n / frames:.1f} token）"
+    print(line)
+
+
+def main(n: int, max_bytes: int):
+    print(f"token数: {n:,}, orjson: {'已安装' if orjson is not None else '未安装'}\n")
+
+    start = time.perf_counter()
+    bench_model_dump(n)
+    baseline = time.perf_counter() - start
+    report("model_dump + json.dumps", n, baseline)
+
+    start = time.perf_counter()
+    bench_template(n)
+    report("模板编码", n, time.perf_counter() - start)
+
+    start = time.perf_counter()
+    frames = asyncio.run(bench_sender(n, 0, 0))
+    report("EventSender 逐token", n, time.perf_counter() - start, frames)
+
+    # 时间窗口设得足够长，仅由字节上限触发发送
+    start = time.perf_counter()
+    frames = asyncio.run(bench_sender(n, 60, max_bytes))
+    coalesced = time.perf_counter() - start
+    report(f"EventSender 合并({max_bytes}B)", n, coalesced, frames)
+
+    print(f"\n合并发送相对原方式提速: {baseline / coalesced:.1f}x")
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    max_bytes = int(sys.argv[2]) if len(sys.argv) > 2 else 512
+    main(n, max_bytes)
@@ -0,0 +1,78 @@
+"""
+GraphManager 每请求开销基准测试
+
+对比两种模式下获取已编译图的耗时：
+- 按请求模式：每次新建Redis客户端、ping、创建checkpointer、asetup并编译图
+- 生命周期模式：启动时共享连接池并预编译，请求直接复用
+
+用法：
+    python tools/benchmarks/bench_graph_compile.py [请求次数] [并发数]
+
+需要可用的Redis（读取 .env 中的 REDIS_* 配置）
+"""
+import os
+import sys
+import time
+import asyncio
+import statistics
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+
+from agents.airport_service import build_airport_service_graph
+from agents.airport_service.graph_compile import graph_manager
+
+GRAPH_ID = "airport_service_graph"
+
+
+async def acquire_once() -> float:
+    """进入并退出一次 get_compiled_graph，返回耗时（毫秒）"""
+    start = time.perf_counter()
+    async with graph_manager.get_compiled_graph(GRAPH_ID):
+        pass
+    return (time.perf_counter() - start) * 1000
+
+
+async def run_round(total: int, concurrency: int) -> list:
+    """按指定并发数执行 total 次获取，返回每次耗时"""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def worker():
+        async with semaphore:
+            return await acquire_once()
+
+    return await asyncio.gather(*[worker() for _ in range(total)])
+
+
+def report(name: str, latencies: list, elapsed: float):
+    latencies = sorted(latencies)
+    p95 = latencies[int(len(latencies) * 0.95) - 1]
+    print(f"{name}:")
+    print(f"  平均 {statistics.mean(latencies):.2f} ms, 中位数 {statistics.median(latencies):.2f} ms, P95 {p95:.2f} ms")
+    print(f"  总耗时 {elapsed:.2f} s, 吞吐 {len(latencies) / elapsed:.1f} 次/秒")
+
+
+async def main(total: int, concurrency: int):
+    graph_manager.register_graph(GRAPH_ID, build_airport_service_graph())
+
+    # 预热一次，排除首次导入/建索引的干扰
+    await acquire_once()
+
+    start = time.perf_counter()
+    legacy = await run_round(total, concurrency)
+    report("按请求编译", legacy, time.perf_counter() - start)
+
+    await graph_manager.startup()
+    try:
+        start = time.perf_counter()
+        lifecycle = await run_round(total, concurrency)
+        report("生命周期模式", lifecycle, time.perf_counter() - start)
+        print(f"  连接池状态: {(await graph_manager.get_redis_stats())['pool']}")
+    finally:
+        await graph_manager.shutdown()
+
+    print(f"\n每请求开销降低: {statistics.mean(legacy) - statistics.mean(lifecycle):.2f} ms")
+
+
+if __name__ == "__main__":
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    asyncio.run(main(total, concurrency))
@@ -0,0 +1,137 @@
+"""
+特化图变体基准测试
+
+对比翻译/情感识别/图片三个开关全部关闭时，完整图与特化图每轮对话的图执行开销。
+各节点替换为与关闭状态下行为一致的空实现（不调用LLM），因此测得的差值即为
+多余节点带来的超步调度、checkpoint写入和流式输出开销。
+
+用法：
+    python tools/benchmarks/bench_graph_variants.py [每个会话轮数] [会话数]
+
+需要可用的Redis（读取 .env 中的 REDIS_* 配置）
+"""
+import os
+import sys
+import time
+import uuid
+import asyncio
+import statistics
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+
+from langchain_core.messages import AIMessage
+from langchain_core.runnables import RunnableLambda
+from agents.airport_service import build_airport_service_graph
+from agents.airport_service.graph_compile import graph_manager
+
+GRAPH_ID = "bench_airport_service_graph"
+FLAGS = ["translate", "emotion", "image"]
+
+
+async def _passthrough(state):
+    # detect_emotion / images_thinking 关闭时原样返回整个state
+    return state
+
+
+async def _translate_input(state, config):
+    return {"user_query": config["configurable"].get("user_query", "")}
+
+
+async def _translate_output(state):
+    return {"user_query": None}
+
+
+async def _router(state):
+    return {"messages": [AIMessage(content="airport_info", name="主路由智能体")], "router": "airport_info"}
+
+
+async def _search(state):
+    return {"retrieval_result": None}
+
+
+async def _answer(state):
+    return {"messages": [AIMessage(content="您好，T3航站楼安检口位于出发层。", name="机场知识问答子智能体")]}
+
+
+async def _noop(state):
+    return {}
+
+
+STUBS = {
+    "translate_input_node": _translate_input,
+    "translate_output_node": _translate_output,
+    "emotion_node": _passthrough,
+    "images_thinking_node": _passthrough,
+    "router": _router,
+    "airport_info_search_node": _search,
+    "airport_assistant_node": _answer,
+}
+
+
+def stubbed_builder(**flags):
+    """构建真实拓扑的图，但节点替换为空实现"""
+    graph = build_airport_service_graph(**flags)
+    for name, spec in graph.nodes.items():
+        spec.runnable = RunnableLambda(STUBS.get(name, _noop))
+    return graph
+
+
+async def run_conversation(graph_id: str, turns: int) -> list:
+    """在一个新会话中连续执行多轮对话，返回每轮耗时（毫秒）"""
+    thread_id = f"bench-{uuid.uuid4().hex}"
+    config = {"configurable": {"thread_id": thread_id, "user_query": "安检口在哪里",
+                               "Is_translate": False, "Is_emotion": False, "image_data": None}}
+    latencies = []
+    for _ in range(turns):
+        start = time.perf_counter()
+        async for _ in graph_manager.process_chat_message_stream(
+            message="安检口在哪里",
+            thread_id=config,
+            graph_id=graph_id,
+            msg_nodes=["airport_assistant_node"],
+            custom_nodes=[],
+            extra_input={"user_query": "安检口在哪里"}
+        ):
+            pass
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+async def run_round(graph_id: str, turns: int, conversations: int) -> list:
+    results = await asyncio.gather(*[run_conversation(graph_id, turns) for _ in range(conversations)])
+    return [latency for latencies in results for latency in latencies]
+
+
+def report(name: str, latencies: list):
+    latencies = sorted(latencies)
+    p95 = latencies[int(len(latencies) * 0.95) - 1]
+    print(f"{name}:")
+    print(f"  平均 {statistics.mean(latencies):.2f} ms, 中位数 {statistics.median(latencies):.2f} ms, P95 {p95:.2f} ms")
+
+
+async def main(turns: int, conversations: int):
+    graph_manager.register_graph_variants(GRAPH_ID, stubbed_builder, FLAGS)
+    variant_id = graph_manager.resolve_graph_id(GRAPH_ID, translate=False, emotion=False, image=False)
+    if variant_id == GRAPH_ID:
+        print("未启用特化图（GRAPH_SPECIALIZED_VARIANTS=false），无法对比")
+        return
+
+    await graph_manager.startup()
+    try:
+        # 预热，排除首次建索引的干扰
+        await run_round(GRAPH_ID, 1, 1)
+        await run_round(variant_id, 1, 1)
+
+        full = await run_round(GRAPH_ID, turns, conversations)
+        report(f"完整图 ({GRAPH_ID})", full)
+        specialized = await run_round(variant_id, turns, conversations)
+        report(f"特化图 ({variant_id})", specialized)
+    finally:
+        await graph_manager.shutdown()
+
+    print(f"\n每轮节省: {statistics.mean(full) - statistics.mean(specialized):.2f} ms")
+
+
+if __name__ == "__main__":
+    turns = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    conversations = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    asyncio.run(main(turns, conversations))
@@ -0,0 +1,91 @@
+"""
+知识库检索对比：RAGFlow 远程检索 vs 本地 BM25 + 向量副本
+
+以 FAQ 表中的每个"问题"为查询，检索结果中任一分块包含该问题的"答案"（取答案前若干字，忽略空白）即视为命中，
+统计两种后端的 Recall@K、MRR 和单次检索延迟（p50 / p95）。
+FAQ 需已导入 .env 中 KB_DATASET_NAME 指定的数据集；本地副本先从 RAGFlow 同步一次再开始计时。
+
+用法：
+    python tools/benchmarks/bench_kb_retrieval.py [Excel路径] [top_k，默认5] [每个工作表的样本数，默认全部]
+"""
+import os
+import re
+import sys
+import time
+import asyncio
+import statistics
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+
+import pandas as pd
+
+from agents.airport_service.tools.airport import (
+    kb_replica, KB_DATASET_NAME, KB_ADDRESS, KB_API_KEY, KB_VECTOR_SIMILARITY_WEIGHT, KB_KEY_WORDS
+)
+from text2kb.retrieval import get_kb_client, close_kb_clients
+
+DEFAULT_EXCEL = os.path.join(os.path.dirname(__file__), "../data/常见问题汇总-图片改文字版（未标注颜色）.xlsx")
+SHEET_NAMES = ["安检问题", "航空公司业务", "派出所", "机场交通", "联检单位", "FAQ知识库"]
+# 用答案前多少个字判断命中（分块可能截断长答案）
+ANSWER_PREFIX = 30
+_WHITESPACE = re.compile(r"\s+")
+
+
+def load_faq(path: str, limit: int = 0):
+    pairs = []
+    for sheet_name in SHEET_NAMES:
+        try:
+            df = pd.read_excel(path, sheet_name=sheet_name)
+        except ValueError:
+            continue
+        df.dropna(inplace=True, how="all")
+        rows = [(str(row["问题"]).strip(), str(row["答案"]).strip()) for _, row in df.iterrows()
+                if pd.notna(row.get("问题")) and pd.notna(row.get("答案"))]
+        pairs.extend(rows[:limit] if limit else rows)
+    return pairs
+
+
+def rank_of(answer: str, results) -> int:
+    """答案所在分块的名次（从1开始），未命中返回0"""
+    target = _WHITESPACE.sub("", answer)[:ANSWER_PREFIX]
+    for rank, result in enumerate(results, 1):
+        if target and target in _WHITESPACE.sub("", result["content"]):
+            return rank
+    return 0
+
+
+async def evaluate(name: str, retrieve, pairs, top_k: int):
+    latencies, ranks = [], []
+    for question, answer in pairs:
+        start = time.perf_counter()
+        results = await retrieve(question)
+        latencies.append((time.perf_counter() - start) * 1000)
+        ranks.append(rank_of(answer, results[:top_k]))
+    recall = sum(1 for rank in ranks if rank) / len(ranks)
+    mrr = sum(1 / rank for rank in ranks if rank) / len(ranks)
+    latencies.sort()
+    p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+    print(f"{name:<12} Recall@{top_k} {recall:>6.1%}   MRR {mrr:.3f}   "
+          f"延迟 p50 {statistics.median(latencies):>7.1f} ms  p95 {p95:>7.1f} ms")
+
+
+async def main(path: str, top_k: int, limit: int):
+    pairs = load_faq(path, limit)
+    print(f"FAQ: {len(pairs)} 条, 数据集: {KB_DATASET_NAME}, top_k: {top_k}\n")
+
+    start = time.perf_counter()
+    await kb_replica.sync(force=True)
+    print(f"本地副本同步: {len(kb_replica)} 个分块，耗时 {time.perf_counter() - start:.1f}s\n")
+
+    kwargs = dict(similarity_threshold=0.01, vector_similarity_weight=KB_VECTOR_SIMILARITY_WEIGHT,
+                  top_k=top_k, key_words=KB_KEY_WORDS)
+    client = get_kb_client(KB_ADDRESS, KB_API_KEY)
+    await evaluate("RAGFlow", lambda q: client.retrieve(q, KB_DATASET_NAME, **kwargs), pairs, top_k)
+    await evaluate("本地副本", lambda q: kb_replica.retrieve(q, **kwargs), pairs, top_k)
+    await close_kb_clients()
+
+
+if __name__ == "__main__":
+    path = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_EXCEL
+    top_k = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    limit = int(sys.argv[3]) if len(sys.argv) > 3 else 0
+    asyncio.run(main(path, top_k, limit))
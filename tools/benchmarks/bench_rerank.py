@@ -0,0 +1,98 @@
+"""
+重排吞吐基准测试：HTTP 重排接口 vs 本地 ONNX 交叉编码器
+
+模拟机场问答的重排负载（每个请求 1 个问题 + N 个候选分块），在给定并发下统计：
+  - 每秒打分的 (问题, 分块) 对数，以及本地后端折算到每个CPU核的吞吐
+  - 单次重排延迟 p50 / p95
+
+为了测的是打分本身，每个请求的问题都不同，不命中分数缓存。
+本地后端依次用 1 个推理线程和 RERANKER_ONNX_WORKERS 个推理线程（0为全部核）测试，每个线程的算子内线程数为1。
+
+用法：
+    python tools/benchmarks/bench_rerank.py [请求数，默认200] [并发数，默认16] [每个请求的分块数，默认15]
+
+HTTP 后端读取 .env 中的 RERANKER_MODEL / RERANKER_BASE_URL / RERANKER_API_KEY；
+ONNX 后端读取 RERANKER_ONNX_MODEL_PATH，模型需先用 optimum-cli 导出到该目录。
+ONNX 后端需要可选依赖 onnx，导出模型需要可选依赖 onnx-export（uv sync --extra onnx-export）。
+"""
+import os
+import sys
+import time
+import asyncio
+import statistics
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+
+from config.utils import config_manager
+from agents.airport_service.core.query.rerank import (
+    RerankService, HttpRerankBackend, OnnxRerankBackend, OnnxCrossEncoder,
+    RERANKER_ONNX_MODEL_PATH, RERANKER_ONNX_FILE, RERANKER_ONNX_WORKERS, RERANKER_MAX_LENGTH
+)
+
+QUESTIONS = [
+    "充电宝可以带上飞机吗", "T3航站楼的值机柜台在哪里", "行李丢了找谁", "轮椅服务怎么预约",
+    "航班延误了可以退票吗", "国际航班提前多久值机", "液体可以带多少", "宠物可以托运吗",
+]
+CHUNKS = [
+    "旅客随身携带的充电宝额定能量不超过100Wh的无需航空公司批准，超过100Wh但不超过160Wh的需经航空公司批准，严禁托运。",
+    "T3航站楼出发层设有A至F值机岛，国内航班在A、B、C岛办理，国际及地区航班在D、E、F岛办理。",
+    "如行李在到达后未找到，请前往到达层行李查询柜台办理登记，工作人员将协助查询并联系航空公司。",
+    "需要轮椅服务的旅客请在购票时或航班起飞前48小时联系航空公司预约，到达机场后可在问询台寻求帮助。",
+    "因航班延误或取消导致旅客自愿退票的，按航空公司规定办理，非自愿退票不收取退票费。",
+    "国际航班值机柜台一般在起飞前3小时开放，起飞前1小时关闭，建议旅客提前到达机场。",
+    "乘坐国内航班的旅客随身携带液体，单个容器不超过100毫升，总量不超过1升，并装入透明可封口塑料袋。",
+    "小动物托运需提前向航空公司申请，提供动物检疫证明，并使用符合要求的运输容器。",
+] * 4
+
+
+async def run(service: RerankService, total: int, concurrency: int, chunks: int):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(i: int):
+        # 问题带上序号，避免命中分数缓存
+        query = f"{QUESTIONS[i % len(QUESTIONS)]}（{i}）"
+        documents = [CHUNKS[(i + j) % len(CHUNKS)] + f"（{j}）" for j in range(chunks)]
+        async with semaphore:
+            start = time.perf_counter()
+            await service.score(query, documents)
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(total)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return total * chunks / elapsed, statistics.median(latencies), latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+
+
+def report(name: str, pairs_per_second: float, p50: float, p95: float, cores: int = 0):
+    per_core = f"  每核 {pairs_per_second / cores:>8,.1f} 对/s" if cores else ""
+    print(f"{name:<28} {pairs_per_second:>9,.1f} 对/s{per_core}   延迟 p50 {p50:>7.1f} ms  p95 {p95:>7.1f} ms")
+
+
+async def main(total: int, concurrency: int, chunks: int):
+    print(f"请求数: {total}, 并发数: {concurrency}, 每请求分块数: {chunks}, CPU核数: {os.cpu_count()}\n")
+    text2kb_config = config_manager.get_text2kb_config()
+    model, address = text2kb_config.get("reranker_model"), text2kb_config.get("reranker_base_url")
+    if model and address:
+        service = RerankService(HttpRerankBackend(model, address, text2kb_config.get("reranker_api_key")))
+        report("HTTP 重排接口", *await run(service, total, concurrency, chunks))
+        await service.close()
+    else:
+        print("HTTP 重排接口               跳过：未配置 RERANKER_MODEL / RERANKER_BASE_URL")
+
+    if not RERANKER_ONNX_MODEL_PATH:
+        print("本地 ONNX 交叉编码器        跳过：未配置 RERANKER_ONNX_MODEL_PATH")
+        return
+    encoder = OnnxCrossEncoder(RERANKER_ONNX_MODEL_PATH, RERANKER_ONNX_FILE, threads=1, max_length=RERANKER_MAX_LENGTH)
+    encoder.predict([(QUESTIONS[0], CHUNKS[0])])
+    for workers in sorted({1, RERANKER_ONNX_WORKERS or os.cpu_count()}):
+        service = RerankService(OnnxRerankBackend(lambda: encoder, workers=workers))
+        report(f"ONNX {workers} 个推理线程", *await run(service, total, concurrency, chunks), cores=workers)
+        await service.close()
+
+
+if __name__ == "__main__":
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 16
+    chunks = int(sys.argv[3]) if len(sys.argv) > 3 else 15
+    asyncio.run(main(total, concurrency, chunks))
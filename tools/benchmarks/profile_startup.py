@@ -0,0 +1,88 @@
+"""
+进程启动耗时分析
+
+1. 在子进程中以 python -X importtime 导入目标模块，按顶层包汇总导入耗时，
+   并列出累计耗时最高的模块，可以看出 torch / transformers 等重依赖是否仍在导入阶段被加载
+2. 在当前进程中导入目标模块后执行 component_registry.warmup()，列出各组件（模型客户端、抽取器、子图）的构建耗时
+
+在改动前后的代码上分别运行即可对比启动耗时。
+
+用法：
+    python tools/benchmarks/profile_startup.py [模块名，默认 main] [显示条数，默认 15]
+"""
+import os
+import re
+import sys
+import time
+import asyncio
+import importlib
+import subprocess
+from collections import defaultdict
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
+sys.path.insert(0, ROOT)
+
+# 关注的重依赖：导入阶段不应出现
+HEAVY_PACKAGES = ("torch", "transformers", "onnxruntime", "trustcall", "langchain_openai", "openai", "mem0")
+_IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def profile_imports(module: str):
+    """返回 [(模块名, 自身耗时us, 累计耗时us, 缩进层级)]"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        print(result.stderr.strip().splitlines()[-1] if result.stderr else "导入失败")
+        sys.exit(1)
+    entries = []
+    for line in result.stderr.splitlines():
+        match = _IMPORTTIME_LINE.match(line)
+        if match:
+            entries.append((match.group(4), int(match.group(1)), int(match.group(2)), len(match.group(3))))
+    return entries
+
+
+def report_imports(module: str, top: int):
+    entries = profile_imports(module)
+    total = sum(self_us for _, self_us, _, _ in entries)
+    by_package = defaultdict(int)
+    for name, self_us, _, _ in entries:
+        by_package[name.split(".")[0]] += self_us
+
+    print(f"导入 {module} 共 {len(entries)} 个模块，总耗时 {total / 1e6:.2f}s\n")
+    print(f"按顶层包汇总（前{top}）：")
+    for package, self_us in sorted(by_package.items(), key=lambda item: -item[1])[:top]:
+        print(f"  {package:<32} {self_us / 1e3:>9.1f} ms  {self_us / total:>6.1%}")
+
+    print(f"\n累计耗时最高的模块（前{top}）：")
+    for name, _, cumulative_us, _ in sorted(entries, key=lambda item: -item[2])[:top]:
+        print(f"  {name:<48} {cumulative_us / 1e3:>9.1f} ms")
+
+    print("\n重依赖：")
+    for package in HEAVY_PACKAGES:
+        if package in by_package:
+            print(f"  {package:<32} 已在导入阶段加载，自身耗时 {by_package[package] / 1e3:.1f} ms")
+        else:
+            print(f"  {package:<32} 未加载")
+
+
+def report_warmup(module: str):
+    start = time.perf_counter()
+    importlib.import_module(module)
+    print(f"\n当前进程导入 {module}: {time.perf_counter() - start:.2f}s")
+
+    from common.registry import component_registry
+    start = time.perf_counter()
+    asyncio.run(component_registry.warmup())
+    print(f"组件预构建: {time.perf_counter() - start:.2f}s")
+    for name, seconds in sorted(component_registry.stats().items(), key=lambda item: -(item[1] or 0)):
+        print(f"  {name:<32} {'构建失败' if seconds is None else f'{seconds * 1000:>8.1f} ms'}")
+
+
+if __name__ == "__main__":
+    module = sys.argv[1] if len(sys.argv) > 1 else "main"
+    top = int(sys.argv[2]) if len(sys.argv) > 2 else 15
+    report_imports(module, top)
+    report_warmup(module)